@@ -25,8 +25,7 @@ from api.analytics_modules import (
     get_available_modules,
     infer_role_profile,
 )
-from api.models import Country
-from api.models import Event
+from api.models import Country, Event, EventMonthIndex
 from main.permissions import DenyGuestUserPermission
 
 FACT_SHEET_NAME = "fact_views_daily_city"
@@ -151,6 +150,24 @@ def _build_event_scope_map(event_ids: set[int]) -> dict[int, dict[str, set[str]]
     return event_scope_map
 
 
+def _build_event_month_index(event_ids: set[int]) -> dict[str, dict[int, set[str]]]:
+    """Monthly buckets of emergency id -> publishing country names, from the EventMonthIndex rows of the scope."""
+    if not event_ids:
+        return {}
+
+    month_index: dict[str, dict[int, set[str]]] = {}
+    queryset = EventMonthIndex.objects.filter(event_ids__overlap=list(event_ids)).values_list(
+        "created_month", "event_ids", "country_event_ids"
+    )
+    for created_month, month_event_ids, country_event_ids in queryset:
+        month_events = {event_id: set() for event_id in event_ids.intersection(month_event_ids)}
+        month_index[created_month] = month_events
+        for country_name, country_ids in country_event_ids.items():
+            for event_id in month_events.keys() & set(country_ids):
+                month_events[event_id].add(country_name)
+    return month_index
+
+
 def _infer_regions_from_emergency_name(
     emergency_name: str,
     country_name_region_map: dict[str, str],
@@ -535,8 +552,6 @@ def _build_live_spikes(
 def _build_platform_adoption(
     rows: list[dict],
     total_countries: int,
-    event_scope_map: dict[int, dict[str, set[str]]],
-    iso_name_map: dict[str, str],
     iso3_name_map: dict[str, str],
     country_name_region_map: dict[str, str],
 ) -> dict[str, object]:
@@ -545,9 +560,20 @@ def _build_platform_adoption(
     monthly_returning_user_views = Counter()
     monthly_countries = {}
     monthly_country_emergencies = {}
-    event_ids = set()
     event_first_seen_month = {}
-    event_country_name_cache: dict[int, set[str]] = {}
+
+    event_ids = {
+        _parse_int(row.get("emergency_id"), 0)
+        for row in rows
+        if len(str(row.get("date") or "").strip()) >= 7
+    } - {0}
+    event_month_index = _build_event_month_index(event_ids)
+    event_country_name_cache: dict[int, set[str]] = {
+        event_id: country_names
+        for month_events in event_month_index.values()
+        for event_id, country_names in month_events.items()
+        if country_names
+    }
 
     for row in rows:
         raw_date = str(row.get("date") or "").strip()
@@ -566,35 +592,27 @@ def _build_platform_adoption(
 
         event_id = _parse_int(row.get("emergency_id"), 0)
         if event_id > 0:
-            event_ids.add(event_id)
             if month_key:
                 current_month = event_first_seen_month.get(event_id)
                 if current_month is None or month_key < current_month:
                     event_first_seen_month[event_id] = month_key
             if month_key:
                 if event_id not in event_country_name_cache:
-                    owner_country_isos = event_scope_map.get(event_id, {}).get("countries", set())
-                    owner_country_names = {
-                        iso_name_map.get(iso, iso)
-                        for iso in owner_country_isos
-                        if iso
-                    }
-                    if not owner_country_names:
-                        emergency_name = str(row.get("emergency_name") or "")
-                        inferred_countries: set[str] = set()
-                        iso3_match = re.match(r"^\s*([A-Za-z]{3})\s*:", emergency_name)
-                        if iso3_match:
-                            country_name = iso3_name_map.get(iso3_match.group(1).upper())
-                            if country_name:
-                                inferred_countries.add(country_name)
-                        lowered_name = emergency_name.lower()
-                        for country_name in country_name_region_map.keys():
-                            if len(country_name) < 4:
-                                continue
-                            if re.search(rf"\b{re.escape(country_name)}\b", lowered_name):
-                                inferred_countries.add(country_name.title())
-                        owner_country_names = inferred_countries
-                    event_country_name_cache[event_id] = owner_country_names
+                    # Fallback for emergencies without indexed publishing countries: infer from the name.
+                    emergency_name = str(row.get("emergency_name") or "")
+                    inferred_countries: set[str] = set()
+                    iso3_match = re.match(r"^\s*([A-Za-z]{3})\s*:", emergency_name)
+                    if iso3_match:
+                        country_name = iso3_name_map.get(iso3_match.group(1).upper())
+                        if country_name:
+                            inferred_countries.add(country_name)
+                    lowered_name = emergency_name.lower()
+                    for country_name in country_name_region_map.keys():
+                        if len(country_name) < 4:
+                            continue
+                        if re.search(rf"\b{re.escape(country_name)}\b", lowered_name):
+                            inferred_countries.add(country_name.title())
+                    event_country_name_cache[event_id] = inferred_countries
                 owner_country_names = event_country_name_cache[event_id]
                 if not owner_country_names:
                     continue
@@ -606,19 +624,13 @@ def _build_platform_adoption(
                         monthly_country_emergencies[month_key][country_name] = set()
                     monthly_country_emergencies[month_key][country_name].add(event_id)
 
-    event_created_per_month = Counter()
-    if event_ids:
-        found_event_ids = set()
-        for event in Event.objects.filter(id__in=event_ids).only("id", "created_at"):
-            found_event_ids.add(event.id)
-            if event.created_at:
-                event_created_per_month[event.created_at.strftime("%Y-%m")] += 1
-        # Fallback for synthetic/missing Event records: use first month seen in scoped analytics rows.
-        missing_ids = event_ids - found_event_ids
-        for event_id in missing_ids:
-            fallback_month = event_first_seen_month.get(event_id)
-            if fallback_month:
-                event_created_per_month[fallback_month] += 1
+    event_created_per_month = Counter({month: len(month_events) for month, month_events in event_month_index.items()})
+    # Fallback for synthetic/missing Event records: use first month seen in scoped analytics rows.
+    found_event_ids = {event_id for month_events in event_month_index.values() for event_id in month_events}
+    for event_id in event_ids - found_event_ids:
+        fallback_month = event_first_seen_month.get(event_id)
+        if fallback_month:
+            event_created_per_month[fallback_month] += 1
 
     months = sorted(set(monthly_active_users.keys()) | set(event_created_per_month.keys()))
     monthly_breakdown = []
@@ -1017,8 +1029,6 @@ class AnalyticsView(APIView):
             module_data[MODULE_PLATFORM_ADOPTION] = _build_platform_adoption(
                 filtered_rows,
                 total_countries=len(iso_region_map),
-                event_scope_map=event_scope_map,
-                iso_name_map=iso_name_map,
                 iso3_name_map=iso3_name_map,
                 country_name_region_map=country_region,
             )
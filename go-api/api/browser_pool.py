@@ -0,0 +1,106 @@
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import sync_playwright
+
+from .logger import logger
+
+# Max PDF exports running at the same time in a Celery worker process.
+# NOTE: This is per process, it only limits the threads of a process (threads/gevent pools, or the dev worker).
+# With the prefork pool each child process runs one task at a time, the exports are then bounded by the
+# concurrency of the worker consuming the PDF queue (see helm celeryPdf.concurrency)
+EXPORT_SEMAPHORE = threading.BoundedSemaphore(settings.PLAYWRIGHT_EXPORT_CONCURRENCY)
+
+_local = threading.local()
+
+
+class BrowserPool:
+    """
+    Long-lived connection to the Playwright server, reused by the exports of a worker thread
+    (the Playwright sync objects can't be shared across threads).
+    The browser contexts are kept per storage state (user token and language), up to max_contexts,
+    so the next export of the same user reuses the context and its HTTP cache.
+    The browser is checked before each export and reconnected when disconnected, or after max_uses exports.
+    """
+
+    def __init__(self, max_contexts, max_uses):
+        self.max_contexts = max_contexts
+        self.max_uses = max_uses
+        self.playwright = None
+        self.browser = None
+        self.contexts = OrderedDict()
+        self.uses = 0
+
+    def is_healthy(self):
+        return self.browser is not None and self.browser.is_connected() and self.uses < self.max_uses
+
+    def connect(self):
+        self.close()
+        if self.playwright is None:
+            self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.connect(settings.PLAYWRIGHT_SERVER_URL)
+        self.uses = 0
+        logger.info("Connected to the Playwright server")
+
+    def close(self):
+        for context in self.contexts.values():
+            try:
+                context.close()
+            except PlaywrightError:
+                pass
+        self.contexts.clear()
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except PlaywrightError:
+                pass
+            self.browser = None
+
+    def stop(self):
+        self.close()
+        if self.playwright is not None:
+            self.playwright.stop()
+            self.playwright = None
+
+    def get_context(self, key, storage_state):
+        context = self.contexts.pop(key, None)
+        if context is None:
+            context = self.browser.new_context(storage_state=storage_state)
+        # Least recently used first
+        self.contexts[key] = context
+        while len(self.contexts) > self.max_contexts:
+            _, oldest_context = self.contexts.popitem(last=False)
+            oldest_context.close()
+        return context
+
+    @contextmanager
+    def new_page(self, key, storage_state):
+        """A new page in the (reused) context of the storage state, closed afterwards"""
+        if not self.is_healthy():
+            self.connect()
+        self.uses += 1
+        page = self.get_context(key, storage_state).new_page()
+        try:
+            yield page
+        except PlaywrightError:
+            # The browser or the context might be broken, reconnect for the next export
+            self.close()
+            raise
+        finally:
+            if self.browser is not None and not page.is_closed():
+                page.close()
+
+
+def get_browser_pool():
+    pool = getattr(_local, "browser_pool", None)
+    if pool is None:
+        pool = _local.browser_pool = BrowserPool(
+            max_contexts=settings.PLAYWRIGHT_CONTEXT_POOL_SIZE,
+            max_uses=settings.PLAYWRIGHT_BROWSER_MAX_USES,
+        )
+        atexit.register(pool.stop)
+    return pool
@@ -2,21 +2,9 @@ from datetime import timedelta
 
 from django.contrib.auth.models import Group, User
 from django.db import models
-from django.db.models import (
-    Avg,
-    Case,
-    Count,
-    ExpressionWrapper,
-    F,
-    OuterRef,
-    Prefetch,
-    Q,
-    Subquery,
-    Sum,
-    When,
-)
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery
 from django.db.models.fields import IntegerField
-from django.db.models.functions import Coalesce, TruncMonth
+from django.db.models.functions import Coalesce
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -54,10 +42,12 @@ from api.filter_set import (
 from api.visibility_class import (
     ReadOnlyVisibilityViewset,
     ReadOnlyVisibilityViewsetMixin,
+    exclude_ifrc_ns_without_user_countries,
+    get_user_country_ids,
 )
 from country_plan.models import CountryPlan
 from databank.serializers import CountryOverviewSerializer
-from deployments.models import ERU, Personnel
+from deployments.models import ERU, EmergencyProject, Personnel
 from deployments.serializers import ListDeployedERUByEventSerializer
 from main.enums import GlobalEnumSerializer, get_enum_values
 from main.filters import NullsLastOrderingFilter
@@ -67,13 +57,17 @@ from per.models import Overview
 from per.serializers import CountryLatestOverviewSerializer
 
 from .exceptions import BadRequest
+from .key_figures import (
+    get_live_country_figures,
+    get_snapshot_country_figures,
+    get_snapshot_qs,
+)
 from .models import (
     Action,
     Admin2,
     Appeal,
     AppealDocument,
     AppealHistory,
-    AppealType,
     Country,
     CountryKeyDocument,
     CountryKeyFigure,
@@ -97,9 +91,13 @@ from .models import (
     SituationReportType,
     Snippet,
     SupportedActivity,
-    UserCountry,
     VisibilityChoices,
 )
+from .rollups import (
+    get_country_disaster_months,
+    get_default_disaster_period,
+    get_live_country_disaster_months,
+)
 from .serializers import (  # AppealSerializer,; Tableau Serializers; AppealTableauSerializer,; Go Historical
     ActionSerializer,
     Admin2Serializer,
@@ -269,7 +267,8 @@ class DisasterTypeViewset(viewsets.ReadOnlyModelViewSet):
 class RegionViewset(viewsets.ReadOnlyModelViewSet):
     """Region endpoint with snippet visibility filtering."""
 
-    queryset = Region.objects.annotate(
+    # NOTE: The serializers use the GeoJSON copies of the geometries
+    queryset = Region.objects.defer("bbox").annotate(
         country_plan_count=Count("country__country_plan", filter=Q(country__country_plan__is_publish=True))
     )
 
@@ -285,13 +284,7 @@ class RegionViewset(viewsets.ReadOnlyModelViewSet):
         We implement the IFRC_NS conditional by computing the set of region IDs the user is linked to via UserCountry/Profile
         and excluding IFRC_NS snippets for regions not in that set.
         """
-        from .models import (
-            Country,
-            Profile,
-            RegionSnippet,
-            UserCountry,
-            VisibilityChoices,
-        )
+        from .models import Country, RegionSnippet, VisibilityChoices
         from .utils import is_user_ifrc
 
         user = getattr(self.request, "user", None)
@@ -306,9 +299,7 @@ class RegionViewset(viewsets.ReadOnlyModelViewSet):
                 snip_qs = RegionSnippet.objects.all()
             else:
                 # User-linked countries (Profile.country is optional)
-                user_country_ids = UserCountry.objects.filter(user=user.id).values_list("country", flat=True)
-                profile_country_ids = Profile.objects.filter(user=user.id).values_list("country", flat=True)
-                combined_country_ids = list(user_country_ids.union(profile_country_ids))
+                combined_country_ids = get_user_country_ids(user)
                 # Regions the user is associated with via countries
                 allowed_region_ids_for_ifrc_ns = Country.objects.filter(
                     id__in=combined_country_ids, region__isnull=False
@@ -328,8 +319,10 @@ class RegionViewset(viewsets.ReadOnlyModelViewSet):
 
 
 class CountryViewset(viewsets.ReadOnlyModelViewSet):
-    queryset = Country.objects.filter(is_deprecated=False).annotate(
-        has_country_plan=models.Exists(CountryPlan.objects.filter(country=OuterRef("pk"), is_publish=True))
+    queryset = (
+        Country.objects.filter(is_deprecated=False)
+        .defer("bbox", "centroid")
+        .annotate(has_country_plan=models.Exists(CountryPlan.objects.filter(country=OuterRef("pk"), is_publish=True)))
     )
     filterset_class = CountryFilter
     ordering_fields = "__all__"
@@ -340,7 +333,7 @@ class CountryViewset(viewsets.ReadOnlyModelViewSet):
         # TODO: Can kwargs be other than pk??
         pk = self.kwargs["pk"]
         try:
-            country = get_object_or_404(Country, pk=int(pk))
+            country = get_object_or_404(Country.objects.only("id"), pk=int(pk))
             return self.get_queryset().filter(id=country.id).first()
         except ValueError:
             raise Exception("An error occured", "Country key is unusable", pk)
@@ -384,73 +377,18 @@ class CountryViewset(viewsets.ReadOnlyModelViewSet):
     def get_country_figure(self, request, pk):
         country = self.get_object()
 
-        now = timezone.now()
-        start_date_from = request.GET.get("start_date_from", timezone.now() + timedelta(days=-2 * 365))
-        start_date_to = request.GET.get("start_date_to", timezone.now())
-
-        appeal_conditions = Q(atype=AppealType.APPEAL) | Q(atype=AppealType.INTL)
-
-        all_appealhistory = AppealHistory.objects.select_related("appeal").filter(
-            country=country,
-            appeal__code__isnull=False,
-            valid_from__lt=now,  # TODO: Allow user to provide this?
-            valid_to__gt=now,  # TODO: Allow user to provide this?
-        )
-        if start_date_from and start_date_to:
-            all_appealhistory = all_appealhistory.filter(
-                start_date__gte=start_date_from,
-                start_date__lte=start_date_to,
+        start_date_from = request.GET.get("start_date_from")
+        start_date_to = request.GET.get("start_date_to")
+        # The default period (last 2 years) is served from the current key figure snapshot when there is one
+        appeals_aggregated = None
+        if not start_date_from and not start_date_to:
+            appeals_aggregated = get_snapshot_country_figures(get_snapshot_qs(), country)
+        if appeals_aggregated is None:
+            appeals_aggregated = get_live_country_figures(
+                country,
+                start_date_from or timezone.now() + timedelta(days=-2 * 365),
+                start_date_to or timezone.now(),
             )
-
-        appeals_aggregated = all_appealhistory.annotate(
-            appeal_with_dref=Count(
-                Case(
-                    When(Q(atype=AppealType.DREF), then=1),
-                    output_field=IntegerField(),
-                )
-            ),
-            appeal_without_dref=Count(Case(When(appeal_conditions, then=1), output_field=IntegerField())),
-            total_population=(
-                Case(
-                    When(appeal_conditions | Q(atype=AppealType.DREF), then=F("num_beneficiaries")),
-                    output_field=IntegerField(),
-                )
-            ),
-            amount_requested_all=(
-                Case(
-                    When(appeal_conditions, then=F("amount_requested")),
-                    output_field=IntegerField(),
-                )
-            ),
-            amordref=(
-                Case(
-                    When(appeal_conditions | Q(atype=AppealType.DREF), then=F("amount_requested")),
-                    output_field=IntegerField(),
-                )
-            ),
-            amof=(
-                Case(
-                    When(appeal_conditions, then=F("amount_funded")),
-                    output_field=IntegerField(),
-                )
-            ),
-            amofdref=(
-                Case(
-                    When(appeal_conditions | Q(atype=AppealType.DREF), then=F("amount_funded")),
-                    output_field=IntegerField(),
-                )
-            ),
-            emergencies_count=Count(F("appeal__event_id"), distinct=True),
-        ).aggregate(
-            active_drefs=Sum("appeal_with_dref"),
-            active_appeals=Sum("appeal_without_dref"),
-            target_population=Sum("total_population"),
-            amount_requested=Sum("amount_requested_all"),
-            amount_requested_dref_included=Sum("amordref"),
-            amount_funded=Sum("amof"),
-            amount_funded_dref_included=Sum("amofdref"),
-            emergencies=Sum("emergencies_count"),
-        )
         return Response(CountryKeyFigureSerializer(appeals_aggregated).data)
 
     @extend_schema(
@@ -496,55 +434,7 @@ class CountryViewset(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, url_path="disaster-monthly-count", pagination_class=None)
     def get_country_disaster_monthly_count(self, request, pk):
         country = self.get_object()
-
-        start_date_from = request.GET.get("start_date_from", timezone.now() + timedelta(days=-2 * 365))
-        start_date_to = request.GET.get("start_date_to", timezone.now())
-
-        queryset = (
-            Event.objects.filter(
-                countries__in=[country.id],
-                dtype__isnull=False,
-            )
-            .annotate(date=TruncMonth("disaster_start_date"))
-            .values("date", "countries", "dtype")
-            .annotate(
-                appeal_targeted_population=Coalesce(
-                    Avg(
-                        "appeals__num_beneficiaries",
-                        filter=models.Q(appeals__num_beneficiaries__isnull=False),
-                        output_field=models.IntegerField(),
-                    ),
-                    0,
-                ),
-                latest_field_report_affected=Coalesce(
-                    Subquery(
-                        FieldReport.objects.filter(event=OuterRef("pk"))
-                        .order_by()
-                        .values("event")
-                        .annotate(c=models.F("num_affected"))
-                        .values("c")[:1],
-                        output_field=models.IntegerField(),
-                    ),
-                    0,
-                ),
-                disaster_name=F("dtype__name"),
-                disaster_id=F("dtype__id"),
-            )
-            .annotate(
-                targeted_population=ExpressionWrapper(
-                    (F("appeal_targeted_population") + F("latest_field_report_affected")), output_field=models.IntegerField()
-                )
-            )
-            .order_by("date", "countries", "dtype__name")
-        )
-
-        if start_date_from and start_date_to:
-            queryset = queryset.filter(
-                disaster_start_date__gte=start_date_from,
-                disaster_start_date__lte=start_date_to,
-            )
-
-        return Response(CountryDisasterTypeMonthlySerializer(queryset, many=True).data)
+        return Response(CountryDisasterTypeMonthlySerializer(self.get_disaster_months(request, country), many=True).data)
 
     @extend_schema(
         request=None,
@@ -554,63 +444,27 @@ class CountryViewset(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, url_path="historical-disaster", pagination_class=None)
     def get_country_historical_disaster(self, request, pk):
         country = self.get_object()
-
-        start_date_from = request.GET.get("start_date_from", timezone.now() + timedelta(days=-2 * 365))
-        start_date_to = request.GET.get("start_date_to", timezone.now())
-
         dtype = request.GET.get("dtype", None)
+        return Response(HistoricalDisasterSerializer(self.get_disaster_months(request, country, dtype=dtype), many=True).data)
 
-        queryset = (
-            Event.objects.filter(
-                countries__in=[country.id],
-                dtype__isnull=False,
-            )
-            .annotate(date=TruncMonth("disaster_start_date"))
-            .values("date", "dtype", "countries")
-            .annotate(
-                appeal_targeted_population=Coalesce(
-                    Avg(
-                        "appeals__num_beneficiaries",
-                        filter=models.Q(appeals__num_beneficiaries__isnull=False),
-                        output_field=models.IntegerField(),
-                    ),
-                    0,
-                ),
-                latest_field_report_affected=Coalesce(
-                    Subquery(
-                        FieldReport.objects.filter(event=OuterRef("pk"))
-                        .order_by()
-                        .values("event")
-                        .annotate(c=models.F("num_affected"))
-                        .values("c")[:1],
-                        output_field=models.IntegerField(),
-                    ),
-                    0,
-                ),
-                disaster_name=F("dtype__name"),
-                disaster_id=F("dtype__id"),
-                amount_funded=F("appeals__amount_funded"),
-                amount_requested=F("appeals__amount_requested"),
-            )
-            .annotate(
-                targeted_population=ExpressionWrapper(
-                    (F("appeal_targeted_population") + F("latest_field_report_affected")), output_field=models.IntegerField()
-                )
-            )
-            .order_by("date", "countries", "dtype__name")
+    @staticmethod
+    def get_disaster_months(request, country, dtype=None):
+        """
+        Emergencies of the country per month and disaster type (the appeal amounts summed over them)
+        The default period (last 2 years, by whole months) is served from the monthly rollups when built
+        """
+        default_start_date, default_end_date = get_default_disaster_period(timezone.now())
+        if "start_date_from" not in request.GET and "start_date_to" not in request.GET:
+            disaster_months = get_country_disaster_months(country, default_start_date, default_end_date, dtype=dtype)
+            if disaster_months is not None:
+                return disaster_months
+        return get_live_country_disaster_months(
+            country,
+            request.GET.get("start_date_from", default_start_date),
+            request.GET.get("start_date_to", default_end_date),
+            dtype=dtype,
         )
 
-        if start_date_from and start_date_to:
-            queryset = queryset.filter(
-                disaster_start_date__gte=start_date_from,
-                disaster_start_date__lte=start_date_to,
-            )
-
-        if dtype:
-            queryset = queryset.filter(dtype=dtype)
-
-        return Response(HistoricalDisasterSerializer(queryset, many=True).data)
-
     @extend_schema(request=None, responses=CountryLatestOverviewSerializer)
     @action(detail=True, url_path="latest-per-overview", serializer_class=CountryLatestOverviewSerializer, pagination_class=None)
     def get_latest_per_overview(self, request, pk):
@@ -645,7 +499,11 @@ class CountryKeyDocumentViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class DistrictRMDViewset(viewsets.ReadOnlyModelViewSet):
-    queryset = District.objects.select_related("country").filter(is_deprecated=False)
+    queryset = (
+        District.objects.select_related("country")
+        .defer("bbox", "centroid", "country__bbox", "country__centroid")
+        .filter(is_deprecated=False)
+    )
     filterset_class = DistrictRMDFilter
     search_fields = (
         "name",
@@ -693,7 +551,12 @@ class CountrySnippetViewset(ReadOnlyVisibilityViewset):
 
 
 class DistrictViewset(viewsets.ReadOnlyModelViewSet):
-    queryset = District.objects.select_related("country").filter(country__is_deprecated=False).filter(is_deprecated=False)
+    queryset = (
+        District.objects.select_related("country")
+        .defer("bbox", "centroid", "country__bbox", "country__centroid")
+        .filter(country__is_deprecated=False)
+        .filter(is_deprecated=False)
+    )
     filterset_class = DistrictFilter
     search_fields = (
         "name",
@@ -715,6 +578,7 @@ class Admin2Viewset(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return (
             Admin2.objects.select_related("admin1")
+            .defer("bbox", "centroid", "admin1__bbox", "admin1__centroid")
             .filter(admin1__country__is_deprecated=False)
             .filter(admin1__is_deprecated=False)
             .filter(is_deprecated=False)
@@ -740,9 +604,42 @@ class EventViewset(ReadOnlyVisibilityViewset):
         "dtype__name",
     )  # for /docs
 
+    @staticmethod
+    def annotate_counts(queryset):
+        """Related counts used by the Emergency serializers, as subqueries instead of per Emergency queries"""
+        today = timezone.now().date()
+        return queryset.annotate(
+            active_deployments=Coalesce(
+                Subquery(
+                    Personnel.objects.filter(
+                        deployment__event_deployed_to=OuterRef("pk"),
+                        type=Personnel.TypeChoices.RR,
+                        start_date__date__lte=today,
+                        end_date__date__gte=today,
+                        is_active=True,
+                    )
+                    .order_by()
+                    .values("deployment__event_deployed_to")
+                    .annotate(count=Count("id"))
+                    .values("count")[:1],
+                    output_field=IntegerField(),
+                ),
+                0,
+            ),
+            response_activity_count=Coalesce(
+                Subquery(
+                    EmergencyProject.objects.filter(event=OuterRef("pk"))
+                    .order_by()
+                    .values("event")
+                    .annotate(count=Count("id"))
+                    .values("count")[:1],
+                    output_field=IntegerField(),
+                ),
+                0,
+            ),
+        )
+
     def get_queryset(self, *args, **kwargs):
-        # import pdb; pdb.set_trace();
-        today = timezone.now().date().strftime("%Y-%m-%d")
         qset = super().get_queryset()
         if self.action == "mini_events":
             # return Event.objects.filter(parent_event__isnull=True).select_related('dtype')
@@ -753,7 +650,7 @@ class EventViewset(ReadOnlyVisibilityViewset):
                 .filter(Q(auto_generated=False) | Q(auto_generated_source="New field report"))
                 .select_related("dtype")
             )
-        return (
+        return self.annotate_counts(
             # Event.objects.filter(parent_event__isnull=True)
             qset.filter(parent_event__isnull=True)
             .select_related("dtype")
@@ -770,17 +667,6 @@ class EventViewset(ReadOnlyVisibilityViewset):
                 ),
                 Prefetch("featured_documents", queryset=EventFeaturedDocument.objects.order_by("-id")),
             )
-            .annotate(
-                active_deployments=Count(
-                    "personneldeployment__personnel",
-                    filter=Q(
-                        personneldeployment__personnel__type=Personnel.TypeChoices.RR,
-                        personneldeployment__personnel__start_date__date__lte=today,
-                        personneldeployment__personnel__end_date__date__gte=today,
-                        personneldeployment__personnel__is_active=True,
-                    ),
-                )
-            )
         )
 
     def get_serializer_class(self):
@@ -809,28 +695,22 @@ class EventViewset(ReadOnlyVisibilityViewset):
                     Prefetch("field_reports", queryset=FieldReport.objects.prefetch_related("countries", "contacts")),
                     Prefetch("featured_documents", queryset=EventFeaturedDocument.objects.order_by("-id")),
                 ]
+                queryset = self.annotate_counts(Event.objects.prefetch_related(*prefetches))
                 if self.request.user.is_authenticated and not self.request.user.profile.limit_access_to_guest:
                     if is_user_ifrc(self.request.user):
-                        instance = Event.objects.prefetch_related(*prefetches).get(pk=pk)
+                        instance = queryset.get(pk=pk)
                     else:
-                        user_countries = (
-                            UserCountry.objects.filter(user=request.user.id)
-                            .values("country")
-                            .union(Profile.objects.filter(user=request.user.id).values("country"))
-                        )
-                        instance = (
-                            Event.objects.prefetch_related(*prefetches)
-                            .exclude(visibility=VisibilityChoices.IFRC)
-                            .exclude(Q(visibility=VisibilityChoices.IFRC_NS) & ~Q(countries__id__in=user_countries))
-                            .get(pk=pk)
-                        )
+                        instance = exclude_ifrc_ns_without_user_countries(
+                            queryset.exclude(visibility=VisibilityChoices.IFRC),
+                            request.user,
+                        ).get(pk=pk)
                 else:
-                    instance = Event.objects.prefetch_related(*prefetches).filter(visibility=VisibilityChoices.PUBLIC).get(pk=pk)
+                    instance = queryset.filter(visibility=VisibilityChoices.PUBLIC).get(pk=pk)
                 # instance = Event.get_for(request.user).get(pk=pk)
             except Exception:
                 raise Http404
         elif kwargs["slug"]:
-            instance = Event.objects.filter(slug=kwargs["slug"]).first()
+            instance = self.annotate_counts(Event.objects.filter(slug=kwargs["slug"])).first()
             # instance = Event.get_for(request.user).filter(slug=kwargs['slug']).first()
             if not instance:
                 raise Http404
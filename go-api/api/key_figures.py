@@ -0,0 +1,206 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Subquery, Sum, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AppealHistory, AppealType, KeyFigureSnapshot
+
+# Country figure default period: appeals started within the last 2 years
+RECENT_PERIOD = timedelta(days=2 * 365)
+# The current snapshot is used for "now" while it is not older than this (ingest_appeals retakes it every 30 minutes)
+CURRENT_SNAPSHOT_MAX_AGE = timedelta(hours=1)
+
+HEADER_FIGURES = (
+    "active_drefs",
+    "active_appeals",
+    "total_appeals",
+    "target_population",
+    "amount_requested",
+    "amount_requested_dref_included",
+    "amount_funded",
+    "amount_funded_dref_included",
+)
+COUNTRY_FIGURES = (
+    "active_drefs",
+    "active_appeals",
+    "target_population",
+    "amount_requested",
+    "amount_requested_dref_included",
+    "amount_funded",
+    "amount_funded_dref_included",
+    "emergencies",
+)
+
+
+def get_appeal_history_qs(date):
+    """The appeal versions valid at the date"""
+    return AppealHistory.objects.filter(valid_from__lt=date, valid_to__gt=date, appeal__code__isnull=False)
+
+
+def count_if(condition):
+    return Sum(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+
+
+def sum_if(condition, field):
+    return Sum(Case(When(condition, then=F(field)), output_field=IntegerField()))
+
+
+def get_header_figures_aggregates(date):
+    is_active = Q(end_date__gte=date) & Q(start_date__lte=date)
+    is_appeal = Q(atype=AppealType.APPEAL) | Q(atype=AppealType.INTL)
+    return {
+        # Active Appeals with DREF type
+        "active_drefs": count_if(Q(atype=AppealType.DREF) & is_active),
+        # Active Appeals with type Emergency Appeal or International Appeal
+        "active_appeals": count_if(is_appeal & is_active),
+        # Total Appeals count which are not DREF
+        "total_appeals": count_if(is_appeal),
+        # Active Appeals' target population
+        "target_population": sum_if(is_active, "num_beneficiaries"),
+        # Active Appeals' requested amount, which are not DREF
+        "amount_requested": sum_if(is_appeal & is_active, "amount_requested"),
+        "amount_requested_dref_included": sum_if(is_active, "amount_requested"),
+        # Active Appeals' funded amount, which are not DREF
+        "amount_funded": sum_if(is_appeal & is_active, "amount_funded"),
+        "amount_funded_dref_included": sum_if(is_active, "amount_funded"),
+    }
+
+
+def get_country_figures_aggregates():
+    is_appeal = Q(atype=AppealType.APPEAL) | Q(atype=AppealType.INTL)
+    is_appeal_or_dref = is_appeal | Q(atype=AppealType.DREF)
+    return {
+        "active_drefs": count_if(Q(atype=AppealType.DREF)),
+        "active_appeals": count_if(is_appeal),
+        "target_population": sum_if(is_appeal_or_dref, "num_beneficiaries"),
+        "amount_requested": sum_if(is_appeal, "amount_requested"),
+        "amount_requested_dref_included": sum_if(is_appeal_or_dref, "amount_requested"),
+        "amount_funded": sum_if(is_appeal, "amount_funded"),
+        "amount_funded_dref_included": sum_if(is_appeal_or_dref, "amount_funded"),
+        # Appeal versions linked to an emergency
+        "emergencies": count_if(Q(appeal__event__isnull=False)),
+    }
+
+
+def get_live_header_figures(date, iso3=None, country=None, region=None):
+    appeal_history_qs = get_appeal_history_qs(date)
+    if iso3:
+        appeal_history_qs = appeal_history_qs.filter(country__iso3__iexact=iso3)
+    if country:
+        appeal_history_qs = appeal_history_qs.filter(country__id=country)
+    if region:
+        appeal_history_qs = appeal_history_qs.filter(country__region__id=region)
+    return appeal_history_qs.aggregate(**get_header_figures_aggregates(date))
+
+
+def get_live_country_figures(country, start_date_from, start_date_to):
+    now = timezone.now()
+    appeal_history_qs = get_appeal_history_qs(now).filter(country=country)
+    if start_date_from and start_date_to:
+        appeal_history_qs = appeal_history_qs.filter(start_date__gte=start_date_from, start_date__lte=start_date_to)
+    return appeal_history_qs.aggregate(**get_country_figures_aggregates())
+
+
+def get_recent_field(name):
+    return {"active_drefs": "recent_drefs", "active_appeals": "recent_appeals"}.get(name, f"recent_{name}")
+
+
+@transaction.atomic
+def take_snapshot(as_of, is_daily=False):
+    """Compute the key figures of each country at as_of, replacing the current (or the same daily) snapshot"""
+    snapshots = {}
+    header_figures_qs = (
+        get_appeal_history_qs(as_of)
+        .order_by()
+        .values("country_id", "country__region_id")
+        .annotate(**get_header_figures_aggregates(as_of))
+    )
+    for figures in header_figures_qs:
+        snapshots[figures["country_id"]] = KeyFigureSnapshot(
+            as_of=as_of,
+            is_daily=is_daily,
+            country_id=figures["country_id"],
+            region_id=figures["country__region_id"],
+            **{name: figures[name] for name in HEADER_FIGURES},
+        )
+    country_figures_qs = (
+        get_appeal_history_qs(as_of)
+        .filter(start_date__gte=as_of - RECENT_PERIOD, start_date__lte=as_of)
+        .order_by()
+        .values("country_id")
+        .annotate(**get_country_figures_aggregates())
+    )
+    for figures in country_figures_qs:
+        # Recent appeals are valid at as_of, so the country already has its snapshot
+        snapshot = snapshots[figures["country_id"]]
+        for name in COUNTRY_FIGURES:
+            setattr(snapshot, get_recent_field(name), figures[name])
+
+    if is_daily:
+        KeyFigureSnapshot.objects.filter(is_daily=True, as_of=as_of).delete()
+    else:
+        KeyFigureSnapshot.drop_current()
+    return KeyFigureSnapshot.objects.bulk_create(snapshots.values())
+
+
+def take_daily_snapshot(date):
+    return take_snapshot(timezone.make_aware(datetime.combine(date, time.min)), is_daily=True)
+
+
+def take_current_snapshot():
+    return take_snapshot(timezone.now())
+
+
+def get_snapshot_qs(date=None):
+    """
+    Rows of the snapshot to use for the date (the request `date` param), None if the date can't have one:
+    - Without date: the current snapshot, if recent enough
+    - With a date (YYYY-MM-DD): the daily snapshot of the date
+    - With a datetime: only a daily snapshot at this exact time
+    The current snapshot is selected within the same query as its rows, as it can be replaced or dropped meanwhile.
+    """
+    if date is None:
+        latest_as_of_qs = (
+            KeyFigureSnapshot.objects.filter(is_daily=False, as_of__gte=timezone.now() - CURRENT_SNAPSHOT_MAX_AGE)
+            .order_by("-as_of")
+            .values("as_of")[:1]
+        )
+        return KeyFigureSnapshot.objects.filter(is_daily=False, as_of=Subquery(latest_as_of_qs))
+
+    try:
+        as_of = parse_datetime(date)
+        if as_of is None:
+            day = parse_date(date)
+            if day is None:
+                return None
+            as_of = datetime.combine(day, time.min)
+    except ValueError:
+        # Well formatted but invalid, left to the live computation
+        return None
+    if timezone.is_naive(as_of):
+        as_of = timezone.make_aware(as_of)
+    return KeyFigureSnapshot.objects.filter(is_daily=True, as_of=as_of)
+
+
+def get_snapshot_header_figures(snapshot_qs, iso3=None, country=None, region=None):
+    """None if the snapshot has no rows for the filters (missing snapshot, or no appeals), left to the live figures"""
+    if iso3:
+        snapshot_qs = snapshot_qs.filter(country__iso3__iexact=iso3)
+    if country:
+        snapshot_qs = snapshot_qs.filter(country__id=country)
+    if region:
+        snapshot_qs = snapshot_qs.filter(region__id=region)
+    figures = snapshot_qs.aggregate(snapshot_rows=Count("id"), **{name: Sum(name) for name in HEADER_FIGURES})
+    if not figures.pop("snapshot_rows"):
+        return None
+    return figures
+
+
+def get_snapshot_country_figures(snapshot_qs, country):
+    """None if the snapshot has no row for the country, left to the live figures"""
+    snapshot = snapshot_qs.filter(country=country).first()
+    if snapshot is None:
+        return None
+    return {name: getattr(snapshot, get_recent_field(name)) for name in COUNTRY_FIGURES}
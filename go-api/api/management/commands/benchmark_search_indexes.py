@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections as db_connections
+from haystack import connections
+from haystack.exceptions import SkipDocument
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the rebuild throughput of each haystack search index (records/second and SQL queries)."
+        " Records are read and prepared like update_index does, but are not sent to Elasticsearch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=1000, help="Max records per index")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Same as update_index --batch-size")
+        parser.add_argument(
+            "--index",
+            action="append",
+            dest="indexes",
+            help="Only benchmark these indexes (class name, e.g. AppealIndex), can be repeated",
+        )
+        parser.add_argument("--using", default="default", help="Haystack connection")
+
+    def handle(self, *args, **options):
+        using = options["using"]
+        for index in connections[using].get_unified_index().get_indexes().values():
+            name = type(index).__name__
+            if options["indexes"] and name not in options["indexes"]:
+                continue
+            count, seconds, queries = self.benchmark(index, using, options["limit"], options["batch_size"])
+            self.stdout.write(
+                f"{name}: {count} records in {seconds:.2f} seconds"
+                f" ({count / seconds if seconds else 0:.0f} records/second), {queries} SQL queries"
+            )
+
+    @staticmethod
+    def benchmark(index, using, limit, batch_size):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        count = 0
+        start = time.perf_counter()
+        with db_connections["default"].execute_wrapper(count_queries):
+            queryset = index.build_queryset(using=using)
+            for batch_start in range(0, limit, batch_size):
+                batch = list(queryset[batch_start : min(batch_start + batch_size, limit)])
+                if not batch:
+                    break
+                for obj in batch:
+                    try:
+                        index.full_prepare(obj)
+                    except SkipDocument:
+                        pass
+                    count += 1
+        return count, time.perf_counter() - start, queries
@@ -4,17 +4,14 @@ from datetime import datetime, timedelta, timezone
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
-from django.db.models import DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models import Q, prefetch_related_objects
 from django.db.models.query import QuerySet
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from elasticsearch.helpers import bulk
 from sentry_sdk.crons import monitor
 
-from api.esconnection import ES_CLIENT
 from api.logger import logger
 from api.models import (
-    ActionsTaken,
     Appeal,
     Country,
     CronJob,
@@ -22,12 +19,14 @@ from api.models import (
     Event,
     FieldReport,
 )
-from deployments.models import ERU, Personnel, PersonnelDeployment
+from deployments.models import PersonnelDeployment
 from main.sentry import SentryMonitor
 from notifications.hello import get_hello
 from notifications.models import RecordType, Subscription, SubscriptionType, SurgeAlert
-from notifications.notification import send_notification
-from utils.elasticsearch import construct_es_data
+from notifications.notification import EmailDispatcher, send_notification
+from notifications.subscription_index import SubscriptionIndex
+from notifications.weekly_digest import WeeklyDigest
+from utils.elasticsearch import index_search_index_outbox
 
 time_5_minutes = timedelta(minutes=5)
 time_1_day = timedelta(days=1)
@@ -70,6 +69,9 @@ RTYPE_NAMES = {
 class Command(BaseCommand):
     help = "Index and send notifications about new/changed records"
 
+    # See get_subscription_index
+    _subscription_index = None
+
     # Digest mode duration is 5 minutes once a week
     def is_digest_mode(self):
         today = datetime.utcnow().replace(tzinfo=timezone.utc)
@@ -152,76 +154,58 @@ class Command(BaseCommand):
             stype = SubscriptionType.NEW
         return rtype, stype
 
+    def get_subscription_index(self):
+        # Built once per run, shared by all the record types
+        if self._subscription_index is None:
+            self._subscription_index = SubscriptionIndex()
+        return self._subscription_index
+
     def gather_subscribers(self, records, rtype, stype):
         rtype_of_subscr, stype = self.fix_types_for_subs(rtype, stype)
+        subscription_index = self.get_subscription_index()
 
         # Gather the email addresses of users who should be notified
         if self.is_digest_mode():
-            subscribers = User.objects.filter(subscription__rtype=RecordType.WEEKLY_DIGEST, is_active=True).values("email")
             # In digest mode we do not care about other circumstances, just get every subscriber's email.
-            emails = list(set([subscriber["email"] for subscriber in subscribers]))
-            return emails
-        else:
-            # Start with any users subscribed directly to this record type.
-            subscribers = User.objects.filter(
-                subscription__rtype=rtype_of_subscr, subscription__stype=stype, is_active=True
-            ).values("email")
-            emails = list(set([subscriber["email"] for subscriber in subscribers]))
-
-        # For FOLLOWED_EVENTs we do not collect other generic (d*, country, region) subscriptions.
-        if rtype_of_subscr != RecordType.FOLLOWED_EVENT:
-            subscribers_no_geo_dtype = (
-                User.objects.filter(subscription__rtype=rtype_of_subscr, subscription__stype=stype, is_active=True)
-                .exclude(subscription__rtype__in=[RecordType.COUNTRY, RecordType.REGION, RecordType.DTYPE])
-                .values("email")
-            )
-            emailset_no_geo_dtype = {subscriber["email"] for subscriber in subscribers_no_geo_dtype}
+            return subscription_index.get_emails(subscription_index.get_users_by_rtypes([RecordType.WEEKLY_DIGEST]))
 
-            subscribers_geo = (
-                User.objects.filter(subscription__rtype=rtype_of_subscr, subscription__stype=stype, is_active=True)
-                .filter(subscription__rtype__in=[RecordType.COUNTRY, RecordType.REGION])
-                .values("email")
-            )
-            emailset_geo = {subscriber["email"] for subscriber in subscribers_geo}
+        # Start with any users subscribed directly to this record type.
+        subscribers = subscription_index.get_users(rtype_of_subscr, stype)
 
-            subscribers_dtype = (
-                User.objects.filter(subscription__rtype=rtype_of_subscr, subscription__stype=stype, is_active=True)
-                .filter(subscription__rtype=RecordType.DTYPE)
-                .values("email")
-            )
-            emailset_dtype = {subscriber["email"] for subscriber in subscribers_dtype}
-
-            if rtype_of_subscr == RecordType.NEW_OPERATIONS:
-                countries, regions = self.gather_country_and_region(records)
-            elif rtype_of_subscr == RecordType.SURGE_ALERT:
-                countries, regions = self.gather_event_countries_and_regions(records)
-            elif rtype_of_subscr == RecordType.SURGE_DEPLOYMENT_MESSAGES:
-                countries, regions = self.gather_eventdt_countries_and_regions(records)
-            else:
-                countries, regions = self.gather_countries_and_regions(records)
+        # For FOLLOWED_EVENTs we do not collect other generic (d*, country, region) subscriptions.
+        if rtype_of_subscr == RecordType.FOLLOWED_EVENT:
+            return subscription_index.get_emails(subscribers)
+
+        geo_subscribers = subscription_index.get_users_by_rtypes([RecordType.COUNTRY, RecordType.REGION])
+        dtype_subscribers = subscription_index.get_users_by_rtypes([RecordType.DTYPE])
+        subscribers_no_geo_dtype = subscribers - geo_subscribers - dtype_subscribers
+        subscribers_geo = subscribers & geo_subscribers
+        subscribers_dtype = subscribers & dtype_subscribers
+
+        if rtype_of_subscr == RecordType.NEW_OPERATIONS:
+            countries, regions = self.gather_country_and_region(records)
+        elif rtype_of_subscr == RecordType.SURGE_ALERT:
+            countries, regions = self.gather_event_countries_and_regions(records)
+        elif rtype_of_subscr == RecordType.SURGE_DEPLOYMENT_MESSAGES:
+            countries, regions = self.gather_eventdt_countries_and_regions(records)
+        else:
+            countries, regions = self.gather_countries_and_regions(records)
 
-            if rtype_of_subscr == RecordType.SURGE_ALERT:
-                dtypes = list(set(["d%s" % record.event.dtype.id for record in records if record.event.dtype is not None]))
-            elif rtype_of_subscr == RecordType.SURGE_DEPLOYMENT_MESSAGES:
-                dtypes = list(set(["d%s" % rec.event_deployed_to.dtype.id for rec in records if rec.event_deployed_to.dtype]))
-            else:
-                dtypes = list(set(["d%s" % record.dtype.id for record in records if record.dtype is not None]))
+        if rtype_of_subscr == RecordType.SURGE_ALERT:
+            dtypes = list(set(["d%s" % record.event.dtype.id for record in records if record.event.dtype is not None]))
+        elif rtype_of_subscr == RecordType.SURGE_DEPLOYMENT_MESSAGES:
+            dtypes = list(set(["d%s" % rec.event_deployed_to.dtype.id for rec in records if rec.event_deployed_to.dtype]))
+        else:
+            dtypes = list(set(["d%s" % record.dtype.id for record in records if record.dtype is not None]))
 
-            geo = countries + regions
-            if len(geo):
-                emailset_geo = emailset_geo & {
-                    subscriber["email"]
-                    for subscriber in User.objects.filter(subscription__lookup_id__in=geo, is_active=True).values("email")
-                }
+        geo = countries + regions
+        if len(geo):
+            subscribers_geo &= subscription_index.get_users_by_lookup_ids(geo)
 
-            if len(dtypes):
-                emailset_dtype = emailset_dtype & {
-                    subscriber["email"]
-                    for subscriber in User.objects.filter(subscription__lookup_id__in=dtypes, is_active=True).values("email")
-                }
+        if len(dtypes):
+            subscribers_dtype &= subscription_index.get_users_by_lookup_ids(dtypes)
 
-            emails = list(emailset_no_geo_dtype | emailset_geo | emailset_dtype)
-        return emails
+        return subscription_index.get_emails(subscribers_no_geo_dtype | subscribers_geo | subscribers_dtype)
 
     def get_template(self, rtype=99):
         # older: return 'email/generic_notification.html'
@@ -336,160 +320,22 @@ class Command(BaseCommand):
             display += "s"
         return display
 
-    def get_weekly_digest_data(self, field):
-        today = datetime.utcnow().replace(tzinfo=timezone.utc)
-        if field == "dref":
-            return Appeal.objects.filter(end_date__gt=today, atype=0).count()
-        elif field == "ea":
-            return Appeal.objects.filter(end_date__gt=today, atype=1).count()
-        elif field == "fund":
-            amount_req = (
-                Appeal.objects.filter(Q(end_date__gt=today, atype=1) | Q(end_date__gt=today, atype=2)).aggregate(
-                    Sum("amount_requested")
-                )["amount_requested__sum"]
-                or 0
-            )
-            amount_fund = (
-                Appeal.objects.filter(Q(end_date__gt=today, atype=1) | Q(end_date__gt=today, atype=2)).aggregate(
-                    Sum("amount_funded")
-                )["amount_funded__sum"]
-                or 0
-            )
-            percent = float(round(amount_fund / amount_req, 3) * 100) if amount_req != 0 else 0
-            return percent
-        elif field == "budget":
-            amount = Appeal.objects.filter(end_date__gt=today).aggregate(Sum("amount_requested"))["amount_requested__sum"] or 0
-            rounded_amount = round(amount / 1000000, 2)
-            return rounded_amount
-        elif field == "pop":
-            people = Appeal.objects.filter(end_date__gt=today).aggregate(Sum("num_beneficiaries"))["num_beneficiaries__sum"] or 0
-            rounded_people = round(people / 1000000, 2)
-            return rounded_people
-
-    def get_weekly_digest_latest_ops(self):
-        dig_time = self.diff_1_week()
-        ops = Appeal.objects.filter(created_at__gte=dig_time).order_by("-created_at")
-        ret_ops = []
-        for op in ops:
-            op_to_add = {
-                "op_event_id": op.event_id,
-                "op_country": Country.objects.values_list("name", flat=True).get(id=op.country_id) if op.country_id else "",
-                "op_name": op.name,
-                "op_created_at": op.created_at,
-                "op_funding": float(op.amount_requested),
-            }
-            ret_ops.append(op_to_add)
-        return ret_ops
-
-    def get_weekly_digest_latest_deployments(self):
-        dig_time = self.diff_1_week()
-        ret_data = []
-
-        # Surge Alerts
-        # surge_list = list(SurgeAlert.objects.filter(created_at__gte=dig_time).order_by('-created_at'))
-        # if surge_list:
-        #     for alert in surge_list:
-        #         event = Event.objects.get(id=alert.event_id) if alert.event_id != None else None
-        #         alert_to_add = {
-        #             'type': 'Alert',
-        #             'operation': alert.operation,
-        #            'event_url': (
-        #                '{}/emergencies/{}'.format(settings.FRONTEND_URL, event.id) if event else
-        #                settings.FRONTEND_URL,
-        #            ),
-        #             'society_from': '',
-        #             'deployed_to': '',
-        #             'name': '',
-        #             'role': '',
-        #             'appeal': '',
-        #         }
-        #         ret_data.append(alert_to_add)
-
-        # Surge Deployments
-        personnel_list = Personnel.objects.filter(start_date__gte=dig_time).order_by("start_date")
-        for pers in personnel_list:
-            deployment = PersonnelDeployment.objects.get(id=pers.deployment_id)
-            event = Event.objects.get(id=deployment.event_deployed_to_id) if deployment.event_deployed_to_id is not None else None
-            country_from = Country.objects.get(id=pers.country_from_id) if pers.country_from_id is not None else None
-            dep_to_add = {
-                "operation": event.name if event else "",
-                "event_url": ("{}/emergencies/{}".format(settings.FRONTEND_URL, event.id) if event else settings.FRONTEND_URL),
-                "society_from": country_from.society_name if country_from else "",
-                "name": pers.name,
-                "role": pers.role,
-                "start_date": pers.start_date,
-                "end_date": pers.end_date,
-            }
-            ret_data.append(dep_to_add)
-
-        return ret_data
-
-    def get_weekly_digest_highlights(self):
-        dig_time = self.diff_1_week()
-        events = Event.objects.filter(is_featured=True, updated_at__gte=dig_time).order_by("-updated_at")
-        ret_highlights = []
-        for ev in events:
-            amount_requested = (
-                Appeal.objects.filter(event_id=ev.id).aggregate(Sum("amount_requested"))["amount_requested__sum"] or "--"
-            )
-            amount_funded = Appeal.objects.filter(event_id=ev.id).aggregate(Sum("amount_funded"))["amount_funded__sum"] or "--"
-            coverage = "--"
-
-            if amount_funded != "--" and amount_requested != "--":
-                coverage = round(amount_funded / amount_requested, 1) if amount_requested != 0 else 0
-
-            data_to_add = {
-                "hl_id": ev.id,
-                "hl_name": ev.name,
-                "hl_last_update": ev.updated_at,
-                "hl_people": (
-                    Appeal.objects.filter(event_id=ev.id).aggregate(Sum("num_beneficiaries"))["num_beneficiaries__sum"] or "--"
-                ),
-                "hl_funding": amount_requested,
-                "hl_deployed_eru": ERU.objects.filter(event_id=ev.id).aggregate(Sum("units"))["units__sum"] or "--",
-                "hl_deployed_sp": PersonnelDeployment.objects.filter(event_deployed_to_id=ev.id).count(),
-                "hl_coverage": coverage,
-            }
-            ret_highlights.append(data_to_add)
-        return ret_highlights
-
-    def get_actions_taken(self, frid):
+    def get_actions_taken(self, record):
         ret_actions_taken = {
             "NTLS": [],
             "PNS": [],
             "FDRN": [],
         }
-        actions_taken = ActionsTaken.objects.filter(field_report_id=frid)
-        for at in actions_taken:
+        # actions_taken__actions is prefetched by notify
+        for at in record.actions_taken.all():
             action_to_add = {
                 "action_summary": at.summary,
-                "actions": [],
+                "actions": list(at.actions.all()),
             }
-            if at.actions.all():
-                for act in at.actions.all():
-                    action_to_add["actions"].append(act)
-            if at.organization == "NTLS":
-                ret_actions_taken["NTLS"].append(action_to_add)
-            elif at.organization == "PNS":
-                ret_actions_taken["PNS"].append(action_to_add)
-            elif at.organization == "FDRN":
-                ret_actions_taken["FDRN"].append(action_to_add)
+            if at.organization in ret_actions_taken:
+                ret_actions_taken[at.organization].append(action_to_add)
         return ret_actions_taken
 
-    def get_weekly_latest_frs(self):
-        dig_time = self.diff_1_week()
-        ret_fr_list = []
-        fr_list = list(FieldReport.objects.filter(created_at__gte=dig_time).order_by("-created_at"))
-        for fr in fr_list:
-            fr_data = {
-                "id": fr.id,
-                "country": fr.countries.all()[0].name if fr.countries else None,
-                "summary": fr.summary,
-                "created_at": fr.created_at,
-            }
-            ret_fr_list.append(fr_data)
-        return ret_fr_list
-
     def get_fieldreport_keyfigures(self, num_list):
         """Return the first non-None element from num_list as float, or None if all are None."""
         for num in num_list:
@@ -548,7 +394,7 @@ class Command(BaseCommand):
                 },
                 "epi_figures_source": self.get_epi_figures_source_name(record.epi_figures_source),
                 "sit_fields_date": record.sit_fields_date,
-                "actions_taken": self.get_actions_taken(record.id),
+                "actions_taken": self.get_actions_taken(record),
                 "actions_others": record.actions_others.split("\n") if record.actions_others else None,
                 "gov_assistance": "Yes" if record.request_assistance else "No",
                 "ns_assistance": "Yes" if record.ns_request_assistance else "No",
@@ -680,19 +526,6 @@ class Command(BaseCommand):
                 "operation_type_short": optypeShort[record.atype],
                 "field_reports": field_reports,
             }
-        elif rtype == RecordType.WEEKLY_DIGEST:
-            rec_obj = {
-                "resource_uri": settings.FRONTEND_URL,
-                "active_dref": self.get_weekly_digest_data("dref"),
-                "active_ea": self.get_weekly_digest_data("ea"),
-                "funding_coverage": self.get_weekly_digest_data("fund"),
-                "budget": self.get_weekly_digest_data("budget"),
-                "population": self.get_weekly_digest_data("pop"),
-                "highlighted_ops": self.get_weekly_digest_highlights(),
-                "latest_ops": self.get_weekly_digest_latest_ops(),
-                "latest_deployments": self.get_weekly_digest_latest_deployments(),
-                "latest_field_reports": self.get_weekly_latest_frs(),
-            }
         elif rtype == RecordType.SURGE_ALERT:
             rec_obj = {
                 "resource_uri": self.get_resource_uri(record, rtype),
@@ -709,6 +542,27 @@ class Command(BaseCommand):
             }
         return rec_obj
 
+    def notify_weekly_digest(self, subject, emails):
+        # The digest is built and rendered once per variant, IFRC users also get the IFRC only field reports
+        digest = WeeklyDigest(datetime.utcnow().replace(tzinfo=timezone.utc))
+        ifrc_emails = set(
+            User.objects.filter(email__in=emails)
+            .filter(Q(groups__name="IFRC Admins") | Q(is_superuser=True))
+            .values_list("email", flat=True)
+        )
+        for is_ifrc, variant in ((True, "ifrc"), (False, "non_ifrc")):
+            recipients = [email for email in emails if (email in ifrc_emails) == is_ifrc]
+            if not recipients:
+                continue
+            plural = "" if len(recipients) == 1 else "s"
+            logger.info("Notifying %s subscriber%s about the weekly digest (%s)" % (len(recipients), plural, variant))
+            send_notification(
+                subject,
+                recipients,
+                digest.render(subject, is_ifrc),
+                RTYPE_NAMES[RecordType.WEEKLY_DIGEST] + f" notification ({variant}) - " + subject,
+            )
+
     def notify(self, records, rtype, stype, uid=None):
         record_count = 0
         if records:
@@ -733,10 +587,10 @@ class Command(BaseCommand):
 
         # Only serialize the first 10 records
         record_entries = []
-        if rtype == RecordType.WEEKLY_DIGEST:
-            record_entries.append(self.construct_template_record(rtype, None))
-        else:
+        if rtype != RecordType.WEEKLY_DIGEST:
             entries = list(records) if record_count <= 10 else list(records[:10])
+            if rtype == RecordType.FIELD_REPORT:
+                prefetch_related_objects(entries, "actions_taken__actions")
             for record in entries:
                 record_entries.append(self.construct_template_record(rtype, record))
 
@@ -781,8 +635,12 @@ class Command(BaseCommand):
         if self.is_daily_checkup_time():
             subject += " [daily followup]"
 
+        if rtype == RecordType.WEEKLY_DIGEST:
+            self.notify_weekly_digest(subject, emails)
+            return
+
         template_path = self.get_template()
-        if rtype == RecordType.FIELD_REPORT or rtype == RecordType.APPEAL or rtype == RecordType.WEEKLY_DIGEST:
+        if rtype == RecordType.FIELD_REPORT or rtype == RecordType.APPEAL:
             template_path = self.get_template(rtype)
 
         html = render_to_string(
@@ -927,15 +785,11 @@ class Command(BaseCommand):
                         "Silent about a one-by-one subscribed %s – user already notified via generic subscription" % (record_type)
                     )
 
-    def index_records(self, records, to_create=True):
-        self.bulk([construct_es_data(record, is_create=to_create) for record in list(records)])
-
-    def bulk(self, actions):
+    def index_changes(self):
+        # The changes are written to SearchIndexOutbox by the model signals (api/receivers.py)
         try:
-            created, errors = bulk(client=ES_CLIENT, actions=actions)
-            if len(errors):
-                logger.error("Produced the following errors:")
-                logger.error("[%s]" % ", ".join(map(str, errors)))
+            processed_count = index_search_index_outbox()
+            logger.info("Indexed %s changes" % processed_count)
         except Exception as e:
             logger.error("Could not index records")
             logger.error("%s..." % str(e)[:512])
@@ -997,76 +851,48 @@ class Command(BaseCommand):
 
         cond1 = Q(created_at__gte=time_diff)
         condU = Q(updated_at__gte=time_diff)
-        condR = Q(real_data_update__gte=time_diff)  # instead of modified at
         cond2 = ~Q(previous_update__gte=time_diff_1_day)  # negate (~) no previous_update in the last day, so send once a day
         condF = Q(
             auto_generated_source="New field report"
         )  # exclude those events that were generated from field reports, to avoid 2x notif.
         condE = Q(status=CronJobStatus.ERRONEOUS)
 
-        # ".annotate(diff...)" - To check if a record was newly created, we check if
-        # `created_at` and `updated_at` are within one minute of each other, since those values
-        # can be off by some miliseconds upon insertion. (could be seconds too perhaps)
         new_reports = FieldReport.objects.filter(cond1)
-        updated_reports = FieldReport.objects.annotate(
-            diff=ExpressionWrapper(F("updated_at") - F("created_at"), output_field=DurationField())
-        ).filter(condU & cond2 & Q(diff__gt=timedelta(minutes=1)))
-
         new_appeals = Appeal.objects.filter(cond1)
-        updated_appeals = Appeal.objects.annotate(
-            diff=ExpressionWrapper(F("real_data_update") - F("created_at"), output_field=DurationField())
-        ).filter(condR & cond2 & Q(diff__gt=timedelta(minutes=1)))
-
-        all_new_events = Event.objects.filter(cond1)
-        new_events = all_new_events.exclude(condF)
-        updated_events = Event.objects.annotate(
-            diff=ExpressionWrapper(F("updated_at") - F("created_at"), output_field=DurationField())
-        ).filter(condU & cond2 & Q(diff__gt=timedelta(minutes=1)))
+        new_events = Event.objects.filter(cond1).exclude(condF)
 
         new_surgealerts = SurgeAlert.objects.filter(cond1)
         new_pers_deployments = PersonnelDeployment.objects.filter(cond1)
 
-        # Merge Weekly Digest into one mail instead of separate ones
-        if self.is_digest_mode():
-            self.notify(None, RecordType.WEEKLY_DIGEST, SubscriptionType.NEW)
-        else:
-            self.notify(new_reports, RecordType.FIELD_REPORT, SubscriptionType.NEW)
-            # self.notify(updated_reports, RecordType.FIELD_REPORT, SubscriptionType.EDIT)
-            self.notify(new_appeals, RecordType.APPEAL, SubscriptionType.NEW)
-            # self.notify(updated_appeals, RecordType.APPEAL, SubscriptionType.EDIT)
-            self.notify(new_events, RecordType.EVENT, SubscriptionType.NEW)
-            # self.notify(updated_events, RecordType.EVENT, SubscriptionType.EDIT)
-            self.notify(new_surgealerts, RecordType.SURGE_ALERT, SubscriptionType.NEW)
-            self.notify(new_pers_deployments, RecordType.SURGE_DEPLOYMENT_MESSAGES, SubscriptionType.NEW)
-
-        # Followed Events
-        if self.is_daily_checkup_time():
-            condU = Q(updated_at__gte=time_diff_1_day)
-            cond2 = Q(previous_update__gte=time_diff_1_day)  # not negated, we collect those, who had 2 changes in the last 1 day
-
-        fe_subs = Subscription.objects.filter(event_id__isnull=False)  # subscriptions of FEs
-        subscribers = fe_subs.values_list("user_id", flat=True).distinct()
-        for usr in subscribers:  # looping in user_ids of specific FOLLOWED_EVENT subscriptions
-            eventlist = fe_subs.filter(user_id=usr).values_list("event_id", flat=True).distinct()
-            cond3 = Q(pk__in=eventlist)
-            followed_events = Event.objects.filter(condU & cond2 & cond3)
-            if len(followed_events):  # usr - unique (we loop one-by-one), followed_events - more
-                self.notify(followed_events, RecordType.FOLLOWED_EVENT, SubscriptionType.NEW, usr)
+        # The notifications are sent concurrently, all of them before the indexing
+        with EmailDispatcher():
+            # Merge Weekly Digest into one mail instead of separate ones
+            if self.is_digest_mode():
+                self.notify(None, RecordType.WEEKLY_DIGEST, SubscriptionType.NEW)
+            else:
+                self.notify(new_reports, RecordType.FIELD_REPORT, SubscriptionType.NEW)
+                self.notify(new_appeals, RecordType.APPEAL, SubscriptionType.NEW)
+                self.notify(new_events, RecordType.EVENT, SubscriptionType.NEW)
+                self.notify(new_surgealerts, RecordType.SURGE_ALERT, SubscriptionType.NEW)
+                self.notify(new_pers_deployments, RecordType.SURGE_DEPLOYMENT_MESSAGES, SubscriptionType.NEW)
+
+            # Followed Events
+            if self.is_daily_checkup_time():
+                condU = Q(updated_at__gte=time_diff_1_day)
+                # not negated, we collect those, who had 2 changes in the last 1 day
+                cond2 = Q(previous_update__gte=time_diff_1_day)
+
+            fe_subs = Subscription.objects.filter(event_id__isnull=False)  # subscriptions of FEs
+            subscribers = fe_subs.values_list("user_id", flat=True).distinct()
+            for usr in subscribers:  # looping in user_ids of specific FOLLOWED_EVENT subscriptions
+                eventlist = fe_subs.filter(user_id=usr).values_list("event_id", flat=True).distinct()
+                cond3 = Q(pk__in=eventlist)
+                followed_events = Event.objects.filter(condU & cond2 & cond3)
+                if len(followed_events):  # usr - unique (we loop one-by-one), followed_events - more
+                    self.notify(followed_events, RecordType.FOLLOWED_EVENT, SubscriptionType.NEW, usr)
 
         # Indexing
-        logger.info("Indexing %s new field reports" % new_reports.count())
-        self.index_records(new_reports)
-        logger.info("Indexing %s new appeals" % new_appeals.count())
-        self.index_records(new_appeals)
-        logger.info("Indexing %s new events" % new_events.count())
-        self.index_records(all_new_events)
-
-        logger.info("Indexing %s updated field reports" % updated_reports.count())
-        self.index_records(updated_reports, to_create=False)
-        logger.info("Indexing %s updated appeals" % updated_appeals.count())
-        self.index_records(updated_appeals, to_create=False)
-        logger.info("Indexing %s updated events" % updated_events.count())
-        self.index_records(updated_events, to_create=False)
+        self.index_changes()
 
         # CronJob feedback of smtp server working is in: notifications/notification.py
         having_ingest_issue = CronJob.objects.filter(cond1 & condE)
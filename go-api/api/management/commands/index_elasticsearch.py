@@ -1,12 +1,12 @@
 from django.core.management.base import BaseCommand
 from elasticsearch.client import IndicesClient
-from elasticsearch.helpers import bulk
 
 from api.esconnection import ES_CLIENT
 from api.indexes import ES_PAGE_NAME, GenericMapping, GenericSetting
 from api.logger import logger
 from api.models import Appeal, Country, Event, FieldReport, Region
-from utils.elasticsearch import construct_es_data
+from api.typeahead import invalidate_typeahead_index
+from utils.elasticsearch import chunked_bulk, construct_es_data, iter_indexing_records
 
 
 class Command(BaseCommand):
@@ -31,6 +31,8 @@ class Command(BaseCommand):
         logger.info("Indexing field reports")
         self.push_table_to_index(model=FieldReport)
 
+        invalidate_typeahead_index()
+
     def recreate_index(self, index_name, index_mapping, index_setting):
         indices_client = IndicesClient(client=ES_CLIENT)
         if indices_client.exists(index_name):
@@ -45,8 +47,7 @@ class Command(BaseCommand):
             query = model.objects.filter(in_search=True)
         else:
             query = model.objects.all()
-        data = [construct_es_data(s, is_create=True) for s in list(query)]
-        created, errors = bulk(client=ES_CLIENT, actions=data)
+        created, errors = chunked_bulk(construct_es_data(s, is_create=True) for s in iter_indexing_records(query))
         logger.info("Created %s records" % created)
         if len(errors):
             logger.error("Produced the following errors:")
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta, timezone
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone as tz
 from requests import Session
 from requests import exceptions as reqexc
@@ -12,30 +13,42 @@ from sentry_sdk.crons import monitor
 
 from api.create_cron import create_cron_record
 from api.fixtures.dtype_map import DISASTER_TYPE_MAPPING
+from api.key_figures import take_current_snapshot
 from api.logger import logger
 from api.models import (
     Appeal,
     AppealFilter,
+    AppealHistory,
     AppealType,
     Country,
     CronJobStatus,
     DisasterType,
     Event,
     GECCode,
+    MonthlyRollup,
     Region,
+    SearchIndexOutbox,
 )
+from api.receivers import (
+    CACHE_TAGS_GETTERS,
+    invalidate_api_cache_on_commit,
+)
+from api.rollups import get_month, refresh_rollups
 from main.sentry import SentryMonitor
 
 CRON_NAME = "ingest_appeals"
 # DANGER! It should be changed when disaster type changes in database:
 DTYPE_KEYS = [a.lower() for a in DISASTER_TYPE_MAPPING.keys()]
 DTYPE_VALS = [a.lower() for a in DISASTER_TYPE_MAPPING.values()]
-GEC_CODES = GECCode.objects.select_related("country").all()
+REGIONS = {"africa": 0, "americas": 1, "asia pacific": 2, "europe": 3, "middle east and north africa": 4}
 
 
 class Command(BaseCommand):
     help = "Add new entries from Access database file"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Appeals per bulk_create/bulk_update query")
+
     def parse_date(self, date_string):
         timeformat = "%Y-%m-%dT%H:%M:%S"
         return datetime.strptime(date_string[:18], timeformat).replace(tzinfo=timezone.utc)
@@ -60,7 +73,7 @@ class Command(BaseCommand):
             # read from static file for development
             logger.info("Using local appeals.json file")
 
-            codes = Appeal.objects.values_list("code", flat=True)
+            modified_at_by_code = dict(Appeal.objects.values_list("code", "modified_at"))
             if AppealFilter.objects.values_list("value", flat=True).filter(name="ingestAppealFilter").count() > 0:
                 codes_skip = AppealFilter.objects.values_list("value", flat=True).filter(name="ingestAppealFilter")[0].split(",")
             else:
@@ -74,20 +87,19 @@ class Command(BaseCommand):
                     # Temporary filtering, the manual version should be kept:
                     if r["APP_code"] in codes_skip:  # ['MDR65002', 'MDR00001', 'MDR00004']:
                         continue
-                    if r["APP_code"] not in codes:
+                    if r["APP_code"] not in modified_at_by_code:
                         new.append(r)
+                        continue
+                    # We use all records, do NOT check if last_modified > since_last_checked
+                    if len(r["Details"]) == 1:
+                        detail = r["Details"][0]
                     else:
-                        # We use all records, do NOT check if last_modified > since_last_checked
-                        # import pdb; pdb.set_trace();
-                        if len(r["Details"]) == 1:
-                            detail = r["Details"][0]
-                        else:
-                            details = sorted(r["Details"], reverse=True, key=lambda x: self.parse_date(x["APD_startDate"]))
-                            detail = details[0]
+                        details = sorted(r["Details"], reverse=True, key=lambda x: self.parse_date(x["APD_startDate"]))
+                        detail = details[0]
 
                     apd_modify_time = self.parse_date(detail["APD_modifyTime"])
                     app_modify_time = self.parse_date(r["APP_modifyTime"])
-                    api_appeal_modify_time = Appeal.objects.get(code=r["APP_code"]).modified_at
+                    api_appeal_modify_time = modified_at_by_code[r["APP_code"]]
 
                     if api_appeal_modify_time < apd_modify_time or api_appeal_modify_time < app_modify_time:
                         modified.append(r)
@@ -149,7 +161,7 @@ class Command(BaseCommand):
             with open("appeals.json", "w") as outfile:
                 json.dump(records, outfile)
 
-            codes = Appeal.objects.values_list("code", flat=True)
+            codes = set(Appeal.objects.values_list("code", flat=True))
 
             if AppealFilter.objects.values_list("value", flat=True).filter(name="ingestAppealFilter").count() > 0:
                 codes_skip = AppealFilter.objects.values_list("value", flat=True).filter(name="ingestAppealFilter")[0].split(",")
@@ -169,6 +181,40 @@ class Command(BaseCommand):
 
         return new, modified, bilaterals
 
+    def load_lookups(self):
+        """
+        Preload the disaster types, regions, countries and recent emergencies once,
+        so that parse_appeal_record doesn't query them per record.
+        """
+        self.dtypes = {dtype.name: dtype for dtype in DisasterType.objects.all()}
+        self.regions = {region.pk: region for region in Region.objects.all()}
+        self.regions_by_name = {region.name: region for region in self.regions.values()}
+
+        self.countries = {
+            country.pk: country for country in Country.objects.only("name", "iso", "record_type", "region").order_by("pk")
+        }
+        # Same as .first() on the lookups below: the country with the lowest pk wins
+        self.gec_countries = {}
+        for code, country_id in GECCode.objects.order_by("pk").values_list("code", "country_id"):
+            self.gec_countries.setdefault(code, self.countries[country_id])
+        self.countries_by_iso = {}
+        self.countries_by_name = {}
+        for country in self.countries.values():
+            if country.iso and country.record_type == 1:
+                self.countries_by_iso.setdefault(country.iso.lower(), country)
+            self.countries_by_name.setdefault(country.name.lower(), country)
+
+        # only consider emergencies within the past 90 days, latest first
+        six_mos = tz.now() - timedelta(days=90)
+        self.recent_events = {}
+        event_countries_qs = (
+            Event.countries.through.objects.exclude(event__created_at__lt=six_mos)
+            .order_by("-event__created_at")
+            .values_list("country_id", "event__dtype_id", "event_id")
+        )
+        for country_id, dtype_id, event_id in event_countries_qs:
+            self.recent_events.setdefault((country_id, dtype_id), event_id)
+
     def parse_disaster_name(self, dname):
         if dname in DTYPE_KEYS:
             idx = DTYPE_KEYS.index(dname)
@@ -178,24 +224,22 @@ class Command(BaseCommand):
             disaster_name = list(DISASTER_TYPE_MAPPING.values())[idx]
         else:
             disaster_name = "Other"
-        dtype = DisasterType.objects.get(name=disaster_name)
+        dtype = self.dtypes[disaster_name]
         return dtype
 
     def parse_country(self, gec_code, country_name):
         # If gec_code has a mapping then we use that Country straight
-        gec = GEC_CODES.filter(code=gec_code).first()
-        if gec:
-            return gec.country
+        gec_country = self.gec_countries.get(gec_code)
+        if gec_country:
+            return gec_country
 
         # Otherwise gec_code must be an ISO code, but we're using country_name as a backup check
+        country = None
         if len(gec_code) == 2:
             # Filter for 'Country' types only
-            country = Country.objects.filter(iso__iexact=gec_code, record_type=1).first()
-
-            if country is None:
-                country = Country.objects.filter(name__iexact=country_name).first()
-        else:
-            country = Country.objects.filter(name__iexact=country_name).first()
+            country = self.countries_by_iso.get(gec_code.lower())
+        if country is None and country_name:
+            country = self.countries_by_name.get(country_name.lower())
 
         if not country:
             logger.warning(f"Could not find Country with: {gec_code} OR {country_name}")
@@ -216,15 +260,14 @@ class Command(BaseCommand):
         country = self.parse_country(gec_code, country_name)
 
         # get the region mapping, using the country if possible
-        if country is not None and country.region is not None:
-            region = Region.objects.get(pk=country.region.pk)
+        if country is not None and country.region_id is not None:
+            region = self.regions[country.region_id]
         else:
-            regions = {"africa": 0, "americas": 1, "asia pacific": 2, "europe": 3, "middle east and north africa": 4}
             region_name = r["OSR_name"].lower().strip()
-            if region_name not in regions:
+            if region_name not in REGIONS:
                 region = None
             else:
-                region = Region.objects.get(name=regions[region_name])
+                region = self.regions_by_name[REGIONS[region_name]]
 
         # ordering appeals by start date
         # if there is more than one detail, the start date should be the *earliest
@@ -249,17 +292,10 @@ class Command(BaseCommand):
                 amount_funded += detl["ContributionAmount"] if detl["ContributionAmount"] else 0
 
         # for new, open appeals, if we have a country, try to guess what emergency it belongs to.
-        # only consider emergencies within the past 90 days
-        event = None
+        # only consider emergencies within the past 90 days (see load_lookups)
+        event_id = None
         if options["is_new_appeal"] and country is not None and end_date > tz.now():
-            six_mos = tz.now() - timedelta(days=90)
-            event = (
-                Event.objects.exclude(created_at__lt=six_mos)
-                .filter(countries__in=[country])
-                .filter(dtype=dtype)
-                .order_by("-created_at")
-                .first()
-            )
+            event_id = self.recent_events.get((country.pk, dtype.pk))
 
         if detail1["APD_modifyTime"] > r["APP_modifyTime"]:
             modify_time = self.parse_date(detail1["APD_modifyTime"])
@@ -285,15 +321,91 @@ class Command(BaseCommand):
             "triggering_amount": float(int(triggering_amount) % 10**10),  # to avoid overflow
         }
 
-        if event is not None:
-            fields["event"] = event
+        if event_id is not None:
+            fields["event_id"] = event_id
             fields["needs_confirmation"] = True
 
         return fields
 
+    def add_bilaterals(self, fields, bilaterals):
+        # correction of the appeal record with appealbilaterals value
+        if fields["code"] in bilaterals:
+            fields["amount_funded"] += round(bilaterals[fields["code"]], 1)
+            fields["triggering_amount"] += round(bilaterals[fields["code"]], 1)
+
+    @staticmethod
+    def set_changed_fields(appeal, fields):
+        """Set the fields on the existing appeal, returns True if any value is different"""
+        changed = False
+        for name, value in fields.items():
+            field = Appeal._meta.get_field(name)
+            if field.is_relation:
+                current_value, new_value = getattr(appeal, field.attname), value and value.pk
+            else:
+                current_value, new_value = getattr(appeal, name), field.to_python(value)
+            if current_value != new_value:
+                changed = True
+                setattr(appeal, name, value)
+        return changed
+
+    def write_in_batches(self, appeals, write, action, errors):
+        """
+        Apply write (bulk_create/bulk_update) to the appeals in batches of batch_size.
+        A failing batch is retried one appeal at a time, to only skip the erroneous ones.
+        """
+        written = []
+        for i in range(0, len(appeals), self.batch_size):
+            batch = appeals[i : i + self.batch_size]
+            try:
+                with transaction.atomic():
+                    write(batch)
+                written.extend(batch)
+                continue
+            except Exception as ex:
+                logger.error(f"Could not {action} a batch of {len(batch)} appeals: {str(ex)[:100]}")
+            for appeal in batch:
+                try:
+                    with transaction.atomic():
+                        write([appeal])
+                    written.append(appeal)
+                except Exception as ex:
+                    err_text = f"Could not {action} appeal with code {appeal.code}"
+                    logger.error(str(ex)[:100])
+                    logger.error(err_text)
+                    errors.append(err_text)
+        return written
+
+    def after_bulk_write(self, created_appeals, updated_appeals):
+        """
+        bulk_create/bulk_update don't send the post_save signals,
+        apply what the Appeal receivers do: history, search index and API cache.
+        """
+        AppealHistory.add_versions(created_appeals, created=True)
+        AppealHistory.add_versions(updated_appeals)
+
+        appeals = created_appeals + updated_appeals
+        SearchIndexOutbox.enqueue(Appeal, [appeal.pk for appeal in appeals])
+        tags = set()
+        for appeal in appeals:
+            tags.update(CACHE_TAGS_GETTERS[Appeal](appeal))
+        invalidate_api_cache_on_commit(list(tags))
+
+    def refresh_monthly_rollups(self, appeals, previous_values):
+        """Refresh the appeal and emergency rollups of the previous and new months of the written appeals"""
+        start_dates = [appeal.start_date for appeal in appeals]
+        event_ids = {appeal.event_id for appeal in appeals}
+        for start_date, event_id in previous_values:
+            start_dates.append(start_date)
+            event_ids.add(event_id)
+        model_months = {(MonthlyRollup.Model.APPEAL, get_month(start_date)) for start_date in start_dates if start_date}
+        event_dates = Event.objects.filter(id__in=event_ids).values_list("disaster_start_date", flat=True)
+        model_months.update((MonthlyRollup.Model.EVENT, get_month(event_date)) for event_date in event_dates if event_date)
+        refresh_rollups(model_months)
+
     @monitor(monitor_slug=SentryMonitor.INGEST_APPEALS)
     def handle(self, *args, **options):
         logger.info("Starting appeals ingest")
+        self.batch_size = options["batch_size"]
         start_appeals_count = Appeal.objects.all().count()
         try:
             new, modified, bilaterals = self.get_new_or_modified_appeals()
@@ -304,43 +416,79 @@ class Command(BaseCommand):
         logger.info(f"Creating {len(new)} new appeals")
         logger.info(f"Updating {len(modified)} existing appeals that MIGHT have been modified")
 
-        errors = []
-        num_created = 0
-        for i, r in enumerate(new):
-            fields = self.parse_appeal_record(r, is_new_appeal=True)
-            # correction of the appeal record with appealbilaterals value
-            if fields["code"] in bilaterals:
-                fields["amount_funded"] += round(bilaterals[fields["code"]], 1)
-                fields["triggering_amount"] += round(bilaterals[fields["code"]], 1)
-            try:
-                Appeal.objects.create(**fields)
-                num_created += 1
-            except Exception as ex:
-                err_text = f'Could not create appeal with code {fields["code"]}'
-                logger.error(str(ex)[:100])
-                logger.error(err_text)
-                errors.append(err_text)
-
-        num_updated = 0
-        fba_appeals = list(Appeal.objects.filter(atype=AppealType.FBA).values_list("code", flat=True))
-        for i, r in enumerate(modified):
-            fields = self.parse_appeal_record(r, is_new_appeal=False)
-            # correction of the appeal record with appealbilaterals value
-            if fields["code"] in bilaterals:
-                fields["amount_funded"] += round(bilaterals[fields["code"]], 1)
-                fields["triggering_amount"] += round(bilaterals[fields["code"]], 1)
+        self.load_lookups()
+        # Diff the incoming records against the existing appeals in one query
+        existing_appeals = Appeal.objects.in_bulk([r["APP_code"] for r in new + modified], field_name="code")
 
-            try:
-                # DREF is coming from Apple (doesn't have FBA), keep FBA type
-                if fields["code"] in fba_appeals:
-                    fields["atype"] = AppealType.FBA
-                Appeal.objects.update_or_create(code=fields["code"], defaults=fields)
-                num_updated += 1
-            except Exception as ex:
-                err_text = f'Could not update appeal with code {fields["code"]}'
-                logger.error(str(ex)[:100])
-                logger.error(err_text)
-                errors.append(err_text)
+        errors = []
+        to_create = []
+        to_update = []
+        num_unchanged = 0
+        # (start_date, event_id) of the updated appeals before the update, for the monthly rollups
+        previous_values = []
+        now = tz.now()
+        for r in new + modified:
+            appeal = existing_appeals.get(r["APP_code"])
+            fields = self.parse_appeal_record(r, is_new_appeal=appeal is None)
+            self.add_bilaterals(fields, bilaterals)
+            if appeal is None:
+                to_create.append(Appeal(**fields))
+                continue
+            # DREF is coming from Apple (doesn't have FBA), keep FBA type
+            if appeal.atype == AppealType.FBA:
+                fields["atype"] = AppealType.FBA
+            previous_value = (appeal.start_date, appeal.event_id)
+            if self.set_changed_fields(appeal, fields):
+                previous_values.append(previous_value)
+                # auto_now is not applied by bulk_update
+                appeal.modified_at = now
+                to_update.append(appeal)
+            else:
+                num_unchanged += 1
+
+        update_fields = [
+            "aid",
+            "name",
+            "dtype",
+            "atype",
+            "country",
+            "region",
+            "sector",
+            "status",
+            "start_date",
+            "end_date",
+            "num_beneficiaries",
+            "amount_requested",
+            "amount_funded",
+            "real_data_update",
+            "triggering_amount",
+            "modified_at",
+        ]
+        created_appeals = self.write_in_batches(to_create, Appeal.objects.bulk_create, "create", errors)
+        updated_appeals = self.write_in_batches(
+            to_update,
+            lambda batch: Appeal.objects.bulk_update(batch, update_fields),
+            "update",
+            errors,
+        )
+        self.after_bulk_write(created_appeals, updated_appeals)
+        try:
+            # Also refreshes the appeals which started or ended since the last run
+            take_current_snapshot()
+        except Exception as ex:
+            err_text = "Could not take the current key figure snapshot"
+            logger.error(str(ex)[:100])
+            logger.error(err_text)
+            errors.append(err_text)
+        try:
+            self.refresh_monthly_rollups(created_appeals + updated_appeals, previous_values)
+        except Exception as ex:
+            err_text = "Could not refresh the monthly rollups"
+            logger.error(str(ex)[:100])
+            logger.error(err_text)
+            errors.append(err_text)
+        num_created = len(created_appeals)
+        num_updated = len(updated_appeals)
 
         if errors:
             create_cron_record(CRON_NAME, "\n".join(errors), CronJobStatus.WARNED, len(errors))
@@ -348,9 +496,12 @@ class Command(BaseCommand):
         appeals_count = Appeal.objects.all().count()
         logger.info(f"{num_created} appeals created")
         logger.info(f"{num_updated} appeals updated")
+        logger.info(f"{num_unchanged} appeals unchanged")
         logger.info(f"{appeals_count} total appeals")
         logger.info("Appeals ingest completed")
 
-        cron_msg = f"Start appeals count {start_appeals_count}\nAppeals ingest completed, \
-                    {appeals_count} total appeals ({num_created} new, {num_updated} existing)."
+        cron_msg = (
+            f"Start appeals count {start_appeals_count}\nAppeals ingest completed, {appeals_count} total appeals"
+            f" ({num_created} new, {num_updated} updated, {num_unchanged} unchanged, {len(errors)} errors)."
+        )
         create_cron_record(CRON_NAME, cron_msg, CronJobStatus.SUCCESSFUL, appeals_count)
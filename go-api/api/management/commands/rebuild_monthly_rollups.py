@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from sentry_sdk.crons import monitor
+
+from api.create_cron import create_cron_record
+from api.logger import logger
+from api.models import CronJobStatus, MonthlyRollup
+from api.rollups import refresh_rollup
+from main.sentry import SentryMonitor
+
+CRON_NAME = "rebuild_monthly_rollups"
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly rollups (appeals, emergencies, field reports and HeOps per month) from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=MonthlyRollup.Model.values,
+            action="append",
+            help="Rollups to rebuild, default: all",
+        )
+
+    @monitor(monitor_slug=SentryMonitor.REBUILD_MONTHLY_ROLLUPS)
+    def handle(self, *args, **options):
+        model_names = options["model"] or MonthlyRollup.Model.values
+        num_rollups = 0
+        try:
+            for model_name in model_names:
+                num_rollups += len(refresh_rollup(MonthlyRollup.Model(model_name)))
+        except Exception as ex:
+            logger.error("Rebuilding the monthly rollups failed", exc_info=True)
+            create_cron_record(CRON_NAME, f"Rebuilding the monthly rollups failed: {str(ex)}", CronJobStatus.ERRONEOUS)
+            return
+        create_cron_record(
+            CRON_NAME,
+            f"Monthly rollups of {', '.join(model_names)} rebuilt",
+            CronJobStatus.SUCCESSFUL,
+            num_rollups,
+        )
@@ -2,6 +2,7 @@ from dateutil import parser as date_parser
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.utils import timezone
 from sentry_sdk.crons import monitor
 
 from api.create_cron import create_cron_record
@@ -9,6 +10,7 @@ from api.logger import logger
 from api.models import Country, CronJobStatus, Event
 from api.molnix_utils import MolnixApi
 from deployments.models import MolnixTag, MolnixTagGroup, Personnel, PersonnelDeployment
+from deployments.stats import DeploymentCounts
 from main.sentry import SentryMonitor
 from notifications.models import (
     SurgeAlert,
@@ -585,6 +587,14 @@ class Command(BaseCommand):
             create_cron_record(CRON_NAME, msg, CronJobStatus.ERRONEOUS)
             return
 
+        try:
+            # Surge page figures, cached for the day
+            DeploymentCounts(timezone.now().date()).refresh()
+        except Exception as ex:
+            warning = "Could not refresh the deployment counts: %s" % str(ex)
+            logger.error(warning)
+            deployments_warnings.append(warning)
+
         msg = get_status_message(positions_messages, deployments_messages, positions_warnings, deployments_warnings)
         num_records = positions_created + deployments_created
         has_warnings = len(positions_warnings) > 0 or len(deployments_warnings) > 0
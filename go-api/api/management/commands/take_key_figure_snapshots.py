@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sentry_sdk.crons import monitor
+
+from api.create_cron import create_cron_record
+from api.key_figures import take_current_snapshot, take_daily_snapshot
+from api.logger import logger
+from api.models import CronJobStatus
+from main.sentry import SentryMonitor
+
+CRON_NAME = "take_key_figure_snapshots"
+
+
+class Command(BaseCommand):
+    help = "Take the daily key figure snapshot (appeal figures per country at midnight) and the current one"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat, help="Last date to take, default: today")
+        parser.add_argument("--days", type=int, default=1, help="Number of days to take, up to --date (backfill)")
+
+    @monitor(monitor_slug=SentryMonitor.TAKE_KEY_FIGURE_SNAPSHOTS)
+    def handle(self, *args, **options):
+        last_date = options["date"] or timezone.now().date()
+        num_snapshots = 0
+        try:
+            for days in range(options["days"]):
+                num_snapshots += len(take_daily_snapshot(last_date - timedelta(days=days)))
+            num_snapshots += len(take_current_snapshot())
+        except Exception as ex:
+            logger.error("Taking the key figure snapshots failed", exc_info=True)
+            create_cron_record(CRON_NAME, f"Taking the key figure snapshots failed: {str(ex)}", CronJobStatus.ERRONEOUS)
+            return
+        create_cron_record(
+            CRON_NAME,
+            f"Key figure snapshots of {options['days']} day(s) up to {last_date} taken",
+            CronJobStatus.SUCCESSFUL,
+            num_snapshots,
+        )
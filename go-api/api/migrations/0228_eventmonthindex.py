@@ -0,0 +1,54 @@
+# Generated by Django 4.2.26 on 2026-10-19 09:12
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def build_event_month_index(apps, schema_editor):
+    Event = apps.get_model("api", "Event")
+    EventMonthIndex = apps.get_model("api", "EventMonthIndex")
+
+    indexes = {}
+    for event in Event.objects.filter(created_at__isnull=False).prefetch_related("countries").iterator(chunk_size=1000):
+        month = event.created_at.strftime("%Y-%m")
+        index = indexes.setdefault(month, EventMonthIndex(created_month=month, event_ids=[], country_event_ids={}))
+        index.event_ids.append(event.id)
+        for name in {country.name for country in event.countries.all() if country.iso and country.name}:
+            index.country_event_ids.setdefault(name, []).append(event.id)
+    for index in indexes.values():
+        index.event_ids.sort()
+        for ids in index.country_event_ids.values():
+            ids.sort()
+    EventMonthIndex.objects.bulk_create(indexes.values(), batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0227_alter_eventseveritylevelhistory_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventMonthIndex",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_month", models.CharField(max_length=7, unique=True, verbose_name="created month")),
+                (
+                    "event_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name="emergencies"
+                    ),
+                ),
+                ("country_event_ids", models.JSONField(blank=True, default=dict, verbose_name="emergencies per country")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="updated at")),
+            ],
+            options={
+                "verbose_name": "emergency month index",
+                "verbose_name_plural": "emergency month indexes",
+                "indexes": [django.contrib.postgres.indexes.GinIndex(fields=["event_ids"], name="event_month_index_ids_idx")],
+            },
+        ),
+        migrations.RunPython(build_event_month_index, reverse_code=migrations.RunPython.noop),
+    ]
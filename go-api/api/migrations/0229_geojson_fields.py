@@ -0,0 +1,75 @@
+# Generated by Django 4.2.26 on 2026-10-19 10:05
+
+import json
+
+from django.db import migrations, models
+
+GEOJSON_FIELDS_BY_MODEL = {
+    "Region": {"bbox": "bbox_geojson"},
+    "Country": {"bbox": "bbox_geojson", "centroid": "centroid_geojson"},
+    "District": {"bbox": "bbox_geojson", "centroid": "centroid_geojson"},
+    "Admin2": {"bbox": "bbox_geojson", "centroid": "centroid_geojson"},
+}
+BATCH_SIZE = 1000
+
+
+def populate_geojson_fields(apps, schema_editor):
+    for model_name, geojson_fields in GEOJSON_FIELDS_BY_MODEL.items():
+        Model = apps.get_model("api", model_name)
+        objs = []
+        for obj in Model.objects.only("id", *geojson_fields.keys()).iterator(chunk_size=BATCH_SIZE):
+            for geometry_field, geojson_field in geojson_fields.items():
+                geometry = getattr(obj, geometry_field)
+                setattr(obj, geojson_field, geometry and json.loads(geometry.geojson))
+            objs.append(obj)
+            if len(objs) >= BATCH_SIZE:
+                Model.objects.bulk_update(objs, list(geojson_fields.values()))
+                objs = []
+        if objs:
+            Model.objects.bulk_update(objs, list(geojson_fields.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0228_eventmonthindex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="region",
+            name="bbox_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="bbox GeoJSON"),
+        ),
+        migrations.AddField(
+            model_name="country",
+            name="bbox_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="bbox GeoJSON"),
+        ),
+        migrations.AddField(
+            model_name="country",
+            name="centroid_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="centroid GeoJSON"),
+        ),
+        migrations.AddField(
+            model_name="district",
+            name="bbox_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="bbox GeoJSON"),
+        ),
+        migrations.AddField(
+            model_name="district",
+            name="centroid_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="centroid GeoJSON"),
+        ),
+        migrations.AddField(
+            model_name="admin2",
+            name="bbox_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="bbox GeoJSON"),
+        ),
+        migrations.AddField(
+            model_name="admin2",
+            name="centroid_geojson",
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name="centroid GeoJSON"),
+        ),
+        migrations.RunPython(populate_geojson_fields, reverse_code=migrations.RunPython.noop),
+    ]
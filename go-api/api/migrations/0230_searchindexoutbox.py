@@ -0,0 +1,37 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0229_geojson_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchIndexOutbox",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("model", models.CharField(max_length=50, verbose_name="model")),
+                ("object_id", models.IntegerField(verbose_name="object id")),
+                ("action", models.IntegerField(choices=[(1, "index"), (2, "delete")], verbose_name="action")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="created at")),
+                ("processed_at", models.DateTimeField(blank=True, null=True, verbose_name="processed at")),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="failed attempts")),
+                ("next_attempt_at", models.DateTimeField(blank=True, null=True, verbose_name="next attempt at")),
+            ],
+            options={
+                "verbose_name": "search index outbox",
+                "verbose_name_plural": "search index outbox",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("processed_at__isnull", True)),
+                        fields=["id"],
+                        name="search_outbox_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
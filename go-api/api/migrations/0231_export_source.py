@@ -0,0 +1,27 @@
+# Generated by Django 4.2.26 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0230_searchindexoutbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="export",
+            name="language",
+            field=models.CharField(blank=True, max_length=10, null=True, verbose_name="Language"),
+        ),
+        migrations.AddField(
+            model_name="export",
+            name="source_modified_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Source Modified At"),
+        ),
+        migrations.AddIndex(
+            model_name="export",
+            index=models.Index(fields=["export_type", "export_id", "language", "source_modified_at"], name="export_source_idx"),
+        ),
+    ]
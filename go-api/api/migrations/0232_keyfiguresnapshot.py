@@ -0,0 +1,59 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0231_export_source"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeyFigureSnapshot",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("as_of", models.DateTimeField(verbose_name="as of")),
+                ("is_daily", models.BooleanField(default=False, verbose_name="is daily")),
+                ("active_drefs", models.IntegerField(null=True, verbose_name="active DREFs")),
+                ("active_appeals", models.IntegerField(null=True, verbose_name="active appeals")),
+                ("total_appeals", models.IntegerField(null=True, verbose_name="total appeals")),
+                ("target_population", models.BigIntegerField(null=True, verbose_name="target population")),
+                ("amount_requested", models.FloatField(null=True, verbose_name="amount requested")),
+                ("amount_requested_dref_included", models.FloatField(null=True, verbose_name="amount requested (DREF included)")),
+                ("amount_funded", models.FloatField(null=True, verbose_name="amount funded")),
+                ("amount_funded_dref_included", models.FloatField(null=True, verbose_name="amount funded (DREF included)")),
+                ("recent_drefs", models.IntegerField(null=True, verbose_name="recent DREFs")),
+                ("recent_appeals", models.IntegerField(null=True, verbose_name="recent appeals")),
+                ("recent_target_population", models.BigIntegerField(null=True, verbose_name="recent target population")),
+                ("recent_amount_requested", models.FloatField(null=True, verbose_name="recent amount requested")),
+                (
+                    "recent_amount_requested_dref_included",
+                    models.FloatField(null=True, verbose_name="recent amount requested (DREF included)"),
+                ),
+                ("recent_amount_funded", models.FloatField(null=True, verbose_name="recent amount funded")),
+                (
+                    "recent_amount_funded_dref_included",
+                    models.FloatField(null=True, verbose_name="recent amount funded (DREF included)"),
+                ),
+                ("recent_emergencies", models.IntegerField(null=True, verbose_name="recent emergencies")),
+                (
+                    "country",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="api.country", verbose_name="country"),
+                ),
+                (
+                    "region",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.SET_NULL, to="api.region", verbose_name="region"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "key figure snapshot",
+                "verbose_name_plural": "key figure snapshots",
+                "indexes": [models.Index(fields=["as_of", "country"], name="key_figure_snapshot_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.26 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0232_keyfiguresnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyRollup",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "model",
+                    models.CharField(
+                        choices=[
+                            ("appeal", "appeal"),
+                            ("event", "emergency"),
+                            ("fieldreport", "field report"),
+                            ("heop", "HeOp"),
+                        ],
+                        max_length=20,
+                        verbose_name="model",
+                    ),
+                ),
+                ("month", models.DateField(verbose_name="month")),
+                (
+                    "atype",
+                    models.IntegerField(
+                        choices=[
+                            (0, "DREF"),
+                            (1, "Emergency Appeal"),
+                            (2, "International Appeal"),
+                            (3, "Forecast Based Action"),
+                        ],
+                        null=True,
+                        verbose_name="appeal type",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0, verbose_name="count")),
+                ("num_beneficiaries", models.BigIntegerField(null=True, verbose_name="number of beneficiaries")),
+                ("num_affected", models.BigIntegerField(null=True, verbose_name="number of affected")),
+                ("amount_requested", models.FloatField(null=True, verbose_name="amount requested")),
+                ("amount_funded", models.FloatField(null=True, verbose_name="amount funded")),
+                ("targeted_population", models.BigIntegerField(null=True, verbose_name="targeted population")),
+                (
+                    "country",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.CASCADE, to="api.country", verbose_name="country"
+                    ),
+                ),
+                (
+                    "dtype",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.disastertype",
+                        verbose_name="disaster type",
+                    ),
+                ),
+                (
+                    "region",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.CASCADE, to="api.region", verbose_name="region"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "monthly rollup",
+                "verbose_name_plural": "monthly rollups",
+                "indexes": [
+                    models.Index(fields=["model", "month"], name="monthly_rollup_month_idx"),
+                    models.Index(fields=["model", "country", "month"], name="monthly_rollup_country_idx"),
+                    models.Index(fields=["model", "region", "month"], name="monthly_rollup_region_idx"),
+                ],
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+import json
 import uuid
 from datetime import datetime, timedelta
 
@@ -12,8 +13,11 @@ from django.contrib.auth.signals import (
 
 # from django.db import models
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import FileExtensionValidator, RegexValidator, validate_slug
+from django.db import transaction
 from django.db.models import Q
 
 # from django.db.models import Prefetch
@@ -45,6 +49,46 @@ def to_dict(instance):
     return data
 
 
+class GeoJSONFieldsMixin:
+    """
+    Keeps a GeoJSON (dict) copy of the geometry fields, refreshed on save.
+    Serializers use the copy instead of building the geometry and converting it to GeoJSON for each row.
+    """
+
+    # geometry field -> GeoJSON field
+    GEOJSON_FIELDS = {
+        "bbox": "bbox_geojson",
+        "centroid": "centroid_geojson",
+    }
+
+    @staticmethod
+    def get_geojson(geometry):
+        if not geometry:
+            return None
+        if not isinstance(geometry, GEOSGeometry):
+            # Geometries are also assigned as WKT/GeoJSON strings (e.g. import-admin*-data commands)
+            geometry = GEOSGeometry(geometry)
+        return json.loads(geometry.geojson)
+
+    def update_geojson_fields(self):
+        for geometry_field, geojson_field in self.GEOJSON_FIELDS.items():
+            setattr(self, geojson_field, self.get_geojson(getattr(self, geometry_field)))
+
+    def save(self, *args, **kwargs):
+        self.update_geojson_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields,
+                *(
+                    geojson_field
+                    for geometry_field, geojson_field in self.GEOJSON_FIELDS.items()
+                    if geometry_field in update_fields
+                ),
+            }
+        super().save(*args, **kwargs)
+
+
 class DisasterType(models.Model):
     """summary of disaster"""
 
@@ -68,11 +112,16 @@ class RegionName(models.IntegerChoices):
     MENA = 4, _("Middle East & North Africa")
 
 
-class Region(models.Model):
+class Region(GeoJSONFieldsMixin, models.Model):
     """A region"""
 
+    GEOJSON_FIELDS = {
+        "bbox": "bbox_geojson",
+    }
+
     name = models.IntegerField(choices=RegionName.choices, default=0, verbose_name=_("name"))
     bbox = models.PolygonField(srid=4326, blank=True, null=True)
+    bbox_geojson = models.JSONField(verbose_name=_("bbox GeoJSON"), blank=True, null=True, editable=False)
     label = models.CharField(verbose_name=_("name of the region"), max_length=250, blank=True)
     additional_tab_name = models.CharField(verbose_name="Label for Additional Tab", max_length=100, blank=True)
 
@@ -137,7 +186,7 @@ class CountryType(models.IntegerChoices):
 
 
 @reversion.register()
-class Country(models.Model):
+class Country(GeoJSONFieldsMixin, models.Model):
     """A country"""
 
     name = models.CharField(verbose_name=_("name"), max_length=100)
@@ -176,7 +225,9 @@ class Country(models.Model):
         validators=[FileExtensionValidator(allowed_extensions=["png", "jpg", "gif"])],
     )
     centroid = models.PointField(srid=4326, blank=True, null=True)
+    centroid_geojson = models.JSONField(verbose_name=_("centroid GeoJSON"), blank=True, null=True, editable=False)
     bbox = models.PolygonField(srid=4326, blank=True, null=True)
+    bbox_geojson = models.JSONField(verbose_name=_("bbox GeoJSON"), blank=True, null=True, editable=False)
     independent = models.BooleanField(default=None, null=True, help_text=_("Is this an independent country?"))
     is_deprecated = models.BooleanField(default=False, help_text=_("Is this an active, valid country?"))
     sovereign_state = models.ForeignKey(
@@ -282,7 +333,7 @@ class Country(models.Model):
         return self.name
 
 
-class District(models.Model):
+class District(GeoJSONFieldsMixin, models.Model):
     """Admin level 1 field"""
 
     name = models.CharField(verbose_name=_("name"), max_length=100)
@@ -292,7 +343,9 @@ class District(models.Model):
         verbose_name=_("is enclave?"), default=False, help_text=_("Is it an enclave away from parent country?")
     )  # used to mark if the district is far away from the country
     centroid = models.PointField(srid=4326, blank=True, null=True)
+    centroid_geojson = models.JSONField(verbose_name=_("centroid GeoJSON"), blank=True, null=True, editable=False)
     bbox = models.PolygonField(srid=4326, blank=True, null=True)
+    bbox_geojson = models.JSONField(verbose_name=_("bbox GeoJSON"), blank=True, null=True, editable=False)
     is_deprecated = models.BooleanField(default=False, help_text=_("Is this an active, valid district?"))
     # Population Data From WB API
     wb_population = models.PositiveIntegerField(
@@ -462,14 +515,16 @@ class CountryICRCPresence(models.Model):
         return f"{self.country.name} - {self.url}"
 
 
-class Admin2(models.Model):
+class Admin2(GeoJSONFieldsMixin, models.Model):
     """Used for admin2, District refers to admin1"""
 
     admin1 = models.ForeignKey(District, verbose_name=_("Admin 1"), on_delete=models.PROTECT)
     name = models.CharField(verbose_name=_("name"), max_length=100)
     code = models.CharField(verbose_name=_("code"), max_length=64, unique=True)
     centroid = models.PointField(srid=4326, blank=True, null=True)
+    centroid_geojson = models.JSONField(verbose_name=_("centroid GeoJSON"), blank=True, null=True, editable=False)
     bbox = models.PolygonField(srid=4326, blank=True, null=True)
+    bbox_geojson = models.JSONField(verbose_name=_("bbox GeoJSON"), blank=True, null=True, editable=False)
     local_name = models.CharField(verbose_name=_("Local Name"), max_length=100, blank=True, null=True)
     local_name_code = models.CharField(verbose_name=_("Local Name Language Code"), max_length=10, blank=True, null=True)
     alternate_name = models.CharField(verbose_name=_("Alternate Name"), max_length=100, blank=True, null=True)
@@ -936,6 +991,74 @@ class EventSeverityLevelHistory(models.Model):
         verbose_name_plural = _("emergency severity level histories")
 
 
+class EventMonthIndex(models.Model):
+    """
+    Emergencies created per month, with the emergencies of each publishing country.
+    Kept in sync from the Event, countries and Country receivers, used by analytics platform adoption.
+    """
+
+    created_month = models.CharField(verbose_name=_("created month"), max_length=7, unique=True)  # YYYY-MM
+    event_ids = ArrayField(models.IntegerField(), verbose_name=_("emergencies"), default=list, blank=True)
+    # Publishing country name -> emergency ids
+    country_event_ids = models.JSONField(verbose_name=_("emergencies per country"), default=dict, blank=True)
+    updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("emergency month index")
+        verbose_name_plural = _("emergency month indexes")
+        indexes = [GinIndex(fields=["event_ids"], name="event_month_index_ids_idx")]
+
+    def __str__(self):
+        return self.created_month
+
+    @staticmethod
+    def get_country_names(event):
+        # NOTE: Same as analytics iso -> name lookup, countries without iso are not publishing countries
+        return sorted({country.name for country in event.countries.all() if country.iso and country.name})
+
+    def remove_events(self, event_ids):
+        self.event_ids = [event_id for event_id in self.event_ids if event_id not in event_ids]
+        country_event_ids = {
+            name: [event_id for event_id in ids if event_id not in event_ids] for name, ids in self.country_event_ids.items()
+        }
+        self.country_event_ids = {name: ids for name, ids in country_event_ids.items() if ids}
+
+    def add_event(self, event_id, country_names):
+        self.event_ids = sorted({*self.event_ids, event_id})
+        for name in country_names:
+            self.country_event_ids[name] = sorted({*self.country_event_ids.get(name, []), event_id})
+
+    @classmethod
+    def refresh_for_events(cls, event_ids):
+        """Move the emergencies to the row of their current month and countries, deleted emergencies are removed"""
+        event_ids = set(event_ids)
+        if not event_ids:
+            return
+        events_by_month = {}
+        for event in (
+            Event.objects.filter(id__in=event_ids, created_at__isnull=False)
+            .only("id", "created_at")
+            .prefetch_related(models.Prefetch("countries", queryset=Country.objects.only("id", "iso", "name")))
+        ):
+            events_by_month.setdefault(event.created_at.strftime("%Y-%m"), {})[event.id] = cls.get_country_names(event)
+
+        with transaction.atomic():
+            for month in sorted(events_by_month):
+                cls.objects.get_or_create(created_month=month)
+            # Locked in the same order by all the refreshes
+            indexes = cls.objects.select_for_update().filter(
+                Q(created_month__in=events_by_month) | Q(event_ids__overlap=list(event_ids))
+            )
+            for index in indexes.order_by("created_month"):
+                index.remove_events(event_ids)
+                for event_id, country_names in events_by_month.get(index.created_month, {}).items():
+                    index.add_event(event_id, country_names)
+                if index.event_ids:
+                    index.save()
+                else:
+                    index.delete()
+
+
 @reversion.register()
 class EventFeaturedDocument(models.Model):
     event = models.ForeignKey(
@@ -1306,12 +1429,185 @@ class AppealHistory(models.Model):
         verbose_name = _("appealhistory")
         verbose_name_plural = _("appealhistories")
 
+    # valid_to of the current version of an appeal
+    OPEN_VALID_TO = datetime(2200, 1, 1, tzinfo=pytz.utc)
+    # Versioned when one of these fields changes, see add_versions
+    WATCHED_FIELDS = (
+        "num_beneficiaries",
+        "amount_requested",
+        "start_date",
+        "end_date",
+        "atype",
+        "country",
+        "region",
+        "dtype",
+        "needs_confirmation",
+        "status",
+        "code",
+        "triggering_amount",
+    )
+
     def record_type(self):
         return "APPEALHISTORY"
 
     def __str__(self):
         return self.aid
 
+    @classmethod
+    def from_appeal(cls, appeal, valid_from):
+        return cls(
+            aid=appeal.aid,
+            num_beneficiaries=appeal.num_beneficiaries,
+            amount_requested=appeal.amount_requested,
+            amount_funded=appeal.amount_funded,
+            valid_from=valid_from,
+            valid_to=cls.OPEN_VALID_TO,
+            start_date=appeal.start_date,
+            end_date=appeal.end_date,
+            appeal=appeal,
+            atype=appeal.atype,
+            country_id=appeal.country_id,
+            region_id=appeal.region_id,
+            dtype_id=appeal.dtype_id,
+            needs_confirmation=appeal.needs_confirmation,
+            status=appeal.status,
+            code=appeal.code,
+            triggering_amount=appeal.triggering_amount,
+        )
+
+    @classmethod
+    def is_changed(cls, appeal_history, appeal):
+        for field_name in cls.WATCHED_FIELDS:
+            field = cls._meta.get_field(field_name)
+            # to_python: the saved appeal can still hold the assigned value (e.g. float for a decimal)
+            if field.to_python(getattr(appeal, field.attname)) != getattr(appeal_history, field.attname):
+                return True
+        return False
+
+    @classmethod
+    def add_versions(cls, appeals, created=False):
+        """
+        Add a new version for the (saved) appeals whose watched fields changed: the current versions
+        are closed with one UPDATE and the new ones are inserted with one bulk_create.
+        For created appeals, the first version is added without looking for the current one.
+        """
+        now = timezone.now()
+        if created:
+            return cls.objects.bulk_create([cls.from_appeal(appeal, now) for appeal in appeals])
+
+        # Current version: the last one of each appeal
+        current_versions = {
+            appeal_history.aid: appeal_history
+            for appeal_history in cls.objects.filter(aid__in={appeal.aid for appeal in appeals})
+            .order_by("aid", "-id")
+            .distinct("aid")
+        }
+        closed_ids = []
+        new_versions = []
+        for appeal in appeals:
+            appeal_history = current_versions.get(appeal.aid)
+            if appeal_history is not None and not cls.is_changed(appeal_history, appeal):
+                continue
+            if appeal_history is not None:
+                closed_ids.append(appeal_history.pk)
+            new_versions.append(cls.from_appeal(appeal, now))
+
+        if closed_ids:
+            cls.objects.filter(pk__in=closed_ids).update(valid_to=now)
+        if new_versions:
+            KeyFigureSnapshot.drop_current()
+        return cls.objects.bulk_create(new_versions)
+
+
+class KeyFigureSnapshot(models.Model):
+    """
+    Appeal key figures of a country at a point in time (as_of), computed from AppealHistory, see api/key_figures.py
+    Daily snapshots are taken at midnight (UTC) and never change, as the history versions are only appended.
+    The current snapshot (not daily) is retaken by ingest_appeals and dropped when new history versions are added.
+    """
+
+    as_of = models.DateTimeField(verbose_name=_("as of"))
+    is_daily = models.BooleanField(verbose_name=_("is daily"), default=False)
+    country = models.ForeignKey(Country, verbose_name=_("country"), on_delete=models.CASCADE)
+    region = models.ForeignKey(Region, verbose_name=_("region"), null=True, on_delete=models.SET_NULL)
+
+    # AggregateHeaderFigures: appeals active at as_of
+    active_drefs = models.IntegerField(verbose_name=_("active DREFs"), null=True)
+    active_appeals = models.IntegerField(verbose_name=_("active appeals"), null=True)
+    total_appeals = models.IntegerField(verbose_name=_("total appeals"), null=True)
+    target_population = models.BigIntegerField(verbose_name=_("target population"), null=True)
+    amount_requested = models.FloatField(verbose_name=_("amount requested"), null=True)
+    amount_requested_dref_included = models.FloatField(verbose_name=_("amount requested (DREF included)"), null=True)
+    amount_funded = models.FloatField(verbose_name=_("amount funded"), null=True)
+    amount_funded_dref_included = models.FloatField(verbose_name=_("amount funded (DREF included)"), null=True)
+
+    # Country figure: appeals started within the 2 years before as_of
+    recent_drefs = models.IntegerField(verbose_name=_("recent DREFs"), null=True)
+    recent_appeals = models.IntegerField(verbose_name=_("recent appeals"), null=True)
+    recent_target_population = models.BigIntegerField(verbose_name=_("recent target population"), null=True)
+    recent_amount_requested = models.FloatField(verbose_name=_("recent amount requested"), null=True)
+    recent_amount_requested_dref_included = models.FloatField(
+        verbose_name=_("recent amount requested (DREF included)"), null=True
+    )
+    recent_amount_funded = models.FloatField(verbose_name=_("recent amount funded"), null=True)
+    recent_amount_funded_dref_included = models.FloatField(verbose_name=_("recent amount funded (DREF included)"), null=True)
+    recent_emergencies = models.IntegerField(verbose_name=_("recent emergencies"), null=True)
+
+    class Meta:
+        verbose_name = _("key figure snapshot")
+        verbose_name_plural = _("key figure snapshots")
+        indexes = [
+            models.Index(fields=["as_of", "country"], name="key_figure_snapshot_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.country_id} - {self.as_of}"
+
+    @classmethod
+    def drop_current(cls):
+        cls.objects.filter(is_daily=False).delete()
+
+
+class MonthlyRollup(models.Model):
+    """
+    Monthly count and sums of the appeals, emergencies, field reports and HeOps by disaster type (and appeal type),
+    refreshed per month by the model signals once built, see api/rollups.py
+    Rows without country and region are the global figures, the others are per country or per region.
+    """
+
+    class Model(models.TextChoices):
+        APPEAL = "appeal", _("appeal")
+        EVENT = "event", _("emergency")
+        FIELD_REPORT = "fieldreport", _("field report")
+        HEOP = "heop", _("HeOp")
+
+    model = models.CharField(verbose_name=_("model"), max_length=20, choices=Model.choices)
+    month = models.DateField(verbose_name=_("month"))
+    country = models.ForeignKey(Country, verbose_name=_("country"), null=True, on_delete=models.CASCADE)
+    region = models.ForeignKey(Region, verbose_name=_("region"), null=True, on_delete=models.CASCADE)
+    dtype = models.ForeignKey(DisasterType, verbose_name=_("disaster type"), null=True, on_delete=models.CASCADE)
+    atype = models.IntegerField(verbose_name=_("appeal type"), choices=AppealType.choices, null=True)
+
+    count = models.IntegerField(verbose_name=_("count"), default=0)
+    num_beneficiaries = models.BigIntegerField(verbose_name=_("number of beneficiaries"), null=True)
+    num_affected = models.BigIntegerField(verbose_name=_("number of affected"), null=True)
+    amount_requested = models.FloatField(verbose_name=_("amount requested"), null=True)
+    amount_funded = models.FloatField(verbose_name=_("amount funded"), null=True)
+    # Emergencies: appeals' average targeted population + latest field report's number of affected
+    targeted_population = models.BigIntegerField(verbose_name=_("targeted population"), null=True)
+
+    class Meta:
+        verbose_name = _("monthly rollup")
+        verbose_name_plural = _("monthly rollups")
+        indexes = [
+            models.Index(fields=["model", "month"], name="monthly_rollup_month_idx"),
+            models.Index(fields=["model", "country", "month"], name="monthly_rollup_country_idx"),
+            models.Index(fields=["model", "region", "month"], name="monthly_rollup_region_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.model} - {self.month}"
+
 
 @reversion.register()
 class AppealDocument(models.Model):
@@ -2587,6 +2883,65 @@ class Export(models.Model):
         on_delete=models.SET_NULL,
     )
     per_country = models.IntegerField(verbose_name=_("Per Country Id"), null=True, blank=True)
+    # The exports of the same document (type, id, url and language), not modified meanwhile, reuse the same PDF
+    language = models.CharField(verbose_name=_("Language"), max_length=10, null=True, blank=True)
+    source_modified_at = models.DateTimeField(verbose_name=_("Source Modified At"), null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["export_type", "export_id", "language", "source_modified_at"], name="export_source_idx"),
+        ]
 
     def __str__(self):
         return f"{self.url} - {self.token}"
+
+
+class SearchIndexOutbox(models.Model):
+    """
+    Changes of the records in the Elasticsearch page index, written by the model signals.
+    index_and_notify indexes the pending changes in batches and marks them as processed.
+    Changes which failed to be indexed are kept pending and retried after an increasing delay.
+    """
+
+    # Retry delays double after each failed attempt, up to MAX_RETRY_DELAY
+    RETRY_DELAY = timedelta(minutes=1)
+    MAX_RETRY_DELAY = timedelta(hours=1)
+
+    class Action(models.IntegerChoices):
+        INDEX = 1, _("index")
+        DELETE = 2, _("delete")
+
+    # model_name of the changed record, see SearchIndexOutbox.get_models
+    model = models.CharField(verbose_name=_("model"), max_length=50)
+    object_id = models.IntegerField(verbose_name=_("object id"))
+    action = models.IntegerField(verbose_name=_("action"), choices=Action.choices)
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+    processed_at = models.DateTimeField(verbose_name=_("processed at"), null=True, blank=True)
+    attempts = models.PositiveIntegerField(verbose_name=_("failed attempts"), default=0)
+    next_attempt_at = models.DateTimeField(verbose_name=_("next attempt at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("search index outbox")
+        verbose_name_plural = _("search index outbox")
+        indexes = [
+            models.Index(fields=["id"], condition=Q(processed_at__isnull=True), name="search_outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.model}-{self.object_id} ({self.get_action_display()})"
+
+    @staticmethod
+    def get_models():
+        return {model._meta.model_name: model for model in (Event, Appeal, FieldReport)}
+
+    @classmethod
+    def get_retry_delay(cls, attempts):
+        # Bounded exponent, the delay is capped anyway
+        return min(cls.RETRY_DELAY * 2 ** min(attempts - 1, 16), cls.MAX_RETRY_DELAY)
+
+    @classmethod
+    def enqueue(cls, model, object_ids, action=Action.INDEX):
+        """Also usable for bulk changes which don't send the model signals"""
+        return cls.objects.bulk_create(
+            [cls(model=model._meta.model_name, object_id=object_id, action=action) for object_id in object_ids]
+        )
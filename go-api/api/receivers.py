@@ -1,5 +1,4 @@
 import json
-from datetime import datetime
 
 from django.db import transaction
 from django.db.models import Q
@@ -11,13 +10,49 @@ from django.db.models.signals import (
     pre_save,
 )
 from django.dispatch import receiver
-from django.utils import timezone
 from reversion.models import Version
 from reversion.signals import post_revision_commit
 
 from api.logger import logger
-from api.models import Country, Event, FieldReport, ReversionDifferenceLog
+from api.models import (
+    Country,
+    CountryCapacityStrengthening,
+    CountryContact,
+    CountryDirectory,
+    CountryICRCPresence,
+    CountryKeyFigure,
+    CountryLink,
+    CountryOrganizationalCapacity,
+    CountrySnippet,
+    DisasterType,
+    District,
+    Event,
+    EventContact,
+    EventFeaturedDocument,
+    EventLink,
+    EventMonthIndex,
+    FieldReport,
+    KeyFigure,
+    NSDInitiatives,
+    Profile,
+    Region,
+    ReversionDifferenceLog,
+    SearchIndexOutbox,
+    Snippet,
+    UserCountry,
+)
+from api.rollups import (
+    get_rollup_months,
+    get_rollups_months_for_records,
+    get_stored_rollup_months,
+    refresh_rollups_on_commit,
+)
+from api.visibility_class import invalidate_user_country_ids
+from country_plan.models import CountryPlan
+from deployments.models import EmergencyProject, Heop, Personnel, PersonnelDeployment
+from local_units.models import DelegationOffice
 from main.suspend_receivers import suspendingreceiver
+from middlewares.cache import invalidate_cache_tags
 from middlewares.middlewares import get_username
 from utils.elasticsearch import create_es_index, delete_es_index, update_es_index
 from utils.erp import push_fr_data
@@ -208,73 +243,8 @@ def handle_fr_for_erp(sender, instance, using, **kwargs):
 
 @receiver(post_save, sender=Appeal)
 def add_update_appeal_history(sender, instance, created, **kwargs):
-    fields_watched = [
-        field.name
-        for field in AppealHistory._meta.get_fields()
-        if field.name not in ["id", "appeal", "valid_from", "valid_to", "aid", "amount_funded"]
-    ]
-    now = timezone.now()
-    changed = False
-
-    if created:  # Appeal Insert
-        AppealHistory.objects.create(
-            aid=instance.aid,
-            num_beneficiaries=instance.num_beneficiaries,
-            amount_requested=instance.amount_requested,
-            amount_funded=instance.amount_funded,
-            valid_from=now,
-            # TODO: use coalesce to fill valid_to instead of defining here.
-            valid_to=datetime(2200, 1, 1, tzinfo=timezone.utc),
-            start_date=instance.start_date,
-            end_date=instance.end_date,
-            appeal=instance,
-            atype=instance.atype,
-            country=instance.country,
-            region=instance.region,
-            dtype=instance.dtype,
-            needs_confirmation=instance.needs_confirmation,
-            status=instance.status,
-            code=instance.code,
-            triggering_amount=instance.triggering_amount,
-        )
-
-    else:
-        # Appeal Update
-        appeal = Appeal.objects.get(code=instance.code)
-        appeal_history = AppealHistory.objects.filter(aid=instance.aid).order_by("id").last()
-        for field in fields_watched:
-            if appeal_history and getattr(appeal, field) != getattr(appeal_history, field):
-                # Watched fields are not changed
-                changed = True
-
-        if not changed:
-            # Watched fields are not changed
-            return
-
-        appeal_history.valid_to = now
-        appeal_history.save()
-
-        # Create a new appeal history if changed
-        AppealHistory.objects.create(
-            aid=instance.aid,
-            num_beneficiaries=instance.num_beneficiaries,
-            amount_requested=instance.amount_requested,
-            amount_funded=instance.amount_funded,
-            valid_from=now,
-            # TODO: use coalesce to fill valid_to instead of defining here.
-            valid_to=datetime(2200, 1, 1, tzinfo=timezone.utc),
-            start_date=instance.start_date,
-            end_date=instance.end_date,
-            appeal=instance,
-            atype=instance.atype,
-            country=instance.country,
-            region=instance.region,
-            dtype=instance.dtype,
-            needs_confirmation=instance.needs_confirmation,
-            status=instance.status,
-            code=instance.code,
-            triggering_amount=instance.triggering_amount,
-        )
+    # NOTE: Bulk writes (e.g. ingest_appeals) call AppealHistory.add_versions directly
+    AppealHistory.add_versions([instance], created=created)
 
 
 @receiver(post_delete, sender=Appeal)
@@ -296,3 +266,226 @@ def update_fieldreport_summary(sender, instance, action, **kwargs):
     if action in ["post_add", "post_remove"]:
         instance.fr_num = None
         instance.save()
+
+
+@receiver(pre_save, sender=Event)
+def keep_previous_event_created_at(sender, instance, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk).values_list("created_at", flat=True).first() if instance.pk else None
+    instance._previous_created_at = previous
+
+
+@receiver([post_save, post_delete], sender=Event)
+def update_event_month_index(sender, instance, signal, created=False, **kwargs):
+    """
+    Keep the analytics month index of the Emergency up to date.
+    The countries are handled by update_event_month_index_countries, so a save which keeps the created_at is skipped.
+    """
+    if signal == post_save and not created and getattr(instance, "_previous_created_at", None) == instance.created_at:
+        return
+    EventMonthIndex.refresh_for_events([instance.pk])
+
+
+@receiver(m2m_changed, sender=Event.countries.through)
+def update_event_month_index_countries(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Refresh the publishing countries of the Emergency month index when the countries are changed.
+    """
+    if reverse and action == "pre_clear":
+        # Changed from the Country side: instance is a Country, pk_set is not available for clear
+        instance._month_index_event_ids = list(instance.event_set.values_list("id", flat=True))
+        return
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if action != "post_clear" and not pk_set:
+        # e.g. add() of already added countries
+        return
+    if reverse:
+        if action == "post_clear":
+            event_ids = getattr(instance, "_month_index_event_ids", [])
+        else:
+            event_ids = pk_set or []
+        EventMonthIndex.refresh_for_events(event_ids)
+        return
+    EventMonthIndex.refresh_for_events([instance.pk])
+
+
+@receiver(pre_save, sender=Country)
+def keep_previous_publishing_country(sender, instance, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk).values("name", "iso").first() if instance.pk else None
+    instance._previous_publishing_country = previous
+
+
+@receiver(post_save, sender=Country)
+def update_event_month_index_country(sender, instance, created, **kwargs):
+    """
+    The month index stores the publishing country names, refresh the Emergencies of a renamed Country.
+    """
+    previous = getattr(instance, "_previous_publishing_country", None)
+    if created or previous is None or previous == {"name": instance.name, "iso": instance.iso}:
+        return
+    EventMonthIndex.refresh_for_events(instance.event_set.values_list("id", flat=True))
+
+
+def get_personnel_cache_tags(instance):
+    event_id = PersonnelDeployment.objects.filter(pk=instance.deployment_id).values_list("event_deployed_to", flat=True).first()
+    # Active deployments count of the Emergency list and detail
+    return ["event:*", event_id and f"event:{event_id}"]
+
+
+def get_country_relation_cache_tags(instance):
+    # Nested in the Country detail
+    return [instance.country_id and f"country:{instance.country_id}"]
+
+
+def get_event_relation_cache_tags(instance):
+    # Nested in the Emergency detail
+    return [instance.event_id and f"event:{instance.event_id}"]
+
+
+# API response cache tags to bump on change, see CACHE_TAGS_BY_PATH in middlewares/cache.py
+CACHE_TAGS_GETTERS = {
+    Event: lambda instance: ["event:*", f"event:{instance.pk}"],
+    Appeal: lambda instance: [
+        "appeal:*",
+        f"appeal:{instance.pk}",
+        # Nested/aggregated in Emergency and Country figure
+        instance.event_id and f"event:{instance.event_id}",
+        instance.country_id and f"country:{instance.country_id}",
+    ],
+    # Country, region, district and disaster type names are nested in all the cached responses
+    Country: lambda instance: ["country:*", f"country:{instance.pk}", "lookups:*"],
+    Region: lambda instance: ["lookups:*"],
+    District: lambda instance: ["lookups:*"],
+    DisasterType: lambda instance: ["lookups:*"],
+    FieldReport: lambda instance: [
+        "fieldreport:*",
+        f"fieldreport:{instance.pk}",
+        instance.event_id and f"event:{instance.event_id}",
+    ],
+    # Emergency relations
+    EventContact: get_event_relation_cache_tags,
+    EventFeaturedDocument: get_event_relation_cache_tags,
+    EventLink: get_event_relation_cache_tags,
+    KeyFigure: get_event_relation_cache_tags,
+    Snippet: get_event_relation_cache_tags,
+    EmergencyProject: lambda instance: ["event:*", *get_event_relation_cache_tags(instance)],
+    Personnel: get_personnel_cache_tags,
+    PersonnelDeployment: lambda instance: [
+        "event:*",
+        instance.event_deployed_to_id and f"event:{instance.event_deployed_to_id}",
+    ],
+    # Country relations
+    CountryLink: lambda instance: ["country:*", *get_country_relation_cache_tags(instance)],
+    CountryContact: get_country_relation_cache_tags,
+    CountryDirectory: get_country_relation_cache_tags,
+    CountryCapacityStrengthening: get_country_relation_cache_tags,
+    CountryOrganizationalCapacity: get_country_relation_cache_tags,
+    CountryICRCPresence: get_country_relation_cache_tags,
+    CountryKeyFigure: get_country_relation_cache_tags,
+    CountrySnippet: get_country_relation_cache_tags,
+    NSDInitiatives: get_country_relation_cache_tags,
+    DelegationOffice: get_country_relation_cache_tags,
+    CountryPlan: get_country_relation_cache_tags,
+}
+
+
+def invalidate_api_cache_on_commit(tags):
+    tags = [tag for tag in tags if tag]
+    if tags:
+        transaction.on_commit(lambda: invalidate_cache_tags(tags))
+
+
+@receiver([post_save, post_delete])
+def invalidate_api_cache(sender, instance, **kwargs):
+    if tags_getter := CACHE_TAGS_GETTERS.get(sender):
+        invalidate_api_cache_on_commit(tags_getter(instance))
+
+
+@receiver(m2m_changed, sender=Event.countries.through)
+@receiver(m2m_changed, sender=Event.regions.through)
+@receiver(m2m_changed, sender=FieldReport.countries.through)
+def invalidate_api_cache_for_m2m(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    tags = []
+    if tags_getter := CACHE_TAGS_GETTERS.get(type(instance)):
+        tags.extend(tags_getter(instance))
+    if model in CACHE_TAGS_GETTERS:
+        # The other side of the relation (pk_set is None for clear)
+        model_name = model._meta.model_name
+        tags.append(f"{model_name}:*")
+        tags.extend(f"{model_name}:{pk}" for pk in pk_set or [])
+    invalidate_api_cache_on_commit(tags)
+
+
+@receiver(post_save, sender=UserCountry)
+@receiver(post_delete, sender=UserCountry)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def update_user_country_ids_cache(sender, instance, **kwargs):
+    user_id = instance.user_id
+    invalidate_user_country_ids(user_id)
+    # Also after commit, in case a concurrent request cached the old ids meanwhile
+    transaction.on_commit(lambda: invalidate_user_country_ids(user_id))
+
+
+# Records of the Elasticsearch page index, the changes are indexed by index_and_notify
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Appeal)
+@receiver(post_save, sender=FieldReport)
+def add_search_index_outbox_change(sender, instance, **kwargs):
+    SearchIndexOutbox.enqueue(sender, [instance.pk])
+    if sender is Event:
+        # Appeal documents include the visibility of the Emergency
+        SearchIndexOutbox.enqueue(Appeal, Appeal.objects.filter(event=instance).values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Appeal)
+@receiver(post_delete, sender=FieldReport)
+def add_search_index_outbox_deletion(sender, instance, **kwargs):
+    SearchIndexOutbox.enqueue(sender, [instance.pk], action=SearchIndexOutbox.Action.DELETE)
+
+
+@receiver(m2m_changed, sender=Event.countries.through)
+@receiver(m2m_changed, sender=FieldReport.countries.through)
+def add_search_index_outbox_countries_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """The documents include the country names"""
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if reverse:
+        # Changed from the Country side (pk_set is None for clear)
+        SearchIndexOutbox.enqueue(model, pk_set or [])
+    else:
+        SearchIndexOutbox.enqueue(type(instance), [instance.pk])
+
+
+# Monthly rollups, refreshed for the months of the record before and after the change
+@receiver(pre_save, sender=Appeal)
+@receiver(pre_save, sender=Event)
+@receiver(pre_save, sender=FieldReport)
+@receiver(pre_save, sender=Heop)
+def keep_previous_rollup_months(sender, instance, **kwargs):
+    instance._previous_rollup_months = get_stored_rollup_months(sender, instance.pk) if instance.pk else set()
+
+
+@receiver([post_save, post_delete], sender=Appeal)
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=FieldReport)
+@receiver([post_save, post_delete], sender=Heop)
+def refresh_monthly_rollups(sender, instance, **kwargs):
+    refresh_rollups_on_commit(getattr(instance, "_previous_rollup_months", set()) | get_rollup_months(instance))
+
+
+@receiver(m2m_changed, sender=Event.countries.through)
+@receiver(m2m_changed, sender=Event.regions.through)
+@receiver(m2m_changed, sender=FieldReport.countries.through)
+@receiver(m2m_changed, sender=FieldReport.regions.through)
+def refresh_monthly_rollups_for_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if reverse:
+        # Changed from the Country/Region side (pk_set is None for clear)
+        refresh_rollups_on_commit(get_rollups_months_for_records(model, pk_set or []))
+    else:
+        refresh_rollups_on_commit(get_rollup_months(instance))
@@ -0,0 +1,356 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from django.db import connection, transaction
+from django.db.models import Avg, Q, Sum
+
+from deployments.models import Heop
+
+from .models import Appeal, Event, FieldReport, MonthlyRollup
+
+# Record date of each model, same as AggregateByTime
+DATE_FIELDS = {
+    MonthlyRollup.Model.APPEAL: "start_date",
+    MonthlyRollup.Model.EVENT: "disaster_start_date",
+    MonthlyRollup.Model.FIELD_REPORT: "created_at",
+    MonthlyRollup.Model.HEOP: "start_date",
+}
+# Summed fields of each model (`sum_*` params of AggregateByTime)
+SUM_FIELDS = {
+    MonthlyRollup.Model.APPEAL: ("num_beneficiaries", "amount_requested", "amount_funded"),
+    MonthlyRollup.Model.EVENT: ("num_affected",),
+    MonthlyRollup.Model.FIELD_REPORT: ("num_affected",),
+    MonthlyRollup.Model.HEOP: (),
+}
+# Also summed for the emergencies, used by the country disaster endpoints
+EVENT_FIELDS = ("targeted_population", "amount_requested", "amount_funded")
+# Part of the figures of their emergency
+EVENT_PART_MODELS = (MonthlyRollup.Model.APPEAL, MonthlyRollup.Model.FIELD_REPORT)
+# `filter_*` params of AggregateByTime available in the rollups
+FILTER_FIELDS = {
+    MonthlyRollup.Model.APPEAL: ("dtype", "atype"),
+    MonthlyRollup.Model.EVENT: ("dtype",),
+    MonthlyRollup.Model.FIELD_REPORT: ("dtype",),
+    MonthlyRollup.Model.HEOP: ("dtype",),
+}
+
+
+def get_model_name(model):
+    return MonthlyRollup.Model(model._meta.model_name)
+
+
+def get_month(value):
+    """Same as TruncMonth(..., tzinfo=timezone.utc)"""
+    return value.astimezone(timezone.utc).date().replace(day=1)
+
+
+def get_month_range(month):
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def add_value(total, value):
+    if value is None:
+        return total
+    return value if total is None else total + value
+
+
+def get_event_figures(event_ids):
+    """
+    EVENT_FIELDS of the emergencies: sums of their appeals' amounts, and as targeted population
+    the average of their appeals' beneficiaries plus the number of affected of their latest field report
+    """
+    event_figures = defaultdict(lambda: {"targeted_population": 0, "amount_requested": None, "amount_funded": None})
+    appeal_figures_qs = (
+        Appeal.objects.filter(event_id__in=event_ids)
+        .order_by()
+        .values("event_id")
+        .annotate(Avg("num_beneficiaries"), Sum("amount_requested"), Sum("amount_funded"))
+    )
+    for figures in appeal_figures_qs:
+        event_figures[figures["event_id"]].update(
+            targeted_population=int(figures["num_beneficiaries__avg"] or 0),
+            amount_requested=figures["amount_requested__sum"],
+            amount_funded=figures["amount_funded__sum"],
+        )
+    latest_field_reports_qs = (
+        FieldReport.objects.filter(event_id__in=event_ids)
+        .order_by("event_id", "-created_at")
+        .distinct("event_id")
+        .values_list("event_id", "num_affected")
+    )
+    for event_id, num_affected in latest_field_reports_qs:
+        event_figures[event_id]["targeted_population"] += num_affected or 0
+    return event_figures
+
+
+def get_records(model_name, date_q):
+    """
+    Records of the model within the dates, as (date, countries, regions, dtype_id, atype, values)
+    Emergencies and field reports belong to many countries and regions.
+    """
+    if model_name == MonthlyRollup.Model.APPEAL:
+        for start_date, country_id, region_id, dtype_id, atype, *values in Appeal.objects.filter(date_q).values_list(
+            "start_date", "country_id", "region_id", "dtype_id", "atype", *SUM_FIELDS[model_name]
+        ):
+            yield start_date, [country_id], [region_id], dtype_id, atype, dict(zip(SUM_FIELDS[model_name], values))
+        return
+
+    if model_name == MonthlyRollup.Model.HEOP:
+        for start_date, country_id, region_id, dtype_id in Heop.objects.filter(date_q).values_list(
+            "start_date", "country_id", "region_id", "dtype_id"
+        ):
+            yield start_date, [country_id], [region_id], dtype_id, None, {}
+        return
+
+    model = Event if model_name == MonthlyRollup.Model.EVENT else FieldReport
+    records = list(model.objects.filter(date_q).values_list("id", DATE_FIELDS[model_name], "dtype_id", "num_affected"))
+    ids = [record[0] for record in records]
+    countries = defaultdict(list)
+    for record_id, country_id in model.countries.through.objects.filter(**{f"{model_name}_id__in": ids}).values_list(
+        f"{model_name}_id", "country_id"
+    ):
+        countries[record_id].append(country_id)
+    regions = defaultdict(list)
+    for record_id, region_id in model.regions.through.objects.filter(**{f"{model_name}_id__in": ids}).values_list(
+        f"{model_name}_id", "region_id"
+    ):
+        regions[record_id].append(region_id)
+
+    event_figures = get_event_figures(ids) if model_name == MonthlyRollup.Model.EVENT else {}
+    for record_id, record_date, dtype_id, num_affected in records:
+        values = {"num_affected": num_affected}
+        if model_name == MonthlyRollup.Model.EVENT:
+            values.update(event_figures[record_id])
+        yield record_date, countries[record_id], regions[record_id], dtype_id, None, values
+
+
+def is_built(model_name):
+    return MonthlyRollup.objects.filter(model=model_name).exists()
+
+
+def lock_rollup(model_name):
+    """
+    Serializes the refreshes of the model's rollups until the end of the transaction.
+    Otherwise two concurrent refreshes of a month would both delete, then both insert its rows.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"monthly-rollup:{model_name}"])
+
+
+@transaction.atomic
+def refresh_rollup(model_name, months=None):
+    """Rebuild the rollup rows of the model for the months (dates of the first day), all months if None"""
+    date_field = DATE_FIELDS[model_name]
+    if months is None:
+        date_q = Q(**{f"{date_field}__isnull": False})
+    else:
+        months = set(months)
+        if not months:
+            return []
+        date_q = Q()
+        for month in months:
+            start, end = get_month_range(month)
+            date_q |= Q(**{f"{date_field}__gte": start, f"{date_field}__lt": end})
+    value_fields = SUM_FIELDS[model_name] + (EVENT_FIELDS if model_name == MonthlyRollup.Model.EVENT else ())
+    # Before reading the records, so the rows are built from the data committed by a concurrent refresh
+    lock_rollup(model_name)
+
+    rollups = {}
+    for record_date, countries, regions, dtype_id, atype, values in get_records(model_name, date_q):
+        month = get_month(record_date)
+        # Global, per country and per region
+        scopes = [(None, None)]
+        scopes.extend((country_id, None) for country_id in set(countries) if country_id)
+        scopes.extend((None, region_id) for region_id in set(regions) if region_id)
+        for country_id, region_id in scopes:
+            key = (month, country_id, region_id, dtype_id, atype)
+            if key not in rollups:
+                rollups[key] = MonthlyRollup(
+                    model=model_name,
+                    month=month,
+                    country_id=country_id,
+                    region_id=region_id,
+                    dtype_id=dtype_id,
+                    atype=atype,
+                    **{field: None for field in value_fields},
+                )
+            rollup = rollups[key]
+            rollup.count += 1
+            for field in value_fields:
+                setattr(rollup, field, add_value(getattr(rollup, field), values.get(field)))
+
+    rollup_qs = MonthlyRollup.objects.filter(model=model_name)
+    if months is not None:
+        rollup_qs = rollup_qs.filter(month__in=months)
+    rollup_qs.delete()
+    return MonthlyRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+
+
+def refresh_rollups(model_months):
+    """Refresh the (model name, month) of the built rollups"""
+    months_by_model = defaultdict(set)
+    for model_name, month in model_months:
+        months_by_model[model_name].add(month)
+    for model_name, months in months_by_model.items():
+        if is_built(model_name):
+            refresh_rollup(model_name, months)
+
+
+def get_record_months(model_name, record_date, event_id=None):
+    """(model name, month) of the rollups counting the record"""
+    model_months = set()
+    if record_date:
+        model_months.add((model_name, get_month(record_date)))
+    # Appeals and field reports are part of the figures of their emergency
+    if model_name in EVENT_PART_MODELS and event_id:
+        event_date = Event.objects.filter(pk=event_id).values_list("disaster_start_date", flat=True).first()
+        if event_date:
+            model_months.add((MonthlyRollup.Model.EVENT, get_month(event_date)))
+    return model_months
+
+
+def get_rollup_months(instance):
+    model_name = get_model_name(instance)
+    return get_record_months(model_name, getattr(instance, DATE_FIELDS[model_name]), getattr(instance, "event_id", None))
+
+
+def get_stored_rollup_months(model, pk):
+    """get_rollup_months of the record as stored, without a query when the rollups it is counted in are not built"""
+    model_name = get_model_name(model)
+    fields = [DATE_FIELDS[model_name]]
+    if model_name in EVENT_PART_MODELS:
+        if not MonthlyRollup.objects.filter(model__in=[model_name, MonthlyRollup.Model.EVENT]).exists():
+            return set()
+        fields.append("event_id")
+    elif not is_built(model_name):
+        return set()
+    values = model.objects.filter(pk=pk).values_list(*fields).first()
+    return get_record_months(model_name, *values) if values else set()
+
+
+def get_rollups_months_for_records(model, ids):
+    model_name = get_model_name(model)
+    return {
+        (model_name, get_month(record_date))
+        for record_date in model.objects.filter(id__in=ids).values_list(DATE_FIELDS[model_name], flat=True)
+        if record_date
+    }
+
+
+def refresh_rollups_on_commit(model_months):
+    if model_months:
+        transaction.on_commit(lambda: refresh_rollups(model_months))
+
+
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_time_series(model_name, unit, start_date, country=None, region=None, filters=None, sums=None):
+    """
+    AggregateByTime from the rollups, None if not covered by the rollups:
+    the start date must be the first day of a month, and the filters and sums must be part of the rollups.
+    """
+    filters = filters or {}
+    sums = sums or {}
+    if start_date.day != 1 or not is_built(model_name):
+        return None
+    if not set(filters).issubset(FILTER_FIELDS[model_name]) or not set(sums.values()).issubset(SUM_FIELDS[model_name]):
+        return None
+
+    rollup_qs = MonthlyRollup.objects.filter(model=model_name, month__gte=start_date.date())
+    for field, value in filters.items():
+        if (value_id := parse_id(value)) is None:
+            return None
+        rollup_qs = rollup_qs.filter(**{field: value_id})
+    # Same as the live query: country, else region, else global
+    if country is not None:
+        if (country_id := parse_id(country)) is None:
+            return None
+        rollup_qs = rollup_qs.filter(country=country_id, region__isnull=True)
+    elif region is not None:
+        if (region_id := parse_id(region)) is None:
+            return None
+        rollup_qs = rollup_qs.filter(country__isnull=True, region=region_id)
+    else:
+        rollup_qs = rollup_qs.filter(country__isnull=True, region__isnull=True)
+
+    series = {}
+    for rollup in rollup_qs.order_by("month"):
+        month = rollup.month if unit == "month" else date(rollup.month.year, 1, 1)
+        if month not in series:
+            series[month] = {
+                "timespan": datetime(month.year, month.month, month.day, tzinfo=timezone.utc),
+                "count": 0,
+                **{name: None for name in sums},
+            }
+        figures = series[month]
+        figures["count"] += rollup.count
+        for name, field in sums.items():
+            figures[name] = add_value(figures[name], getattr(rollup, field))
+    return list(series.values())
+
+
+def get_country_disaster_months(country, start_date, end_date, dtype=None):
+    """
+    Emergencies of the country per month and disaster type, from the month of start_date to the month of end_date
+    None if the emergency rollups are not built
+    """
+    if not is_built(MonthlyRollup.Model.EVENT):
+        return None
+    rollup_qs = MonthlyRollup.objects.filter(
+        model=MonthlyRollup.Model.EVENT,
+        country=country,
+        dtype__isnull=False,
+        month__gte=get_month(start_date),
+        month__lte=get_month(end_date),
+    )
+    if dtype:
+        rollup_qs = rollup_qs.filter(dtype=dtype)
+    return [
+        {
+            "date": datetime(rollup.month.year, rollup.month.month, 1, tzinfo=timezone.utc),
+            "targeted_population": rollup.targeted_population,
+            "disaster_name": rollup.dtype.name,
+            "disaster_id": rollup.dtype_id,
+            "amount_requested": rollup.amount_requested,
+            "amount_funded": rollup.amount_funded,
+        }
+        for rollup in rollup_qs.select_related("dtype").order_by("month", "dtype__name")
+    ]
+
+
+def get_live_country_disaster_months(country, start_date, end_date, dtype=None):
+    """Same as get_country_disaster_months, from the emergencies of the country started within the dates"""
+    event_qs = Event.objects.filter(countries=country, dtype__isnull=False, disaster_start_date__isnull=False)
+    if start_date and end_date:
+        event_qs = event_qs.filter(disaster_start_date__gte=start_date, disaster_start_date__lte=end_date)
+    if dtype:
+        event_qs = event_qs.filter(dtype=dtype)
+    events = list(event_qs.values_list("id", "disaster_start_date", "dtype_id", "dtype__name"))
+    event_figures = get_event_figures([event[0] for event in events])
+    disaster_months = {}
+    for event_id, disaster_start_date, dtype_id, dtype_name in events:
+        month = get_month(disaster_start_date)
+        key = (month, dtype_id)
+        if key not in disaster_months:
+            disaster_months[key] = {
+                "date": datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+                "disaster_name": dtype_name,
+                "disaster_id": dtype_id,
+                **{field: None for field in EVENT_FIELDS},
+            }
+        for field in EVENT_FIELDS:
+            disaster_months[key][field] = add_value(disaster_months[key][field], event_figures[event_id][field])
+    return sorted(disaster_months.values(), key=lambda figures: (figures["date"], figures["disaster_name"]))
+
+
+def get_default_disaster_period(now):
+    """Default dates of the country disaster endpoints: the whole months of the last 2 years, current month included"""
+    start, _ = get_month_range(get_month(now - timedelta(days=2 * 365)))
+    _, end = get_month_range(get_month(now))
+    return start, end - timedelta(microseconds=1)
@@ -40,7 +40,7 @@ class DistrictIndex(indexes.SearchIndex, indexes.Indexable):
         return District
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("country")
 
 
 class AppealIndex(indexes.Indexable, indexes.SearchIndex):
@@ -61,7 +61,7 @@ class AppealIndex(indexes.Indexable, indexes.SearchIndex):
         return Appeal
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("country", "event")
 
 
 class EmergenciesIndex(indexes.Indexable, indexes.SearchIndex):
@@ -108,7 +108,7 @@ class EmergenciesIndex(indexes.Indexable, indexes.SearchIndex):
         return [appeal.get_atype_display() for appeal in obj.appeals.all()]
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("dtype").prefetch_related("countries", "appeals")
 
 
 class FieldReportIndex(indexes.Indexable, indexes.SearchIndex):
@@ -129,7 +129,7 @@ class FieldReportIndex(indexes.Indexable, indexes.SearchIndex):
         return FieldReport
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("event").prefetch_related("countries")
 
     def prepare_countries(self, obj):
         return [country.name for country in obj.countries.all()]
@@ -12,9 +12,15 @@ from rest_framework import serializers
 
 from api.analytics_access import get_analytics_access
 # from api.utils import pdf_exporter
-from api.tasks import generate_url
+from api.tasks import (
+    generate_url,
+    get_export_language,
+    get_export_source_modified_at,
+    reuse_previous_export,
+)
+from api.typeahead import TYPEAHEAD_LIMIT
 from api.utils import CountryValidator, RegionValidator
-from deployments.models import EmergencyProject, Personnel, PersonnelDeployment
+from deployments.models import Personnel, PersonnelDeployment
 from dref.models import Dref, DrefFinalReport, DrefOperationalUpdate
 from lang.models import String
 from lang.serializers import ModelSerializer
@@ -90,16 +96,10 @@ class GeoSerializerMixin:
     """
 
     def get_bbox(self, district) -> dict:
-        if district.bbox:
-            return json.loads(district.bbox.geojson)
-        else:
-            return None
+        return district.bbox_geojson
 
     def get_centroid(self, district) -> dict:
-        if district.centroid:
-            return json.loads(district.centroid.geojson)
-        else:
-            return None
+        return district.centroid_geojson
 
 
 class DisasterTypeSerializer(ModelSerializer):
@@ -134,7 +134,7 @@ class RegionGeoSerializer(ModelSerializer):
 
     @staticmethod
     def get_bbox(region):
-        return region.bbox and json.loads(region.bbox.geojson)
+        return region.bbox_geojson
 
     class Meta:
         model = Region
@@ -218,11 +218,11 @@ class CountryGeoSerializer(ModelSerializer):
 
     @staticmethod
     def get_bbox(country) -> dict:
-        return country.bbox and json.loads(country.bbox.geojson)
+        return country.bbox_geojson
 
     @staticmethod
     def get_centroid(country) -> dict:
-        return country.centroid and json.loads(country.centroid.geojson)
+        return country.centroid_geojson
 
     class Meta:
         model = Country
@@ -293,11 +293,11 @@ class DistrictSerializerRMD(ModelSerializer):
 
     @staticmethod
     def get_bbox(district) -> dict:
-        return district.bbox and json.loads(district.bbox.geojson)
+        return district.bbox_geojson
 
     @staticmethod
     def get_centroid(district) -> dict:
-        return district.centroid and json.loads(district.centroid.geojson)
+        return district.centroid_geojson
 
 
 class MicroCountrySerializer(ModelSerializer):
@@ -361,11 +361,11 @@ class DistrictSerializer(ModelSerializer):
 
     @staticmethod
     def get_bbox(district) -> dict:
-        return district.bbox and json.loads(district.bbox.geojson)
+        return district.bbox_geojson
 
     @staticmethod
     def get_centroid(district) -> dict:
-        return district.centroid and json.loads(district.centroid.geojson)
+        return district.centroid_geojson
 
 
 class Admin2Serializer(GeoSerializerMixin, ModelSerializer):
@@ -420,17 +420,11 @@ class MiniDistrictGeoSerializer(GeoSerializerMixin, ModelSerializer):
 
     @staticmethod
     def get_bbox(district) -> Union[dict, None]:
-        if district.bbox:
-            return json.loads(district.bbox.geojson)
-        else:
-            return None
+        return district.bbox_geojson
 
     @staticmethod
     def get_centroid(district) -> Union[dict, None]:
-        if district.centroid:
-            return json.loads(district.centroid.geojson)
-        else:
-            return None
+        return district.centroid_geojson
 
     class Meta:
         model = District
@@ -650,7 +644,7 @@ class RegionRelationSerializer(ModelSerializer):
 
     @staticmethod
     def get_bbox(region) -> dict:
-        return region.bbox and json.loads(region.bbox.geojson)
+        return region.bbox_geojson
 
     # get_snippets removed – visibility filtering now done entirely in the viewset.
 
@@ -813,11 +807,11 @@ class CountryRelationSerializer(ModelSerializer):
 
     @staticmethod
     def get_bbox(country) -> dict:
-        return country.bbox and json.loads(country.bbox.geojson)
+        return country.bbox_geojson
 
     @staticmethod
     def get_centroid(country) -> dict:
-        return country.centroid and json.loads(country.centroid.geojson)
+        return country.centroid_geojson
 
     @extend_schema_field(MiniDelegationOfficeSerializer(many=True))
     def get_country_delegation(self, country):
@@ -1078,6 +1072,7 @@ class ListEventSerializer(ModelSerializer):
     field_reports = MiniFieldReportSerializer(many=True, read_only=True)
     dtype = DisasterTypeSerializer(required=False)
     ifrc_severity_level_display = serializers.CharField(source="get_ifrc_severity_level_display", read_only=True)
+    # NOTE: Annotated in EventViewset.annotate_counts
     active_deployments = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -1111,18 +1106,6 @@ class ListEventSerializer(ModelSerializer):
         )
 
 
-# Instead of the below method we use the queryset's annotate tag:
-#    def get_active_deployments(self, event) -> int:
-#        now = timezone.now()
-#        return Personnel.objects.filter(
-#            type=Personnel.TypeChoices.RR,
-#            start_date__lt=now,
-#            end_date__gt=now,
-#            deployment__event_deployed_to=event,
-#            is_active=True,
-#        ).count()
-
-
 class SurgeEventSerializer(ModelSerializer):
     appeals = RelatedAppealSerializer(many=True, read_only=True)
     countries = MiniCountrySerializer(many=True)
@@ -1372,8 +1355,9 @@ class DetailEventSerializer(ModelSerializer):
     featured_documents = EventFeaturedDocumentSerializer(many=True, read_only=True)
     links = EventLinkSerializer(many=True, read_only=True)
     countries_for_preview = MiniCountrySerializer(many=True)
-    response_activity_count = serializers.SerializerMethodField()
-    active_deployments = serializers.SerializerMethodField()
+    # NOTE: Annotated in EventViewset.annotate_counts
+    response_activity_count = serializers.IntegerField(read_only=True)
+    active_deployments = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Event
@@ -1416,19 +1400,6 @@ class DetailEventSerializer(ModelSerializer):
         )
         lookup_field = "slug"
 
-    def get_response_activity_count(self, event) -> int:
-        return EmergencyProject.objects.filter(event=event).count()
-
-    def get_active_deployments(self, event) -> int:
-        now = timezone.now()
-        return Personnel.objects.filter(
-            type=Personnel.TypeChoices.RR,
-            start_date__lt=now,
-            end_date__gt=now,
-            deployment__event_deployed_to=event,
-            is_active=True,
-        ).count()
-
 
 class SituationReportTypeSerializer(serializers.ModelSerializer):
     type = serializers.CharField(allow_null=False, allow_blank=False, required=True)
@@ -2476,6 +2447,20 @@ class SearchSerializer(serializers.Serializer):
     reports = SearchReportSerializer(many=True, required=False, allow_null=True)
 
 
+class SearchTypeaheadInputSerializer(serializers.Serializer):
+    keyword = serializers.CharField(required=True)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=TYPEAHEAD_LIMIT, default=TYPEAHEAD_LIMIT)
+
+
+class SearchTypeaheadSerializer(serializers.Serializer):
+    type = serializers.CharField()
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    iso3 = serializers.CharField(required=False, allow_null=True)
+    code = serializers.CharField(required=False, allow_null=True)
+    event_id = serializers.IntegerField(required=False, allow_null=True)
+
+
 class ProjectPrimarySectorsSerializer(serializers.Serializer):
     key = serializers.IntegerField()
     label = serializers.CharField()
@@ -2568,7 +2553,17 @@ class ExportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Export
         fields = "__all__"
-        read_only_fields = ("pdf_file", "token", "requested_at", "completed_at", "status", "requested_by", "url")
+        read_only_fields = (
+            "pdf_file",
+            "token",
+            "requested_at",
+            "completed_at",
+            "status",
+            "requested_by",
+            "url",
+            "language",
+            "source_modified_at",
+        )
 
     def validate_pdf_file(self, pdf_file):
         validate_file_type(pdf_file)
@@ -2602,7 +2597,14 @@ class ExportSerializer(serializers.ModelSerializer):
         if is_pga:
             validated_data["url"] += "?is_pga=true"
         validated_data["requested_by"] = user
+        validated_data["language"] = get_export_language(export_type, language)
         export = super().create(validated_data)
+        export.source_modified_at = get_export_source_modified_at(export)
+        if export.source_modified_at:
+            export.save(update_fields=["source_modified_at"])
+            # An unchanged document returns the previously generated PDF
+            if reuse_previous_export(export):
+                return export
         if export.url:
             export.status = Export.ExportStatus.PENDING
             export.requested_at = timezone.now()
@@ -64,13 +64,13 @@ class CacheForUserMiddlewareTest(APITestCase):
         self.assert_200(response)
         self.assertEquals(response_json["count"], 1)
 
-        # A different user, accessing for the first time should see both items
+        # A different user with the same visibility class shares the cached response
         user2 = User.objects.create(username="john")
         self.client.force_authenticate(user=user2)
         response = self.client.get("/api/v2/field_report/", HTTP_ACCEPT_LANGUAGE="en")
         response_json = response.json()
         self.assert_200(response)
-        self.assertEquals(response_json["count"], 2)
+        self.assertEquals(response_json["count"], 1)
 
     @override_settings(CACHES=FAKE_REDIS_CACHE)
     def test_caches_for_anonymous_user(self):
@@ -1,7 +1,4 @@
 import json
-import pathlib
-import tempfile
-import time
 from datetime import datetime
 
 from celery import shared_task
@@ -9,21 +6,91 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.base import ContentFile
 from django.utils import timezone
-from playwright.sync_api import sync_playwright
 from rest_framework.authtoken.models import Token
 
+from dref.models import Dref, DrefFinalReport, DrefOperationalUpdate
+from main.celery import Queues
 from main.utils import logger_context
 
+from .browser_pool import EXPORT_SEMAPHORE, get_browser_pool
 from .logger import logger
 from .models import Export
 from .utils import DebugPlaywright
 
+# NOTE: DREF Export use the language from request, other Export types use default language (en)
+LANGUAGE_EXPORT_TYPES = [
+    Export.ExportType.DREF,
+    Export.ExportType.OPS_UPDATE,
+    Export.ExportType.FINAL_REPORT,
+]
+# Models of the exported documents which have a reliable modified_at
+EXPORT_SOURCE_MODELS = {
+    Export.ExportType.DREF: Dref,
+    Export.ExportType.OPS_UPDATE: DrefOperationalUpdate,
+    Export.ExportType.FINAL_REPORT: DrefFinalReport,
+}
 
-def build_storage_state(tmp_dir, user, token, language="en"):
-    temp_file = pathlib.Path(tmp_dir, "storage_state.json")
-    temp_file.touch()
 
-    state = {
+def get_export_language(export_type, language):
+    return language if export_type in LANGUAGE_EXPORT_TYPES else "en"
+
+
+def get_export_source_modified_at(export):
+    """Last modification of the exported document, None if unknown (the export is not deduplicated then)"""
+    model = EXPORT_SOURCE_MODELS.get(export.export_type)
+    if model is None:
+        return None
+    return model.objects.filter(id=export.export_id).values_list("modified_at", flat=True).first()
+
+
+def can_access_export_source(export):
+    """Whether the requester can access the exported document, as checked when the PDF is rendered with their token"""
+    # inline import to avoid cycles
+    from dref.views import filter_dref_queryset_by_user_access
+
+    model = EXPORT_SOURCE_MODELS.get(export.export_type)
+    if model is None or export.requested_by is None:
+        return False
+    # NOTE: The non admin users' access queryset doesn't keep the given filters, filtered afterwards
+    return filter_dref_queryset_by_user_access(export.requested_by, model.objects.all()).filter(id=export.export_id).exists()
+
+
+def reuse_previous_export(export):
+    """
+    Completes the export with the PDF of a previous export of the same document, not modified since.
+    Only for a requester who can access the document.
+    Returns False if there is none.
+    """
+    if export.source_modified_at is None or not can_access_export_source(export):
+        return False
+    previous_export = (
+        Export.objects.filter(
+            export_type=export.export_type,
+            export_id=export.export_id,
+            language=export.language,
+            source_modified_at=export.source_modified_at,
+            url=export.url,
+            status=Export.ExportStatus.COMPLETED,
+        )
+        .exclude(id=export.id)
+        .exclude(pdf_file="")
+        .exclude(pdf_file__isnull=True)
+        .order_by("-completed_at")
+        .first()
+    )
+    if previous_export is None:
+        return False
+    export.pdf_file = previous_export.pdf_file.name
+    export.status = Export.ExportStatus.COMPLETED
+    export.completed_at = timezone.now()
+    export.save(update_fields=["pdf_file", "status", "completed_at"])
+    logger.info(f"Export {export.pk} reuses the PDF of export {previous_export.pk}")
+    return True
+
+
+def build_storage_state(user, token, language="en"):
+    return {
+        "cookies": [],
         "origins": [
             {
                 "origin": settings.GO_WEB_INTERNAL_URL + "/",
@@ -43,14 +110,12 @@ def build_storage_state(tmp_dir, user, token, language="en"):
                     {"name": "language", "value": json.dumps(language)},
                 ],
             }
-        ]
+        ],
     }
-    with open(temp_file, "w") as f:
-        json.dump(state, f)
-    return temp_file
 
 
-@shared_task
+# NOTE: Runs in the PDF queue, the worker concurrency (see helm celeryPdf) bounds the exports running at the same time
+@shared_task(queue=Queues.PDF)
 def generate_url(url, export_id, user, title, language):
     export = Export.objects.get(id=export_id)
     user = User.objects.get(id=user)
@@ -84,61 +149,47 @@ def generate_url(url, export_id, user, title, language):
         </div>
     """  # noqa: E501
 
+    if reuse_previous_export(export):
+        logger.info(f"End export: {export.pk}")
+        return
+
     try:
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            with sync_playwright() as p:
-                browser = p.chromium.connect(settings.PLAYWRIGHT_SERVER_URL)
-                # NOTE: DREF Export use the language from request
-                if export.export_type in [
-                    Export.ExportType.DREF,
-                    Export.ExportType.OPS_UPDATE,
-                    Export.ExportType.FINAL_REPORT,
-                ]:
-                    storage_state = build_storage_state(
-                        tmp_dir,
-                        user,
-                        token,
-                        language,
-                    )
-                else:
-                    # NOTE: Other Export types use default language (en)
-                    storage_state = build_storage_state(
-                        tmp_dir,
-                        user,
-                        token,
-                    )
-                context = browser.new_context(storage_state=storage_state)
-                page = context.new_page()
-                if settings.DEBUG_PLAYWRIGHT:
-                    DebugPlaywright.debug(page)
-                # FIXME: Use of Timeout correct?
-                timeout = 300_000  # 5 min
-                page.goto(url, timeout=timeout)
-                time.sleep(5)
-                page.wait_for_selector("#pdf-preview-ready", state="attached", timeout=timeout)
-                if export.export_type == Export.ExportType.PER:
-                    file_name = f'PER {title} ({datetime.now().strftime("%Y-%m-%d %H-%M-%S")}).pdf'
-                else:
-                    file_name = f'DREF {title} ({datetime.now().strftime("%Y-%m-%d %H-%M-%S")}).pdf'
-                file = ContentFile(
-                    page.pdf(
-                        display_header_footer=True,
-                        prefer_css_page_size=True,
-                        print_background=True,
-                        footer_template=footer_template,
-                        header_template="<p></p>",
-                    )
+        language = get_export_language(export.export_type, language)
+        storage_state = build_storage_state(user, token, language)
+        with EXPORT_SEMAPHORE, get_browser_pool().new_page((token.key, language), storage_state) as page:
+            if settings.DEBUG_PLAYWRIGHT:
+                DebugPlaywright.debug(page)
+            # FIXME: Use of Timeout correct?
+            timeout = 300_000  # 5 min
+            page.goto(url, timeout=timeout)
+            # Ready once the preview is rendered, with its fonts and images loaded
+            page.wait_for_selector("#pdf-preview-ready", state="attached", timeout=timeout)
+            page.wait_for_function(
+                "() => document.fonts.status === 'loaded' && Array.from(document.images).every((img) => img.complete)",
+                timeout=timeout,
+            )
+            if export.export_type == Export.ExportType.PER:
+                file_name = f'PER {title} ({datetime.now().strftime("%Y-%m-%d %H-%M-%S")}).pdf'
+            else:
+                file_name = f'DREF {title} ({datetime.now().strftime("%Y-%m-%d %H-%M-%S")}).pdf'
+            file = ContentFile(
+                page.pdf(
+                    display_header_footer=True,
+                    prefer_css_page_size=True,
+                    print_background=True,
+                    footer_template=footer_template,
+                    header_template="<p></p>",
                 )
-                browser.close()
-            export.pdf_file.save(file_name, file)
-            export.status = Export.ExportStatus.COMPLETED
-            export.completed_at = timezone.now()
-            export.save(
-                update_fields=[
-                    "status",
-                    "completed_at",
-                ]
             )
+        export.pdf_file.save(file_name, file)
+        export.status = Export.ExportStatus.COMPLETED
+        export.completed_at = timezone.now()
+        export.save(
+            update_fields=[
+                "status",
+                "completed_at",
+            ]
+        )
     except Exception:
         logger.error(
             f"Failed to export PDF: {export.export_type}",
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import override_settings
+
+from api import models
+from api.factories.country import CountryFactory
+from api.factories.field_report import FieldReportFactory
+from main.test_case import APITestCase
+from middlewares.cache import (
+    VisibilityClass,
+    get_cache_tags,
+    get_cache_tags_version,
+    get_user_visibility_class,
+    invalidate_cache_tags,
+)
+
+LOCMEM_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+
+def with_cache_middlewares(middleware):
+    """Same as API_CACHE_MIDDLEWARE_ENABLED"""
+    if "middlewares.cache.UpdateCacheForUserMiddleware" in middleware:
+        return middleware
+    common_index = middleware.index("django.middleware.common.CommonMiddleware")
+    return [
+        *middleware[:common_index],
+        "middlewares.cache.UpdateCacheForUserMiddleware",
+        "django.middleware.common.CommonMiddleware",
+        "middlewares.cache.FetchFromCacheForUserMiddleware",
+        *middleware[common_index + 1 :],
+    ]
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class VisibilityClassTest(APITestCase):
+    def test_user_visibility_class(self):
+        guest = User.objects.create(username="guest")
+        guest.profile.limit_access_to_guest = True
+        guest.profile.save(update_fields=("limit_access_to_guest",))
+        self.assertEqual(get_user_visibility_class(guest), VisibilityClass.GUEST)
+        admin = User.objects.create(username="admin", is_superuser=True)
+        self.assertEqual(get_user_visibility_class(admin), VisibilityClass.IFRC)
+
+        # NS users share the class of the users with the same countries
+        country = CountryFactory.create()
+        user1, user2 = User.objects.create(username="jo"), User.objects.create(username="john")
+        self.assertEqual(get_user_visibility_class(user1), get_user_visibility_class(user2))
+        models.UserCountry.objects.create(user=user1, country=country)
+        self.assertNotEqual(get_user_visibility_class(user1), get_user_visibility_class(user2))
+        user2.profile.country = country
+        user2.profile.save(update_fields=("country",))
+        # UserCountry and Profile.country are used differently by the get_for methods
+        self.assertNotEqual(get_user_visibility_class(user1), get_user_visibility_class(user2))
+        self.assertTrue(get_user_visibility_class(user1).startswith(VisibilityClass.NS))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CacheTagsTest(APITestCase):
+    def test_cache_tags(self):
+        self.assertEqual(get_cache_tags("/api/v2/field_report/12/"), ["fieldreport:12", "lookups:*"])
+        self.assertEqual(get_cache_tags("/api/v2/country/"), ["country:*", "lookups:*"])
+        self.assertEqual(get_cache_tags("/api/v2/dref/"), [])
+
+    def test_invalidate_cache_tags(self):
+        country_version = get_cache_tags_version(["country:1", "lookups:*"])
+        event_version = get_cache_tags_version(["event:1"])
+        invalidate_cache_tags(["country:1"])
+        self.assertNotEqual(get_cache_tags_version(["country:1", "lookups:*"]), country_version)
+        self.assertEqual(get_cache_tags_version(["event:1"]), event_version)
+
+    def test_cache_tags_getters(self):
+        country = CountryFactory.create()
+        country_version = get_cache_tags_version([f"country:{country.id}"])
+        lookups_version = get_cache_tags_version(["lookups:*"])
+        event_version = get_cache_tags_version(["event:*"])
+        with self.captureOnCommitCallbacks(execute=True):
+            country.name = "xyz"
+            country.save(update_fields=("name",))
+        self.assertNotEqual(get_cache_tags_version([f"country:{country.id}"]), country_version)
+        self.assertNotEqual(get_cache_tags_version(["lookups:*"]), lookups_version)
+        self.assertEqual(get_cache_tags_version(["event:*"]), event_version)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, MIDDLEWARE=with_cache_middlewares(settings.MIDDLEWARE))
+class CacheForUserMiddlewareTest(APITestCase):
+    def test_shared_by_visibility_class(self):
+        country = CountryFactory.create()
+        FieldReportFactory.create(visibility=models.VisibilityChoices.PUBLIC)
+
+        self.client.force_authenticate(user=User.objects.create(username="jo"))
+        response = self.client.get("/api/v2/field_report/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assert_200(response)
+        self.assertEqual(response.json()["count"], 1)
+
+        # Created without running the on commit receivers, so the cached response is not invalidated
+        FieldReportFactory.create(visibility=models.VisibilityChoices.PUBLIC)
+
+        # A different user with the same visibility class shares the cached response
+        self.client.force_authenticate(user=User.objects.create(username="john"))
+        response = self.client.get("/api/v2/field_report/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assert_200(response)
+        self.assertEqual(response.json()["count"], 1)
+
+        # Users with a different visibility class, accessing for the first time should see both items
+        self.client.force_authenticate(user=User.objects.create(username="jane", is_superuser=True))
+        response = self.client.get("/api/v2/field_report/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assert_200(response)
+        self.assertEqual(response.json()["count"], 2)
+
+        ns_user = User.objects.create(username="joe")
+        models.UserCountry.objects.create(user=ns_user, country=country)
+        self.client.force_authenticate(user=ns_user)
+        response = self.client.get("/api/v2/field_report/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assert_200(response)
+        self.assertEqual(response.json()["count"], 2)
+
+    def test_invalidated_by_tags(self):
+        country = CountryFactory.create(name="abc")
+
+        self.client.force_authenticate(user=AnonymousUser())
+        response = self.client.get(f"/api/v2/country/{country.id}/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assert_200(response)
+        self.assertEqual(response.json()["name"], "abc")
+
+        # Updating the country bumps the country tag, so the cached response is not used anymore
+        with self.captureOnCommitCallbacks(execute=True):
+            country.name = "xyz"
+            country.save(update_fields=("name",))
+        response = self.client.get(f"/api/v2/country/{country.id}/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assert_200(response)
+        self.assertEqual(response.json()["name"], "xyz")
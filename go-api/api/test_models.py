@@ -12,7 +12,11 @@ from api.factories import country as countryFactory
 from api.factories import event as eventFactory
 from api.factories import field_report as fieldReportFactory
 from api.factories.region import RegionFactory
+from api.tasks import get_export_source_modified_at, reuse_previous_export
+from dref.factories.dref import DrefFactory
+from dref.tasks import process_dref_translation
 from main.mock import erp_request_side_effect_mock
+from utils.elasticsearch import index_search_index_outbox
 
 
 class DisasterTypeTest(TestCase):
@@ -57,6 +61,21 @@ class CountryTest(TestCase):
         countries = models.Country.objects.all()
         self.assertEqual(countries.count(), 274)
 
+    def test_country_geojson_fields(self):
+        country = countryFactory.CountryFactory.create(
+            centroid="POINT(10 20)",
+            bbox="POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))",
+        )
+        country.refresh_from_db()
+        self.assertEqual(country.centroid_geojson, {"type": "Point", "coordinates": [10.0, 20.0]})
+        self.assertEqual(country.bbox_geojson["type"], "Polygon")
+
+        country.centroid = None
+        country.save(update_fields=["centroid"])
+        country.refresh_from_db()
+        self.assertIsNone(country.centroid_geojson)
+        self.assertEqual(country.bbox_geojson["type"], "Polygon")
+
 
 class ProfileTest(TestCase):
     def setUp(self):
@@ -85,6 +104,53 @@ class AppealTest(APITestCase):
         self.assertIsNotNone(response["country"])
 
 
+class AppealHistoryTest(TestCase):
+    def setUp(self):
+        self.country = models.Country.objects.create(name="country")
+
+    def create_appeal(self, code, **kwargs):
+        return models.Appeal.objects.create(aid=code, name="appeal", code=code, country=self.country, **kwargs)
+
+    def test_history_versions_from_signal(self):
+        appeal = self.create_appeal("abc", amount_requested=100)
+        history = models.AppealHistory.objects.get(appeal=appeal)
+        self.assertEqual(history.valid_to, models.AppealHistory.OPEN_VALID_TO)
+
+        # Not watched
+        appeal.name = "renamed appeal"
+        appeal.amount_funded = 50
+        appeal.save()
+        self.assertEqual(models.AppealHistory.objects.filter(appeal=appeal).count(), 1)
+
+        appeal.amount_requested = 200
+        appeal.save()
+        old_history, new_history = models.AppealHistory.objects.filter(appeal=appeal).order_by("id")
+        self.assertEqual(old_history.valid_to, new_history.valid_from)
+        self.assertEqual(new_history.amount_requested, 200)
+        self.assertEqual(new_history.valid_to, models.AppealHistory.OPEN_VALID_TO)
+
+    def test_add_versions(self):
+        appeals = [self.create_appeal(f"code{i}", triggering_amount=10) for i in range(5)]
+        for appeal in appeals[:3]:
+            appeal.status = models.AppealStatus.CLOSED
+            # Float assigned to the decimal field, as the ingest does
+            appeal.triggering_amount = 10.0
+        # Find the current versions, close them, drop the current key figure snapshot, insert the new ones
+        with self.assertNumQueries(4):
+            models.AppealHistory.add_versions(appeals)
+        self.assertEqual(models.AppealHistory.objects.count(), 8)
+        self.assertEqual(
+            models.AppealHistory.objects.filter(valid_to=models.AppealHistory.OPEN_VALID_TO).count(),
+            5,
+        )
+        self.assertEqual(
+            set(
+                models.AppealHistory.objects.filter(valid_to=models.AppealHistory.OPEN_VALID_TO).values_list("status", flat=True)
+            ),
+            {models.AppealStatus.ACTIVE, models.AppealStatus.CLOSED},
+        )
+
+
 class FieldReportTest(TestCase):
 
     fixtures = ["DisasterTypes"]
@@ -178,3 +244,208 @@ class EventSeverityLevelHistoryTest(TestCase):
 
         history = models.EventSeverityLevelHistory.objects.filter(event=self.event)
         self.assertEqual(history.count(), 0)
+
+
+class EventMonthIndexTest(TestCase):
+
+    fixtures = ["DisasterTypes"]
+
+    def setUp(self):
+        self.dtype = models.DisasterType.objects.get(pk=1)
+        self.country1 = countryFactory.CountryFactory(name="Country 1", iso="C1")
+        self.country2 = countryFactory.CountryFactory(name="Country 2", iso="C2")
+        self.country_without_iso = countryFactory.CountryFactory(name="Country 3", iso=None)
+
+    def get_index(self, event):
+        return models.EventMonthIndex.objects.get(created_month=event.created_at.strftime("%Y-%m"))
+
+    def test_index_created_on_event_save(self):
+        event = eventFactory.EventFactory.create(dtype=self.dtype)
+        index = self.get_index(event)
+        self.assertIn(event.id, index.event_ids)
+        self.assertEqual(index.country_event_ids, {})
+
+    def test_index_follows_event_countries(self):
+        event = eventFactory.EventFactory.create(dtype=self.dtype)
+        event.countries.set([self.country1, self.country_without_iso])
+        self.assertEqual(self.get_index(event).country_event_ids, {"Country 1": [event.id]})
+
+        event.countries.add(self.country2)
+        self.assertEqual(self.get_index(event).country_event_ids, {"Country 1": [event.id], "Country 2": [event.id]})
+
+        # From the country side
+        self.country1.event_set.remove(event)
+        self.assertEqual(self.get_index(event).country_event_ids, {"Country 2": [event.id]})
+        self.country2.event_set.clear()
+        self.assertEqual(self.get_index(event).country_event_ids, {})
+
+        event.countries.add(self.country1)
+        event.countries.clear()
+        self.assertEqual(self.get_index(event).country_event_ids, {})
+
+    def test_index_follows_country_rename(self):
+        event = eventFactory.EventFactory.create(dtype=self.dtype, countries=[self.country1])
+        self.country1.name = "Country 1 renamed"
+        self.country1.save()
+        self.assertEqual(self.get_index(event).country_event_ids, {"Country 1 renamed": [event.id]})
+
+    def test_index_follows_event_delete(self):
+        event1 = eventFactory.EventFactory.create(dtype=self.dtype, countries=[self.country1])
+        event2 = eventFactory.EventFactory.create(dtype=self.dtype, countries=[self.country1])
+        event1_id = event1.id
+        event1.delete()
+        index = self.get_index(event2)
+        self.assertNotIn(event1_id, index.event_ids)
+        self.assertEqual(index.country_event_ids, {"Country 1": [event2.id]})
+
+    def test_index_not_refreshed_without_change(self):
+        event = eventFactory.EventFactory.create(dtype=self.dtype, countries=[self.country1])
+        with patch.object(models.EventMonthIndex, "refresh_for_events") as refresh_for_events:
+            event.name = "Renamed"
+            event.save()
+            event.countries.add(self.country1)
+            refresh_for_events.assert_not_called()
+            event.countries.add(self.country2)
+            refresh_for_events.assert_called_once_with([event.id])
+
+    def test_refresh_for_events(self):
+        event = eventFactory.EventFactory.create(dtype=self.dtype, countries=[self.country1])
+        models.EventMonthIndex.objects.all().delete()
+
+        models.EventMonthIndex.refresh_for_events([event.id])
+        index = self.get_index(event)
+        self.assertEqual(index.event_ids, [event.id])
+        self.assertEqual(index.country_event_ids, {"Country 1": [event.id]})
+
+
+class SearchIndexOutboxTest(TestCase):
+
+    fixtures = ["DisasterTypes"]
+
+    def setUp(self):
+        self.dtype = models.DisasterType.objects.get(pk=1)
+        self.country = countryFactory.CountryFactory(name="Country 1", iso="C1")
+
+    def get_pending_changes(self):
+        return set(models.SearchIndexOutbox.objects.filter(processed_at__isnull=True).values_list("model", "object_id", "action"))
+
+    def test_changes_added_by_signals(self):
+        event = eventFactory.EventFactory.create(dtype=self.dtype)
+        appeal = eventFactory.AppealFactory.create(event=event, dtype=self.dtype, country=self.country)
+        index, delete = models.SearchIndexOutbox.Action.INDEX, models.SearchIndexOutbox.Action.DELETE
+        self.assertIn(("event", event.id, index), self.get_pending_changes())
+        self.assertIn(("appeal", appeal.id, index), self.get_pending_changes())
+
+        models.SearchIndexOutbox.objects.all().delete()
+        self.country.event_set.add(event)
+        self.assertEqual(self.get_pending_changes(), {("event", event.id, index)})
+
+        models.SearchIndexOutbox.objects.all().delete()
+        appeal_id = appeal.id
+        appeal.delete()
+        self.assertIn(("appeal", appeal_id, delete), self.get_pending_changes())
+
+    @patch("utils.elasticsearch.chunked_bulk")
+    def test_index_search_index_outbox(self, chunked_bulk_mock):
+        sent_actions = []
+
+        def _chunked_bulk(actions):
+            actions = list(actions)
+            sent_actions.extend(actions)
+            return len(actions), []
+
+        chunked_bulk_mock.side_effect = _chunked_bulk
+        event = eventFactory.EventFactory.create(dtype=self.dtype)
+        child_event = eventFactory.EventFactory.create(dtype=self.dtype, parent_event=event)
+        deleted_event = eventFactory.EventFactory.create(dtype=self.dtype)
+        deleted_event_id = deleted_event.id
+        deleted_event.delete()
+
+        processed_count = index_search_index_outbox(batch_size=2)
+        self.assertEqual(processed_count, models.SearchIndexOutbox.objects.count())
+        self.assertEqual(self.get_pending_changes(), set())
+        self.assertEqual(
+            {(action["_op_type"], action["_id"]) for action in sent_actions},
+            {
+                ("index", event.es_id()),
+                ("delete", child_event.es_id()),
+                ("delete", f"event-{deleted_event_id}"),
+            },
+        )
+        # Nothing left to process
+        self.assertEqual(index_search_index_outbox(), 0)
+
+    @patch("utils.elasticsearch.chunked_bulk")
+    def test_index_search_index_outbox_failures(self, chunked_bulk_mock):
+        event = eventFactory.EventFactory.create(dtype=self.dtype)
+        failed_event = eventFactory.EventFactory.create(dtype=self.dtype)
+        failed_changes = models.SearchIndexOutbox.objects.filter(model="event", object_id=failed_event.id)
+        failed_count = failed_changes.count()
+        chunked_bulk_mock.return_value = (1, [{"index": {"_id": failed_event.es_id(), "status": 429}}])
+
+        self.assertEqual(index_search_index_outbox(), models.SearchIndexOutbox.objects.count() - failed_count)
+        self.assertEqual(self.get_pending_changes(), {("event", failed_event.id, models.SearchIndexOutbox.Action.INDEX)})
+        self.assertEqual(set(failed_changes.values_list("attempts", flat=True)), {1})
+        self.assertNotIn(event.id, {object_id for _, object_id, _ in self.get_pending_changes()})
+        # Retried after the delay only
+        self.assertEqual(index_search_index_outbox(), 0)
+        failed_changes.update(next_attempt_at=timezone.now())
+        chunked_bulk_mock.return_value = (1, [])
+        self.assertEqual(index_search_index_outbox(), failed_count)
+        self.assertEqual(self.get_pending_changes(), set())
+
+
+class ExportDedupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="dref-owner")
+        self.dref = DrefFactory.create(created_by=self.user)
+
+    def create_export(self, language="en", requested_by=None, **kwargs):
+        export = models.Export.objects.create(
+            export_id=self.dref.id,
+            export_type=models.Export.ExportType.DREF,
+            url=f"https://go.example.com/dref-applications/{self.dref.id}/export/",
+            language=language,
+            requested_by=requested_by or self.user,
+            **kwargs,
+        )
+        export.source_modified_at = get_export_source_modified_at(export)
+        export.save(update_fields=["source_modified_at"])
+        return export
+
+    def test_reuse_previous_export(self):
+        self.assertFalse(reuse_previous_export(self.create_export()))
+        previous_export = self.create_export(
+            status=models.Export.ExportStatus.COMPLETED,
+            completed_at=timezone.now(),
+            pdf_file="pdf-export/dref.pdf",
+        )
+
+        export = self.create_export()
+        self.assertTrue(reuse_previous_export(export))
+        export.refresh_from_db()
+        self.assertEqual(export.status, models.Export.ExportStatus.COMPLETED)
+        self.assertEqual(export.pdf_file.name, previous_export.pdf_file.name)
+
+        # Other language
+        self.assertFalse(reuse_previous_export(self.create_export(language="fr")))
+
+        # Requested by a user without access to the DREF
+        other_user = User.objects.create(username="other-user")
+        self.assertFalse(reuse_previous_export(self.create_export(requested_by=other_user)))
+
+        # The DREF was modified since
+        self.dref.modified_at = timezone.now()
+        self.dref.save(update_fields=["modified_at"])
+        self.assertFalse(reuse_previous_export(self.create_export()))
+
+    @patch("dref.tasks._translate_related_objects")
+    @patch("dref.tasks.translate_model_fields")
+    def test_translated_document_not_reused(self, *_):
+        self.create_export(
+            status=models.Export.ExportStatus.COMPLETED,
+            completed_at=timezone.now(),
+            pdf_file="pdf-export/dref.pdf",
+        )
+        process_dref_translation("dref.Dref", self.dref.id)
+        self.assertFalse(reuse_previous_export(self.create_export()))
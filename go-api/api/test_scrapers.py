@@ -1,10 +1,12 @@
 import time
+from unittest import mock
 
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.utils.crypto import get_random_string
 
 from api.management.commands.index_and_notify import Command as Notify
+from api.management.commands.ingest_appeals import Command as IngestAppeals
 from notifications.models import (
     Country,
     DisasterType,
@@ -14,7 +16,15 @@ from notifications.models import (
     SubscriptionType,
 )
 
-from .models import Appeal, FieldReport
+from .models import (
+    Appeal,
+    AppealHistory,
+    AppealType,
+    CronJob,
+    CronJobStatus,
+    FieldReport,
+    SearchIndexOutbox,
+)
 
 
 def get_user():
@@ -172,6 +182,29 @@ class FieldReportNotificationTest(TestCase):
         self.assertEqual(len(emails), 2)
         self.assertEqual(emails.sort(), [user1.email, user2.email].sort())
 
+    def test_subscription_index(self):
+        user = get_user()
+        inactive_user = get_user()
+        inactive_user.is_active = False
+        inactive_user.save()
+        for _user in [user, inactive_user]:
+            Subscription.objects.create(
+                user=_user,
+                rtype=RecordType.NEW_EMERGENCIES,
+                stype=SubscriptionType.NEW,
+            )
+
+        notify = Notify()
+        records = FieldReport.objects.filter(created_at__gte=notify.diff_5_minutes())
+        emails = notify.gather_subscribers(records, RecordType.NEW_EMERGENCIES, SubscriptionType.NEW)
+        self.assertEqual(emails, [user.email])
+
+        # The subscriptions are only read once per run
+        subscription_index = notify.get_subscription_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(notify.get_subscription_index(), subscription_index)
+        self.assertEqual(notify.gather_subscribers(records, RecordType.FIELD_REPORT, SubscriptionType.NEW), [user.email])
+
 
 class AppealNotificationTest(TestCase):
     def setUp(self):
@@ -242,3 +275,76 @@ class FilterJustCreatedTest(TestCase):
         filtered = notify.filter_just_created(Appeal.objects.filter(created_at__gte=notify.diff_5_minutes()))
         self.assertEqual(len(filtered), 1)
         self.assertEqual(filtered[0].aid, "test2")
+
+
+def get_appeal_record(code, name="appeal", amount_requested=1000):
+    detail = {
+        "APD_startDate": "2026-01-01T00:00:00",
+        "APD_endDate": "2099-01-01T00:00:00",
+        "APD_modifyTime": "2026-01-02T00:00:00",
+        "APD_TYP_Id": 64,
+        "APD_amountCHF": amount_requested,
+        "APD_noBeneficiaries": 100,
+        "TriggeringAmount": 10,
+        "ContributionAmount": 500,
+    }
+    return {
+        "APP_Id": f"id-{code}",
+        "APP_name": name,
+        "APP_code": code,
+        "APP_status": "Active",
+        "APP_startDate": "2026-01-01T00:00:00",
+        "APP_endDate": "2099-01-01T00:00:00",
+        "APP_modifyTime": "2026-01-02T00:00:00",
+        "ADT_name": "Flood",
+        "GEC_code": "NP",
+        "OSC_name": "Nepal",
+        "OSR_name": "Asia Pacific",
+        "OSS_name": "sector",
+        "Details": [detail],
+    }
+
+
+class IngestAppealsTest(TestCase):
+    def setUp(self):
+        region = Region.objects.create(name=2)
+        self.country = Country.objects.create(name="Nepal", iso="NP", record_type=1, region=region)
+        DisasterType.objects.create(name="Flood", summary="")
+        DisasterType.objects.create(name="Other", summary="")
+
+    def ingest(self, new, modified):
+        with mock.patch.object(IngestAppeals, "get_new_or_modified_appeals", return_value=(new, modified, {})):
+            IngestAppeals().handle(batch_size=2)
+
+    def test_bulk_ingest(self):
+        self.ingest([get_appeal_record(f"MDR{i}") for i in range(3)], [])
+        self.assertEqual(Appeal.objects.filter(country=self.country, region__name=2, dtype__name="Flood").count(), 3)
+        self.assertEqual(AppealHistory.objects.count(), 3)
+        self.assertEqual(SearchIndexOutbox.objects.filter(model="appeal").count(), 3)
+
+        Appeal.objects.filter(code="MDR2").update(atype=AppealType.FBA)
+        SearchIndexOutbox.objects.all().delete()
+        self.ingest(
+            [],
+            [
+                get_appeal_record("MDR0", name="appeal renamed"),
+                get_appeal_record("MDR1"),
+                get_appeal_record("MDR2", amount_requested=2000),
+            ],
+        )
+        self.assertEqual(Appeal.objects.count(), 3)
+        self.assertEqual(Appeal.objects.get(code="MDR0").name, "appeal renamed")
+        appeal = Appeal.objects.get(code="MDR2")
+        self.assertEqual(appeal.amount_requested, 2000)
+        # FBA type is kept
+        self.assertEqual(appeal.atype, AppealType.FBA)
+        # Only the changed appeals are written, a new history version only for the watched fields
+        self.assertEqual(
+            set(SearchIndexOutbox.objects.values_list("object_id", flat=True)),
+            set(Appeal.objects.filter(code__in=["MDR0", "MDR2"]).values_list("id", flat=True)),
+        )
+        self.assertEqual(AppealHistory.objects.filter(appeal=appeal).count(), 2)
+        self.assertEqual(AppealHistory.objects.filter(appeal__code="MDR0").count(), 1)
+
+        cron_job = CronJob.objects.filter(name="ingest_appeals", status=CronJobStatus.SUCCESSFUL).latest("id")
+        self.assertIn("0 new, 2 updated, 1 unchanged, 0 errors", cron_job.message)
@@ -1,11 +1,16 @@
 import re
 import uuid
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 import api.models as models
 from api.factories.event import (
@@ -16,8 +21,31 @@ from api.factories.event import (
     EventLinkFactory,
 )
 from api.factories.field_report import FieldReportFactory
-from api.models import Profile, VisibilityChoices
+from api.key_figures import (
+    get_live_header_figures,
+    get_snapshot_country_figures,
+    get_snapshot_header_figures,
+    get_snapshot_qs,
+    take_current_snapshot,
+    take_daily_snapshot,
+)
+from api.models import MonthlyRollup, Profile, VisibilityChoices
+from api.rollups import (
+    get_country_disaster_months,
+    get_live_country_disaster_months,
+    get_time_series,
+    refresh_rollup,
+    refresh_rollups,
+)
+from api.typeahead import SearchVisibility, TypeaheadIndex
+from api.visibility_class import exclude_ifrc_ns_without_user_countries
+from deployments.factories.emergency_project import EmergencyProjectFactory
+from deployments.factories.personnel import (
+    PersonnelDeploymentFactory,
+    PersonnelFactory,
+)
 from deployments.factories.user import UserFactory
+from deployments.models import Personnel
 from dref.models import DrefFile
 from main.test_case import APITestCase
 
@@ -380,6 +408,59 @@ class EventApiTest(APITestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(len(resp.json()["links"]), 5)
 
+    def _create_event_with_counts(self):
+        event = EventFactory(visibility=VisibilityChoices.PUBLIC)
+        EmergencyProjectFactory.create_batch(2, event=event)
+        now = timezone.now()
+        deployment = PersonnelDeploymentFactory(event_deployed_to=event)
+        PersonnelFactory.create_batch(
+            3,
+            deployment=deployment,
+            type=Personnel.TypeChoices.RR,
+            start_date=now - timedelta(days=10),
+            end_date=now + timedelta(days=10),
+            is_active=True,
+        )
+        # Not active anymore
+        PersonnelFactory(
+            deployment=deployment,
+            type=Personnel.TypeChoices.RR,
+            start_date=now - timedelta(days=10),
+            end_date=now - timedelta(days=5),
+            is_active=True,
+        )
+        return event
+
+    def test_event_counts_query_count(self):
+        event = self._create_event_with_counts()
+
+        # Detail
+        with CaptureQueriesContext(connection) as single_detail_queries:
+            resp = self.client.get(f"/api/v2/event/{event.id}/")
+        self.assert_200(resp)
+        self.assertEqual(resp.json()["response_activity_count"], 2)
+        self.assertEqual(resp.json()["active_deployments"], 3)
+
+        # List
+        with CaptureQueriesContext(connection) as single_list_queries:
+            resp = self.client.get("/api/v2/event/")
+        self.assert_200(resp)
+        self.assertEqual(resp.json()["results"][0]["active_deployments"], 3)
+
+        # Number of queries shouldn't depend on the number of Emergencies
+        for _ in range(4):
+            self._create_event_with_counts()
+        with CaptureQueriesContext(connection) as multiple_list_queries:
+            resp = self.client.get("/api/v2/event/")
+        self.assert_200(resp)
+        self.assertEqual(len(resp.json()["results"]), 5)
+        self.assertEqual(len(single_list_queries), len(multiple_list_queries))
+
+        with CaptureQueriesContext(connection) as multiple_detail_queries:
+            resp = self.client.get(f"/api/v2/event/{event.id}/")
+        self.assert_200(resp)
+        self.assertEqual(len(single_detail_queries), len(multiple_detail_queries))
+
 
 class SituationReportTypeTest(APITestCase):
 
@@ -563,6 +644,50 @@ class VisibilityTest(APITestCase):
 
         self.client.force_authenticate(user=None)
 
+    def _create_ns_visibility_data(self):
+        country1 = models.Country.objects.create(name="country-1")
+        country2 = models.Country.objects.create(name="country-2")
+        other_country = models.Country.objects.create(name="country-3")
+        user = UserFactory(username="ns-user")
+        models.UserCountry.objects.create(user=user, country=country1)
+        user.profile.country = country2
+        user.profile.save()
+        # Linked to both user countries, should be returned once
+        own_event = EventFactory.create(visibility=VisibilityChoices.IFRC_NS, countries=[country1, country2])
+        other_event = EventFactory.create(visibility=VisibilityChoices.IFRC_NS, countries=[other_country])
+        public_event = EventFactory.create(visibility=VisibilityChoices.PUBLIC, countries=[other_country])
+        EventFactory.create(visibility=VisibilityChoices.IFRC, countries=[country1])
+        return user, own_event, other_event, public_event
+
+    def test_event_ifrc_ns_visibility(self):
+        user, own_event, other_event, public_event = self._create_ns_visibility_data()
+        self.authenticate(user)
+
+        response = self.client.get("/api/v2/event/")
+        self.assert_200(response)
+        self.assertEqual(
+            sorted(event["id"] for event in response.json()["results"]),
+            sorted([own_event.id, public_event.id]),
+        )
+        self.assert_200(self.client.get(f"/api/v2/event/{own_event.id}/"))
+        self.assert_404(self.client.get(f"/api/v2/event/{other_event.id}/"))
+
+    def test_event_ifrc_ns_visibility_plan(self):
+        user, *_ = self._create_ns_visibility_data()
+        queryset = exclude_ifrc_ns_without_user_countries(
+            models.Event.objects.exclude(visibility=VisibilityChoices.IFRC),
+            user,
+        )
+        sql = str(queryset.query).upper()
+        self.assertNotIn("UNION", sql)
+        self.assertIn("EXISTS", sql)
+        plan = queryset.explain()
+        # User's countries are resolved beforehand: no UNION (Append) nor anti-join in the plan
+        self.assertNotIn("Append", plan)
+        self.assertNotIn("Anti Join", plan)
+        # No join on the countries (duplicate rows)
+        self.assertEqual(queryset.count(), queryset.distinct().count())
+
 
 # class FieldReportsVisibilityTestCase(APITestCase):
 #     fixtures = ['DisasterTypes',]
@@ -937,6 +1062,206 @@ class AppealTest(APITestCase):
         self.assertEqual(response.data["active_appeals"], 2)
 
 
+class KeyFigureSnapshotTest(APITestCase):
+    fixtures = ["DisasterTypes"]
+
+    def setUp(self):
+        super().setUp()
+        self.region = models.Region.objects.create(name=1)
+        self.country = models.Country.objects.create(name="Nepal", iso3="NPL", region=self.region)
+        other_country = models.Country.objects.create(name="India", iso3="IND", region=models.Region.objects.create(name=2))
+        event = EventFactory.create(countries=[self.country])
+        now = timezone.now()
+        for code, atype, country in [
+            ("dref1", AppealType.DREF, self.country),
+            ("appeal1", AppealType.APPEAL, self.country),
+            ("appeal2", AppealType.INTL, other_country),
+        ]:
+            AppealFactory.create(
+                aid=code,
+                code=code,
+                atype=atype,
+                country=country,
+                event=event if country == self.country else None,
+                num_beneficiaries=1000,
+                amount_requested=20000,
+                amount_funded=10000,
+                start_date=now - timedelta(days=10),
+                end_date=now + timedelta(days=10),
+            )
+
+    def test_current_snapshot(self):
+        self.assertIsNone(get_snapshot_header_figures(get_snapshot_qs()))
+        take_current_snapshot()
+        as_of = models.KeyFigureSnapshot.objects.values_list("as_of", flat=True).first()
+        for filters in [{}, {"region": self.region.id}, {"iso3": "npl"}]:
+            figures = get_snapshot_header_figures(get_snapshot_qs(), **filters)
+            self.assertEqual(figures, get_live_header_figures(as_of, **filters))
+        self.assertEqual(get_snapshot_header_figures(get_snapshot_qs())["active_appeals"], 2)
+        # No snapshot rows for the filters, left to the live figures
+        self.assertIsNone(get_snapshot_header_figures(get_snapshot_qs(), iso3="xxx"))
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(f"/api/v2/country/{self.country.id}/figure/")
+        self.assert_200(response)
+        self.assertEqual(
+            response.data,
+            {
+                "active_drefs": 1,
+                "active_appeals": 1,
+                "amount_requested": 20000,
+                "target_population": 2000,
+                "amount_requested_dref_included": 40000,
+                "amount_funded": 10000,
+                "amount_funded_dref_included": 20000,
+                "emergencies": 2,
+            },
+        )
+
+        # Dropped when new history versions are added
+        appeal = models.Appeal.objects.get(code="appeal1")
+        appeal.amount_requested = 30000
+        appeal.save()
+        self.assertIsNone(get_snapshot_header_figures(get_snapshot_qs()))
+        self.assertIsNone(get_snapshot_country_figures(get_snapshot_qs(), self.country))
+
+    def test_daily_snapshot(self):
+        # The appeal versions are valid from now, so take the snapshot of tomorrow
+        date = timezone.now().date() + timedelta(days=1)
+        self.assertIsNone(get_snapshot_header_figures(get_snapshot_qs(date.isoformat())))
+        take_daily_snapshot(date)
+        as_of = models.KeyFigureSnapshot.objects.filter(is_daily=True).values_list("as_of", flat=True).first()
+        figures = get_snapshot_header_figures(get_snapshot_qs(date.isoformat()))
+        self.assertEqual(figures, get_snapshot_header_figures(get_snapshot_qs(f"{date.isoformat()}T00:00:00Z")))
+        self.assertEqual(figures, get_live_header_figures(as_of))
+        # Not dropped by the changes
+        models.AppealHistory.add_versions(list(models.Appeal.objects.all()), created=True)
+        self.assertIsNotNone(get_snapshot_header_figures(get_snapshot_qs(date.isoformat())))
+        self.assertIsNone(get_snapshot_header_figures(get_snapshot_qs(f"{date.isoformat()}T12:00:00Z")))
+        self.assertIsNone(get_snapshot_qs("2024-02-30"))
+
+
+class MonthlyRollupTest(APITestCase):
+    fixtures = ["DisasterTypes"]
+
+    def setUp(self):
+        super().setUp()
+        self.region = models.Region.objects.create(name=1)
+        self.country = models.Country.objects.create(name="Nepal", iso3="NPL", region=self.region)
+        self.dtype = models.DisasterType.objects.get(pk=1)
+        self.event1 = EventFactory.create(
+            dtype=self.dtype,
+            disaster_start_date=datetime(2024, 1, 10, tzinfo=dt_timezone.utc),
+            countries=[self.country],
+            regions=[self.region],
+        )
+        self.event2 = EventFactory.create(
+            dtype=self.dtype,
+            disaster_start_date=datetime(2024, 1, 20, tzinfo=dt_timezone.utc),
+            countries=[self.country],
+        )
+        for code, event, start_date, amount_requested in [
+            ("appeal1", self.event1, datetime(2024, 1, 15, tzinfo=dt_timezone.utc), 1000),
+            ("appeal2", self.event1, datetime(2024, 2, 15, tzinfo=dt_timezone.utc), 2000),
+            ("appeal3", self.event2, datetime(2025, 3, 15, tzinfo=dt_timezone.utc), 4000),
+        ]:
+            AppealFactory.create(
+                aid=code,
+                code=code,
+                event=event,
+                dtype=self.dtype,
+                atype=AppealType.APPEAL,
+                country=self.country,
+                region=self.region,
+                start_date=start_date,
+                num_beneficiaries=100,
+                amount_requested=amount_requested,
+                amount_funded=500,
+            )
+
+    def test_time_series(self):
+        start_date = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertIsNone(get_time_series(MonthlyRollup.Model.APPEAL, "month", start_date))
+        refresh_rollup(MonthlyRollup.Model.APPEAL)
+        sums = {"requested": "amount_requested"}
+        self.assertEqual(
+            get_time_series(MonthlyRollup.Model.APPEAL, "month", start_date, country=str(self.country.id), sums=sums),
+            [
+                {"timespan": datetime(2024, 1, 1, tzinfo=dt_timezone.utc), "count": 1, "requested": 1000},
+                {"timespan": datetime(2024, 2, 1, tzinfo=dt_timezone.utc), "count": 1, "requested": 2000},
+                {"timespan": datetime(2025, 3, 1, tzinfo=dt_timezone.utc), "count": 1, "requested": 4000},
+            ],
+        )
+        self.assertEqual(
+            get_time_series(MonthlyRollup.Model.APPEAL, "year", start_date, region=str(self.region.id), sums=sums),
+            [
+                {"timespan": datetime(2024, 1, 1, tzinfo=dt_timezone.utc), "count": 2, "requested": 3000},
+                {"timespan": datetime(2025, 1, 1, tzinfo=dt_timezone.utc), "count": 1, "requested": 4000},
+            ],
+        )
+        self.assertEqual(
+            get_time_series(MonthlyRollup.Model.APPEAL, "year", start_date, filters={"atype": str(AppealType.DREF)}),
+            [],
+        )
+        # Not covered by the rollups, left to the live query
+        self.assertIsNone(get_time_series(MonthlyRollup.Model.APPEAL, "month", datetime(2024, 1, 2, tzinfo=dt_timezone.utc)))
+        self.assertIsNone(get_time_series(MonthlyRollup.Model.APPEAL, "month", start_date, filters={"status": "0"}))
+        self.assertIsNone(get_time_series(MonthlyRollup.Model.APPEAL, "month", start_date, sums={"x": "triggering_amount"}))
+
+    def test_refresh(self):
+        # Not built, not refreshed
+        refresh_rollups([(MonthlyRollup.Model.APPEAL, date(2024, 1, 1))])
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+        refresh_rollup(MonthlyRollup.Model.APPEAL)
+        refresh_rollup(MonthlyRollup.Model.EVENT)
+        appeal = models.Appeal.objects.get(code="appeal1")
+        appeal.start_date = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            appeal.save()
+        start_date = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(
+            [
+                (figures["timespan"].month, figures["count"])
+                for figures in get_time_series(MonthlyRollup.Model.APPEAL, "month", start_date)
+            ],
+            [(2, 2), (3, 1)],
+        )
+        self.assertEqual(
+            [
+                (figures["timespan"].month, figures["count"])
+                # The factories also create parent emergencies at random dates
+                for figures in get_time_series(MonthlyRollup.Model.EVENT, "month", start_date, country=self.country.id)
+            ],
+            [(1, 2)],
+        )
+
+    def test_country_disaster_months(self):
+        start_date = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        end_date = datetime(2025, 1, 1, tzinfo=dt_timezone.utc) - timedelta(microseconds=1)
+        self.assertIsNone(get_country_disaster_months(self.country, start_date, end_date))
+        refresh_rollup(MonthlyRollup.Model.EVENT)
+        self.assertEqual(
+            get_country_disaster_months(self.country, start_date, end_date, dtype=self.dtype.id),
+            [
+                {
+                    "date": datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+                    # Average of the appeals' beneficiaries per emergency, without field reports
+                    "targeted_population": 200,
+                    "disaster_name": self.dtype.name,
+                    "disaster_id": self.dtype.id,
+                    "amount_requested": 7000,
+                    "amount_funded": 1500,
+                }
+            ],
+        )
+        # Same figures when the dates are not covered by the rollups
+        self.assertEqual(
+            get_live_country_disaster_months(self.country, start_date, end_date, dtype=self.dtype.id),
+            get_country_disaster_months(self.country, start_date, end_date, dtype=self.dtype.id),
+        )
+
+
 class RegionSnippetVisibilityTest(APITestCase):
     def setUp(self):
         super().setUp()
@@ -1027,3 +1352,50 @@ class RegionSnippetVisibilityTest(APITestCase):
                 ]
             ),
         )
+
+
+class SearchTypeaheadTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.region = models.Region.objects.create(name=2, label="Asia Pacific")
+        self.country = models.Country.objects.create(name="South Sudan", iso3="SSD", region=self.region)
+        models.Country.objects.create(name="Sudland", iso3="SDL", region=self.region, in_search=False)
+        self.public_event = EventFactory.create(name="Sudan Floods", visibility=VisibilityChoices.PUBLIC)
+        self.membership_event = EventFactory.create(name="Sudan Cholera", visibility=VisibilityChoices.MEMBERSHIP)
+        self.ifrc_event = EventFactory.create(name="Sudan Complex Emergency", visibility=VisibilityChoices.IFRC)
+        self.appeal = AppealFactory.create(
+            name="Súdán Appeal", code="MDRSD001", event=self.public_event, country=self.country, region=self.region
+        )
+        self.index = TypeaheadIndex.build()
+
+    def lookup(self, phrase, visibility, **kwargs):
+        return [(item["type"], item["id"]) for item in self.index.lookup(phrase, visibility, **kwargs)]
+
+    def test_lookup(self):
+        # Word starts and codes are matched, accents and case are ignored
+        self.assertEqual(
+            self.lookup("SUD", SearchVisibility.PUBLIC),
+            [
+                ("country", self.country.id),
+                ("event", self.public_event.id),
+                ("appeal", self.appeal.id),
+            ],
+        )
+        self.assertEqual(self.lookup("asia", SearchVisibility.PUBLIC), [("region", self.region.id)])
+        self.assertEqual(self.lookup("mdrsd", SearchVisibility.PUBLIC), [("appeal", self.appeal.id)])
+        self.assertEqual(self.lookup("sudan floods", SearchVisibility.PUBLIC), [("event", self.public_event.id)])
+        self.assertEqual(self.lookup("sudan floodsx", SearchVisibility.PUBLIC), [])
+        self.assertEqual(self.lookup("sud", SearchVisibility.PUBLIC, limit=1), [("country", self.country.id)])
+
+    def test_lookup_visibility(self):
+        event_ids = {
+            SearchVisibility.PUBLIC: {self.public_event.id},
+            SearchVisibility.AUTHENTICATED: {self.public_event.id, self.membership_event.id},
+            SearchVisibility.IFRC: {self.public_event.id, self.membership_event.id, self.ifrc_event.id},
+        }
+        for visibility, expected_event_ids in event_ids.items():
+            with self.subTest(visibility=visibility):
+                self.assertEqual(
+                    {_id for _type, _id in self.lookup("sudan", visibility) if _type == "event"},
+                    expected_event_ids,
+                )
@@ -0,0 +1,216 @@
+import threading
+import time
+import unicodedata
+from enum import IntEnum
+
+from django.db import connections
+from django.db.models import F
+
+from api.logger import logger
+from api.models import Appeal, Country, Event, Region, VisibilityChoices
+from api.utils import is_user_ifrc
+from middlewares.cache import get_cache_tags_version, invalidate_cache_tags
+
+# Bumped when the search index is updated, each process then rebuilds its typeahead index on the next lookup
+TYPEAHEAD_CACHE_TAGS = ["search-typeahead"]
+# Max results per lookup
+TYPEAHEAD_LIMIT = 10
+# Longer phrases are answered by filtering the entries of the deepest node
+TYPEAHEAD_MAX_DEPTH = 10
+# Min seconds between two rebuilds of the typeahead index of a process (the search index is updated on every ingest)
+TYPEAHEAD_REBUILD_INTERVAL = 60
+
+
+class SearchVisibility(IntEnum):
+    PUBLIC = 0
+    AUTHENTICATED = 1
+    IFRC = 2
+
+
+def get_user_search_visibility(user):
+    if not user.is_authenticated:
+        return SearchVisibility.PUBLIC
+    if is_user_ifrc(user):
+        return SearchVisibility.IFRC
+    return SearchVisibility.AUTHENTICATED
+
+
+def get_event_search_visibility(visibility):
+    """Same rules as HayStackSearch: Public for everyone, IFRC Only for IFRC users, the rest for authenticated users"""
+    if visibility is None or visibility == VisibilityChoices.PUBLIC:
+        return SearchVisibility.PUBLIC
+    if visibility == VisibilityChoices.IFRC:
+        return SearchVisibility.IFRC
+    return SearchVisibility.AUTHENTICATED
+
+
+def normalize_typeahead_text(text):
+    """Case and accent insensitive text with single spaces"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def get_typeahead_entries():
+    """
+    Yields (data, search visibility, searchable texts) in priority order:
+    regions, countries, then the latest emergencies and appeals first.
+    Same records as the page index (see index_elasticsearch)
+    """
+    for region in Region.objects.order_by("name"):
+        name = region.label or region.get_name_display()
+        yield {"type": "region", "id": region.id, "name": name}, SearchVisibility.PUBLIC, [name]
+
+    for country_id, name, iso3 in Country.objects.filter(in_search=True).order_by("name").values_list("id", "name", "iso3"):
+        yield (
+            {"type": "country", "id": country_id, "name": name, "iso3": iso3},
+            SearchVisibility.PUBLIC,
+            [name, iso3],
+        )
+
+    events_qs = Event.objects.filter(parent_event__isnull=True).order_by(
+        F("disaster_start_date").desc(nulls_last=True),
+        "-id",
+    )
+    for event_id, name, visibility in events_qs.values_list("id", "name", "visibility"):
+        yield (
+            {"type": "event", "id": event_id, "name": name, "event_id": event_id},
+            get_event_search_visibility(visibility),
+            [name],
+        )
+
+    appeals_qs = Appeal.objects.order_by(F("start_date").desc(nulls_last=True), "-id")
+    for appeal_id, name, code, event_id, visibility in appeals_qs.values_list(
+        "id", "name", "code", "event_id", "event__visibility"
+    ):
+        yield (
+            {"type": "appeal", "id": appeal_id, "name": name, "code": code, "event_id": event_id},
+            get_event_search_visibility(visibility),
+            [name, code],
+        )
+
+
+class TypeaheadNode:
+    __slots__ = ("children", "entries", "counts")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []
+        # Number of entries visible to each SearchVisibility
+        self.counts = [0] * len(SearchVisibility)
+
+
+class TypeaheadIndex:
+    """
+    In-memory prefix trie of the region, country, emergency and appeal names.
+    Every word start is a key, so "sud" also matches "South Sudan".
+    Entries are added in priority order and the nodes only keep the first TYPEAHEAD_LIMIT entries
+    visible to each SearchVisibility, except the deepest nodes which keep all of them.
+    """
+
+    def __init__(self, entries=(), version=None):
+        self.version = version
+        self.root = TypeaheadNode()
+        self.entries = []
+        self.visibilities = []
+        self.texts = []
+        for data, visibility, texts in entries:
+            self.add(data, visibility, texts)
+
+    @classmethod
+    def build(cls, version=None):
+        return cls(get_typeahead_entries(), version=version)
+
+    def add(self, data, visibility, texts):
+        entry_index = len(self.entries)
+        self.entries.append(data)
+        self.visibilities.append(visibility)
+        texts = [text for text in map(normalize_typeahead_text, texts) if text]
+        self.texts.append(texts)
+
+        keys = set()
+        for text in texts:
+            words = text.split(" ")
+            keys.update(" ".join(words[i:])[:TYPEAHEAD_MAX_DEPTH] for i in range(len(words)))
+
+        for key in keys:
+            node = self.root
+            for depth, char in enumerate(key, start=1):
+                node = node.children.setdefault(char, TypeaheadNode())
+                if node.entries and node.entries[-1] == entry_index:
+                    # Already added through another key
+                    continue
+                if depth < TYPEAHEAD_MAX_DEPTH and all(
+                    node.counts[v] >= TYPEAHEAD_LIMIT for v in range(visibility, len(SearchVisibility))
+                ):
+                    continue
+                node.entries.append(entry_index)
+                for v in range(visibility, len(SearchVisibility)):
+                    node.counts[v] += 1
+
+    def matches(self, entry_index, phrase):
+        return any(text.startswith(phrase) or f" {phrase}" in text for text in self.texts[entry_index])
+
+    def lookup(self, phrase, visibility, limit=TYPEAHEAD_LIMIT):
+        phrase = normalize_typeahead_text(phrase)
+        if not phrase:
+            return []
+        node = self.root
+        for char in phrase[:TYPEAHEAD_MAX_DEPTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        results = []
+        for entry_index in node.entries:
+            if self.visibilities[entry_index] > visibility:
+                continue
+            if len(phrase) > TYPEAHEAD_MAX_DEPTH and not self.matches(entry_index, phrase):
+                continue
+            results.append(self.entries[entry_index])
+            if len(results) >= limit:
+                break
+        return results
+
+
+_typeahead_index = None
+_typeahead_index_lock = threading.Lock()
+_typeahead_rebuild_thread = None
+_typeahead_rebuild_started_at = 0
+
+
+def _rebuild_typeahead_index(version):
+    global _typeahead_index
+    try:
+        _typeahead_index = TypeaheadIndex.build(version=version)
+    except Exception:
+        logger.error("Failed to rebuild the typeahead index", exc_info=True)
+    finally:
+        # Connections opened by this thread
+        connections.close_all()
+
+
+def get_typeahead_index():
+    """
+    Returns the typeahead index of this process.
+    Only the first index is built within the request, when the search index is updated meanwhile
+    the current index is still used while a new one is built in the background (at most once per TYPEAHEAD_REBUILD_INTERVAL).
+    """
+    global _typeahead_index, _typeahead_rebuild_thread, _typeahead_rebuild_started_at
+    version = get_cache_tags_version(TYPEAHEAD_CACHE_TAGS)
+    if _typeahead_index is None:
+        with _typeahead_index_lock:
+            if _typeahead_index is None:
+                _typeahead_index = TypeaheadIndex.build(version=version)
+        return _typeahead_index
+    if _typeahead_index.version != version and time.monotonic() - _typeahead_rebuild_started_at >= TYPEAHEAD_REBUILD_INTERVAL:
+        with _typeahead_index_lock:
+            is_rebuilding = _typeahead_rebuild_thread is not None and _typeahead_rebuild_thread.is_alive()
+            if not is_rebuilding and time.monotonic() - _typeahead_rebuild_started_at >= TYPEAHEAD_REBUILD_INTERVAL:
+                _typeahead_rebuild_started_at = time.monotonic()
+                _typeahead_rebuild_thread = threading.Thread(target=_rebuild_typeahead_index, args=(version,), daemon=True)
+                _typeahead_rebuild_thread.start()
+    return _typeahead_index
+
+
+def invalidate_typeahead_index():
+    invalidate_cache_tags(TYPEAHEAD_CACHE_TAGS)
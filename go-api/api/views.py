@@ -1,7 +1,9 @@
 import base64
+import hashlib
 import json
 import os
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from urllib.parse import urlparse
 
@@ -10,8 +12,8 @@ from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
 from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.db.models import Case, Count, F, Q, Sum, When
-from django.db.models.fields import IntegerField
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
 from django.db.models.functions import TruncMonth, TruncYear
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect
@@ -47,6 +49,8 @@ from api.serializers import (
     ProjectSecondarySectorsSerializer,
     SearchInputSerializer,
     SearchSerializer,
+    SearchTypeaheadInputSerializer,
+    SearchTypeaheadSerializer,
 )
 from deployments.models import (
     ERU,
@@ -66,16 +70,22 @@ from registrations.models import Pending, Recovery
 
 from .esconnection import ES_CLIENT
 from .indexes import ES_PAGE_NAME
+from .key_figures import (
+    get_live_header_figures,
+    get_snapshot_header_figures,
+    get_snapshot_qs,
+)
 from .logger import logger
 from .models import (
     Appeal,
-    AppealHistory,
-    AppealType,
     CronJob,
     Event,
     FieldReport,
+    MonthlyRollup,
     Snippet,
 )
+from .rollups import get_time_series
+from .typeahead import get_typeahead_index, get_user_search_visibility
 from .utils import is_user_ifrc
 
 
@@ -154,16 +164,47 @@ class EsPageSearch(APIView):
         return JsonResponse(results["hits"])
 
 
+# Shared pool to run the global search queries concurrently,
+# the worker threads (and their haystack/elasticsearch connections) are reused between requests
+HAYSTACK_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=10, thread_name_prefix="haystack-search")
+
+
 @extend_schema_view(get=extend_schema(parameters=[SearchInputSerializer], responses=SearchSerializer))
 class HayStackSearch(APIView):
+    # Max results per type
+    RESULT_LIMIT = 50
+    # The search bar requests this on every keystroke, cache the results shortly for each visibility
+    CACHE_KEY = "haystack-search:{}:{}"
+    CACHE_TIMEOUT = 60
+
+    @classmethod
+    def evaluate_searches(cls, searches):
+        """
+        Evaluate the SearchQuerySets concurrently, each limited to RESULT_LIMIT results.
+        Returns the results (list) by the key of the given dict.
+        """
+        futures = {
+            key: HAYSTACK_SEARCH_EXECUTOR.submit(lambda sqs: list(sqs[: cls.RESULT_LIMIT]), sqs) for key, sqs in searches.items()
+        }
+        return {key: future.result() for key, future in futures.items()}
 
     def get(self, request):
         phrase = request.GET.get("keyword", None)
         if phrase is None:
             return bad_request("Must include a `keyword`")
 
+        phrase = " ".join(phrase.split()).lower()
+        if not phrase:
+            return bad_request("Must include a `keyword`")
+        cache_key = self.CACHE_KEY.format(
+            get_user_search_visibility(request.user).value,
+            hashlib.md5(phrase.encode("utf-8")).hexdigest(),
+        )
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
+
         if phrase:
-            phrase = phrase.lower()
             if self.request.user.is_authenticated:
                 if is_user_ifrc(self.request.user):
                     project_response = (
@@ -352,6 +393,20 @@ class HayStackSearch(APIView):
                 .filter(SQ(name__contains=phrase) | SQ(iso3__contains=phrase))
                 .order_by("-_score")
             )
+            search_results = self.evaluate_searches(
+                {
+                    "regions": region_response,
+                    "district_province_response": district_province_response,
+                    "countries": country_response,
+                    "emergencies": emergency_response,
+                    "surge_alerts": surge_alert_response.order_by("-start_date"),
+                    "projects": project_response.order_by("-start_date"),
+                    "surge_deployments": surge_deployments,
+                    "rapid_response_deployments": rapid_response_deployments,
+                    "flash_updates": flash_update_response,
+                    "field_reports": fieldreport_response.order_by("-created_at"),
+                }
+            )
             # dref_response = SearchQuerySet().models(Dref).filter(
             #     SQ(name__contains=phrase) | SQ(code__contains=phrase) | SQ(iso3__contains=phrase)
             # ).order_by('-_score')
@@ -408,7 +463,7 @@ class HayStackSearch(APIView):
                     "type": "Flash Update",
                     "score": data.score,
                 }
-                for data in flash_update_response
+                for data in search_results["flash_updates"]
             ]
             field_report.extend(flash_update)
             field_reports_data = [
@@ -419,12 +474,12 @@ class HayStackSearch(APIView):
                     "type": "Field Report",
                     "score": data.score,
                 }
-                for data in fieldreport_response.order_by("-created_at")
+                for data in search_results["field_reports"]
             ]
             field_report.extend(field_reports_data)
         result = {
             "regions": [
-                {"id": int(data.id.split(".")[-1]), "name": data.name, "score": data.score} for data in region_response[:50]
+                {"id": int(data.id.split(".")[-1]), "name": data.name, "score": data.score} for data in search_results["regions"]
             ],
             "district_province_response": [
                 {
@@ -434,7 +489,7 @@ class HayStackSearch(APIView):
                     "country": data.country_name,
                     "country_id": data.country_id,
                 }
-                for data in district_province_response[:50]
+                for data in search_results["district_province_response"]
             ],
             "countries": [
                 {
@@ -444,7 +499,7 @@ class HayStackSearch(APIView):
                     "iso3": data.iso3,
                     "score": data.score,
                 }
-                for data in country_response[:50]
+                for data in search_results["countries"]
             ],
             "emergencies": [
                 {
@@ -460,7 +515,7 @@ class HayStackSearch(APIView):
                     "appeals": [{"id": id, "atype": atype} for id, atype in zip(data.appeals_id or [], data.appeals_type or [])],
                     "severity_level": data.severity_level,
                 }
-                for data in emergency_response[:50]
+                for data in search_results["emergencies"]
             ],
             "surge_alerts": [
                 {
@@ -478,7 +533,7 @@ class HayStackSearch(APIView):
                     "surge_type": data.surge_type,
                     "country_id": data.country_id,
                 }
-                for data in surge_alert_response.order_by("-start_date")[:50]
+                for data in search_results["surge_alerts"]
             ],
             "projects": [
                 {
@@ -496,7 +551,7 @@ class HayStackSearch(APIView):
                     "event_id": data.event_id,
                     "national_society_id": data.reporting_ns_id,
                 }
-                for data in project_response.order_by("-start_date")[:50]
+                for data in search_results["projects"]
             ],
             "surge_deployments": [
                 {
@@ -512,7 +567,7 @@ class HayStackSearch(APIView):
                     "deployed_country_id": data.country_id,
                     "deployed_country_name": data.country_name,
                 }
-                for data in surge_deployments[:50]
+                for data in search_results["surge_deployments"]
             ],
             "reports": sorted(field_report, key=lambda d: d["score"], reverse=True)[:50],
             # "emergency_planning": sorted(appeals_list, key=lambda d: d["score"], reverse=True)[:50],
@@ -532,10 +587,32 @@ class HayStackSearch(APIView):
                     "event_id": data.event_id,
                     "score": data.score,
                 }
-                for data in rapid_response_deployments[:50]
+                for data in search_results["rapid_response_deployments"]
             ],
         }
-        return Response(SearchSerializer(result).data)
+        data = SearchSerializer(result).data
+        cache.set(cache_key, data, self.CACHE_TIMEOUT)
+        return Response(data)
+
+
+@extend_schema_view(
+    get=extend_schema(parameters=[SearchTypeaheadInputSerializer], responses=SearchTypeaheadSerializer(many=True))
+)
+class SearchTypeahead(APIView):
+    """
+    Region, country, emergency and appeal name suggestions for the search bar.
+    Served from the in-memory typeahead index, without Elasticsearch requests.
+    """
+
+    def get(self, request):
+        serializer = SearchTypeaheadInputSerializer(data=request.GET)
+        serializer.is_valid(raise_exception=True)
+        results = get_typeahead_index().lookup(
+            serializer.validated_data["keyword"],
+            get_user_search_visibility(request.user),
+            limit=serializer.validated_data["limit"],
+        )
+        return Response(SearchTypeaheadSerializer(results, many=True).data)
 
 
 class Brief(APIView):
@@ -622,65 +699,19 @@ class AggregateHeaderFigures(APIView):
     """
 
     def get(self, request):
-        iso3 = request.GET.get("iso3", None)
-        country = request.GET.get("country", None)
-        region = request.GET.get("region", None)
-
-        now = timezone.now()
-        date = request.GET.get("date", now)
-        appeal_conditions = (
-            (Q(atype=AppealType.APPEAL) | Q(atype=AppealType.INTL)) & Q(end_date__gte=date) & Q(start_date__lte=date)
-        )
-
-        all_appealhistory = AppealHistory.objects.select_related("appeal").filter(
-            valid_from__lt=date, valid_to__gt=date, appeal__code__isnull=False
-        )
+        filters = {
+            "iso3": request.GET.get("iso3", None),
+            "country": request.GET.get("country", None),
+            "region": request.GET.get("region", None),
+        }
+        date = request.GET.get("date", None)
 
-        if iso3:
-            all_appealhistory = all_appealhistory.filter(country__iso3__iexact=iso3)
-        if country:
-            all_appealhistory = all_appealhistory.filter(country__id=country)
-        if region:
-            all_appealhistory = all_appealhistory.filter(country__region__id=region)
-        appeals_aggregated = all_appealhistory.annotate(
-            # Active Appeals with DREF type
-            actd=Count(
-                Case(
-                    When(Q(atype=AppealType.DREF) & Q(end_date__gte=date) & Q(start_date__lte=date), then=1),
-                    output_field=IntegerField(),
-                )
-            ),
-            # Active Appeals with type Emergency Appeal or International Appeal
-            acta=Count(Case(When(appeal_conditions, then=1), output_field=IntegerField())),
-            # Total Appeals count which are not DREF
-            tota=Count(Case(When(Q(atype=AppealType.APPEAL) | Q(atype=AppealType.INTL), then=1), output_field=IntegerField())),
-            # Active Appeals' target population
-            tarp=Sum(
-                Case(
-                    When(Q(end_date__gte=date) & Q(start_date__lte=date), then=F("num_beneficiaries")),
-                    output_field=IntegerField(),
-                )
-            ),
-            # Active Appeals' requested amount, which are not DREF
-            amor=Case(When(appeal_conditions, then=F("amount_requested")), output_field=IntegerField()),
-            amordref=Case(
-                When(Q(end_date__gte=date) & Q(start_date__lte=date), then=F("amount_requested")), output_field=IntegerField()
-            ),
-            # Active Appeals' funded amount, which are not DREF
-            amof=Case(When(appeal_conditions, then=F("amount_funded")), output_field=IntegerField()),
-            amofdref=Case(
-                When(Q(end_date__gte=date) & Q(start_date__lte=date), then=F("amount_funded")), output_field=IntegerField()
-            ),
-        ).aggregate(
-            active_drefs=Sum("actd"),
-            active_appeals=Sum("acta"),
-            total_appeals=Sum("tota"),
-            target_population=Sum("tarp"),
-            amount_requested=Sum("amor"),
-            amount_requested_dref_included=Sum("amordref"),
-            amount_funded=Sum("amof"),
-            amount_funded_dref_included=Sum("amofdref"),
-        )
+        # Served from the key figure snapshot of the date when there is one, otherwise computed from AppealHistory
+        appeals_aggregated = None
+        if (snapshot_qs := get_snapshot_qs(date)) is not None:
+            appeals_aggregated = get_snapshot_header_figures(snapshot_qs, **filters)
+        if appeals_aggregated is None:
+            appeals_aggregated = get_live_header_figures(date or timezone.now(), **filters)
 
         return Response(AggregateHeaderFiguresSerializer(appeals_aggregated).data)
 
@@ -792,17 +823,36 @@ class AggregateByTime(APIView):
 
         # allow custom filter attributes
         # TODO this should check if the model definition contains this field
+        custom_filters = {}
         for key, value in request.GET.items():
             if key[0:7] == "filter_":
-                filter_obj[key[7:]] = value
+                custom_filters[key[7:]] = value
+        filter_obj.update(custom_filters)
 
         # allow arbitrary SUM functions
-        annotation_funcs = {"count": Count("id")}
-        output_values = ["timespan", "count"]
+        sums = {}
         for key, value in request.GET.items():
             if key[0:4] == "sum_":
-                annotation_funcs[key[4:]] = Sum(value)
-                output_values.append(key[4:])
+                sums[key[4:]] = value
+
+        # Served from the monthly rollups when the filters and sums are covered
+        time_series = get_time_series(
+            MonthlyRollup.Model(mtype),
+            unit,
+            start_date,
+            country=country,
+            region=region,
+            filters=custom_filters,
+            sums=sums,
+        )
+        if time_series is not None:
+            return Response(AggregateByTimeSeriesSerializer(time_series, many=True).data)
+
+        annotation_funcs = {"count": Count("id")}
+        output_values = ["timespan", "count"]
+        for name, field in sums.items():
+            annotation_funcs[name] = Sum(field)
+            output_values.append(name)
 
         trunc_method = TruncMonth if unit == "month" else TruncYear
 
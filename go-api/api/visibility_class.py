@@ -1,4 +1,5 @@
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import viewsets
 
 from deployments.models import Project
@@ -6,6 +7,54 @@ from deployments.models import Project
 from .models import Profile, UserCountry, VisibilityCharChoices, VisibilityChoices
 from .utils import is_user_ifrc  # filter_visibility_by_auth (would be better)
 
+USER_COUNTRIES_CACHE_KEY = "user-countries:{}"
+# NOTE: Invalidated on UserCountry/Profile change (api/receivers.py)
+USER_COUNTRIES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_user_countries(user):
+    """Ids of the user's UserCountry countries and the Profile.country id, cached per user"""
+    cache_key = USER_COUNTRIES_CACHE_KEY.format(user.id)
+    user_countries = cache.get(cache_key)
+    if user_countries is None:
+        user_countries = (
+            sorted(set(UserCountry.objects.filter(user=user.id, country__isnull=False).values_list("country", flat=True))),
+            Profile.objects.filter(user=user.id).values_list("country", flat=True).first(),
+        )
+        cache.set(cache_key, user_countries, USER_COUNTRIES_CACHE_TIMEOUT)
+    return user_countries
+
+
+def get_user_country_ids(user):
+    """Ids of the user's countries (UserCountry and Profile.country)"""
+    user_country_ids, profile_country_id = get_user_countries(user)
+    return sorted({*user_country_ids, *([profile_country_id] if profile_country_id else [])})
+
+
+def invalidate_user_country_ids(user_id):
+    cache.delete(USER_COUNTRIES_CACHE_KEY.format(user_id))
+
+
+def exclude_ifrc_ns_without_user_countries(queryset, user):
+    """
+    Exclude the IFRC_NS records which are not linked to any of the user's countries.
+    NOTE: For models with a `countries` many to many field (Event, FieldReport)
+    """
+    country_ids = get_user_country_ids(user)
+    if not country_ids:
+        return queryset.exclude(visibility=VisibilityChoices.IFRC_NS)
+    countries_field = queryset.model._meta.get_field("countries")
+    # Semi-join on the m2m table using the resolved ids (no join on countries, so no duplicate rows)
+    has_user_country = Exists(
+        countries_field.remote_field.through.objects.filter(
+            **{
+                countries_field.m2m_field_name(): OuterRef("pk"),
+                f"{countries_field.m2m_reverse_field_name()}__in": country_ids,
+            }
+        )
+    )
+    return queryset.filter(~Q(visibility=VisibilityChoices.IFRC_NS) | has_user_country)
+
 
 # TODO: This class can be used only with tailored "get_for" method in the relevant model !!!
 class ReadOnlyVisibilityViewsetMixin:
@@ -42,13 +91,9 @@ class ReadOnlyVisibilityViewset(viewsets.ReadOnlyModelViewSet):
                 return self.visibility_model_class.objects.all()
             else:
                 if self.visibility_model_class.__name__ == "FieldReport" or self.visibility_model_class.__name__ == "Event":
-                    return self.visibility_model_class.objects.exclude(visibility=VisibilityChoices.IFRC).exclude(
-                        Q(visibility=VisibilityChoices.IFRC_NS)
-                        & ~Q(
-                            countries__id__in=UserCountry.objects.filter(user=self.request.user.id)
-                            .values_list("country", flat=True)
-                            .union(Profile.objects.filter(user=self.request.user.id).values_list("country", flat=True))
-                        )
+                    return exclude_ifrc_ns_without_user_countries(
+                        self.visibility_model_class.objects.exclude(visibility=VisibilityChoices.IFRC),
+                        self.request.user,
                     )
                 else:
                     return self.visibility_model_class.objects.exclude(visibility=VisibilityChoices.IFRC)
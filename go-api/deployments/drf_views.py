@@ -78,7 +78,7 @@ from .serializers import (
     ProjectSerializer,
     RegionalProjectSerializer,
 )
-from .utils import get_previous_months
+from .stats import DeploymentCounts
 
 
 class ERUOwnerViewset(viewsets.ReadOnlyModelViewSet):
@@ -418,43 +418,22 @@ class AggregateDeployments(APIView):
     @classmethod
     @extend_schema(request=None, responses=AggregateDeploymentsSerializer)
     def get(cls, request):
-        today = timezone.now().date().strftime("%Y-%m-%d")
-        this_year = timezone.now().year
-        deployments_qset = Personnel.objects.filter(is_active=True)
+        deployment_counts = DeploymentCounts(timezone.now().date())
         eru_qset = ERU.objects.all()
         if request.GET.get("event"):
             event_id = request.GET.get("event")
-            deployments_qset = deployments_qset.filter(deployment__event_deployed_to=event_id)
+            personnel_counts = deployment_counts.build(Personnel.objects.filter(deployment__event_deployed_to=event_id))
             eru_qset = eru_qset.filter(event=event_id)
-
-        active_rapid_response_personnel = deployments_qset.filter(
-            type=Personnel.TypeChoices.RR,
-            start_date__date__lte=today,
-            end_date__date__gte=today,
-            is_active=True,
-        ).count()
-
-        rapid_response_deployments_this_year = deployments_qset.filter(
-            is_active=True, start_date__year__lte=this_year, end_date__year__gte=this_year
-        ).count()
-        active_emergency_response_units = eru_qset.filter(
-            deployed_to__isnull=False,
-            start_date__date__lte=today,
-            end_date__date__gte=today,
-        ).count()
-
-        emergency_response_unit_deployed_this_year = eru_qset.filter(
-            deployed_to__isnull=False,
-            start_date__year__lte=this_year,
-            end_date__year__gte=this_year,
-        ).count()
+        else:
+            personnel_counts = deployment_counts.get()
+        eru_counts = deployment_counts.get_eru_counts(eru_qset)
         return Response(
             AggregateDeploymentsSerializer(
                 dict(
-                    active_rapid_response_personnel=active_rapid_response_personnel,
-                    rapid_response_deployments_this_year=rapid_response_deployments_this_year,
-                    active_emergency_response_units=active_emergency_response_units,
-                    emergency_response_unit_deployed_this_year=emergency_response_unit_deployed_this_year,
+                    active_rapid_response_personnel=personnel_counts["active_rapid_response_personnel"],
+                    rapid_response_deployments_this_year=personnel_counts["rapid_response_deployments_this_year"],
+                    active_emergency_response_units=eru_counts["active_emergency_response_units"],
+                    emergency_response_unit_deployed_this_year=eru_counts["emergency_response_unit_deployed_this_year"],
                 )
             ).data
         )
@@ -471,16 +450,8 @@ class DeploymentsByMonth(APIView):
         Returns count of Personnel Deployments
         for last 12 months, aggregated by month.
         """
-        now = datetime.datetime.now()
-        months = get_previous_months(now, 12)
-        deployment_counts = []
-        for month in months:
-            month_string = month[0]
-            first_day = month[1]
-            last_day = month[2]
-            count = Personnel.objects.filter(start_date__date__lte=last_day, end_date__date__gte=first_day).count()
-            deployment_counts.append(dict(date=month_string, count=count))
-        return Response(DeploymentsByMonthSerializer(deployment_counts, many=True).data)
+        deployment_counts = DeploymentCounts(timezone.now().date()).get()
+        return Response(DeploymentsByMonthSerializer(deployment_counts["by_month"], many=True).data)
 
 
 class DeploymentsByNS(APIView):
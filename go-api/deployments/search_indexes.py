@@ -26,7 +26,11 @@ class ProjectIndex(indexes.SearchIndex, indexes.Indexable):
         return [district.name for district in obj.project_districts.all()]
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return (
+            self.get_model()
+            .objects.select_related("event", "reporting_ns", "primary_sector")
+            .prefetch_related("project_districts", "secondary_sectors")
+        )
 
 
 class ERUIndex(indexes.SearchIndex, indexes.Indexable):
@@ -46,7 +50,7 @@ class ERUIndex(indexes.SearchIndex, indexes.Indexable):
         return ERU
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("event", "deployed_to", "eru_owner__national_society_country")
 
 
 class PersonnelIndex(indexes.SearchIndex, indexes.Indexable):
@@ -68,4 +72,4 @@ class PersonnelIndex(indexes.SearchIndex, indexes.Indexable):
         return Personnel
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("country_from", "country_to", "deployment__event_deployed_to")
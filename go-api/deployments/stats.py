@@ -0,0 +1,77 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Personnel
+from .utils import get_previous_months
+
+
+def get_day_start(day):
+    """Start of the day in the current timezone, as used by the `__date` lookups"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def deployed_between(first_day, last_day):
+    """Deployed at some point from first_day to last_day (included), as ranges on the dates themselves"""
+    return Q(start_date__lt=get_day_start(last_day + timedelta(days=1)), end_date__gte=get_day_start(first_day))
+
+
+class DeploymentCounts:
+    """
+    Personnel deployment counts of the surge page on `today`: currently active rapid response,
+    deployed this year and deployed per month over the last 12 months.
+    They are computed with a single query and cached for the day, sync_molnix refreshes them after each run.
+    """
+
+    CACHE_KEY = "deployment-counts:{}"
+    CACHE_TIMEOUT = 60 * 60 * 24
+    NUM_MONTHS = 12
+
+    def __init__(self, today):
+        self.today = today
+        self.months = get_previous_months(today, self.NUM_MONTHS)
+        self.year = (date(today.year, 1, 1), date(today.year, 12, 31))
+        self.cache_key = self.CACHE_KEY.format(today.strftime("%Y-%m-%d"))
+
+    def build(self, personnel_qs=None):
+        if personnel_qs is None:
+            personnel_qs = Personnel.objects.all()
+        is_active = Q(is_active=True)
+        aggregates = {
+            "active_rapid_response_personnel": Count(
+                "pk", filter=is_active & Q(type=Personnel.TypeChoices.RR) & deployed_between(self.today, self.today)
+            ),
+            "rapid_response_deployments_this_year": Count("pk", filter=is_active & deployed_between(*self.year)),
+        }
+        for i, (_, first_day, last_day) in enumerate(self.months):
+            aggregates[f"month_{i}"] = Count("pk", filter=deployed_between(first_day, last_day))
+        # Only the personnel deployed within the counted periods
+        first_day = min(self.months[-1][1], self.year[0])
+        counts = personnel_qs.filter(deployed_between(first_day, self.year[1])).aggregate(**aggregates)
+        return {
+            "active_rapid_response_personnel": counts["active_rapid_response_personnel"],
+            "rapid_response_deployments_this_year": counts["rapid_response_deployments_this_year"],
+            "by_month": [
+                {"date": month_string, "count": counts[f"month_{i}"]} for i, (month_string, _, _) in enumerate(self.months)
+            ],
+        }
+
+    def get(self):
+        counts = cache.get(self.cache_key)
+        if counts is None:
+            counts = self.refresh()
+        return counts
+
+    def refresh(self):
+        counts = self.build()
+        cache.set(self.cache_key, counts, self.CACHE_TIMEOUT)
+        return counts
+
+    def get_eru_counts(self, eru_qs):
+        """ERUs deployed today and this year"""
+        return eru_qs.filter(deployed_to__isnull=False).aggregate(
+            active_emergency_response_units=Count("pk", filter=deployed_between(self.today, self.today)),
+            emergency_response_unit_deployed_this_year=Count("pk", filter=deployed_between(*self.year)),
+        )
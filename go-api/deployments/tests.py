@@ -29,6 +29,7 @@ from deployments.factories.project import (
 from deployments.factories.regional_project import RegionalProjectFactory
 from deployments.factories.user import UserFactory
 from deployments.models import (
+    ERU,
     EmergencyProject,
     EmergencyProjectActivity,
     ERUReadinessType,
@@ -43,6 +44,7 @@ from deployments.models import (
 from main.test_case import APITestCase, SnapshotTestCase
 
 from .factories.personnel import PersonnelDeploymentFactory, PersonnelFactory
+from .stats import DeploymentCounts
 
 
 class TestProjectAPI(SnapshotTestCase):
@@ -736,6 +738,58 @@ class AggregatedERUAndRapidResponseViewSetTestCase(APITestCase):
         patcher.stop()
 
 
+class DeploymentCountsTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = datetime.date(2024, 3, 15)
+        deployment = PersonnelDeploymentFactory()
+        for personnel_type, is_active, start_date, end_date in [
+            (Personnel.TypeChoices.RR, True, datetime.datetime(2024, 3, 1), datetime.datetime(2024, 4, 1)),
+            # Ends today
+            (Personnel.TypeChoices.RR, True, datetime.datetime(2023, 11, 1), datetime.datetime(2024, 3, 15, 23)),
+            (Personnel.TypeChoices.RR, False, datetime.datetime(2024, 1, 1), datetime.datetime(2024, 6, 1)),
+            (Personnel.TypeChoices.FACT, True, datetime.datetime(2024, 2, 10), datetime.datetime(2024, 2, 20)),
+            # Starts later this year
+            (Personnel.TypeChoices.RR, True, datetime.datetime(2024, 9, 1), datetime.datetime(2024, 10, 1)),
+            (Personnel.TypeChoices.RR, True, datetime.datetime(2022, 1, 1), datetime.datetime(2022, 2, 1)),
+        ]:
+            PersonnelFactory(
+                type=personnel_type,
+                is_active=is_active,
+                deployment=deployment,
+                start_date=start_date.replace(tzinfo=datetime.timezone.utc),
+                end_date=end_date.replace(tzinfo=datetime.timezone.utc),
+            )
+        EruFactory(
+            deployed_to=country.CountryFactory(),
+            start_date=datetime.datetime(2023, 12, 1, tzinfo=datetime.timezone.utc),
+            end_date=datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_counts(self):
+        deployment_counts = DeploymentCounts(self.today)
+        with self.assertNumQueries(1):
+            counts = deployment_counts.build()
+        self.assertEqual(counts["active_rapid_response_personnel"], 2)
+        self.assertEqual(counts["rapid_response_deployments_this_year"], 4)
+        # Same as the counts per month with the date lookups
+        self.assertEqual(
+            counts["by_month"],
+            [
+                {
+                    "date": month_string,
+                    "count": Personnel.objects.filter(start_date__date__lte=last_day, end_date__date__gte=first_day).count(),
+                }
+                for month_string, first_day, last_day in deployment_counts.months
+            ],
+        )
+        self.assertEqual(counts["by_month"][0], {"date": "2024-03", "count": 3})
+        self.assertEqual(
+            deployment_counts.get_eru_counts(ERU.objects.all()),
+            {"active_emergency_response_units": 0, "emergency_response_unit_deployed_this_year": 1},
+        )
+
+
 class ExportERUReadinessViewTest(APITestCase):
     def setUp(self):
         super().setUp()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from dref.models import Dref, DrefFinalReport, DrefOperationalUpdate, DrefOperationRow
+from dref.utils import refresh_dref_operation_rows
+
+
+class Command(BaseCommand):
+    help = "Rebuild the flattened DREF operation rows (used by the dref3 endpoint) for all the appeal codes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        appeal_codes = set()
+        for model in (Dref, DrefOperationalUpdate, DrefFinalReport):
+            appeal_codes.update(model.objects.exclude(appeal_code="").values_list("appeal_code", flat=True))
+        appeal_codes.discard(None)
+
+        # Remove rows of appeal codes which don't exist anymore
+        DrefOperationRow.objects.exclude(appeal_code__in=appeal_codes).delete()
+
+        appeal_codes = sorted(appeal_codes)
+        for i in range(0, len(appeal_codes), batch_size):
+            refresh_dref_operation_rows(appeal_codes[i : i + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt DREF operation rows for {len(appeal_codes)} appeal codes."))
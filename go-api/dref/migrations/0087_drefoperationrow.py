@@ -0,0 +1,84 @@
+# Generated by Django 4.2.26 on 2026-10-19 06:10
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0228_eventmonthindex"),
+        ("dref", "0086_proposedactionactivities_activity_ar_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DrefOperationRow",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("appeal_code", models.CharField(db_index=True, max_length=255, verbose_name="appeal code")),
+                (
+                    "stage",
+                    models.IntegerField(
+                        choices=[(0, "Application"), (1, "Operational Update"), (2, "Final Report")], verbose_name="stage"
+                    ),
+                ),
+                ("object_id", models.IntegerField(db_index=True, verbose_name="object id")),
+                ("created_at", models.DateTimeField(verbose_name="created at")),
+                (
+                    "country_iso3",
+                    models.CharField(blank=True, db_index=True, max_length=3, null=True, verbose_name="country iso3"),
+                ),
+                (
+                    "appeal_type",
+                    models.IntegerField(
+                        blank=True,
+                        choices=[(0, "Imminent"), (1, "Assessment"), (2, "Response"), (3, "Loan")],
+                        null=True,
+                        verbose_name="appeal type",
+                    ),
+                ),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[(1, "Draft"), (2, "Finalizing"), (3, "Finalized"), (4, "Approved"), (5, "Failed")],
+                        db_index=True,
+                        verbose_name="status",
+                    ),
+                ),
+                ("start_date", models.DateField(blank=True, null=True, verbose_name="start date")),
+                ("end_date", models.DateField(blank=True, null=True, verbose_name="end date")),
+                ("event_date", models.DateField(blank=True, null=True, verbose_name="event date")),
+                ("data", models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name="data")),
+                (
+                    "approved_data",
+                    models.JSONField(
+                        blank=True,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                        verbose_name="approved data",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="updated at")),
+                (
+                    "region",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="api.region",
+                        verbose_name="region",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "dref operation row",
+                "verbose_name_plural": "dref operation rows",
+                "ordering": ("appeal_code", "stage", "created_at", "object_id"),
+                "unique_together": {("stage", "object_id")},
+                "indexes": [
+                    models.Index(fields=["appeal_code", "stage", "created_at", "object_id"], name="dref_operation_row_order_idx")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.26 on 2026-10-19 12:40
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    def forwards_func(apps, schema_editor):
+        call_command("rebuild_dref_operation_rows")
+
+    dependencies = [
+        ("api", "0233_monthlyrollup"),
+        ("dref", "0087_drefoperationrow"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards_func, reverse_code=migrations.RunPython.noop),
+    ]
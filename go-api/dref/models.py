@@ -5,13 +5,14 @@ import reversion
 from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.templatetags.static import static
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from pdf2image import convert_from_bytes
 
-from api.models import Country, DisasterType, District, FieldReport
+from api.models import Country, DisasterType, District, FieldReport, Region
 from deployments.models import Sector
 from main.fields import SecureFileField
 
@@ -1694,3 +1695,45 @@ class DrefFinalReport(models.Model):
         if status == Dref.Status.APPROVED:
             return queryset.filter(status=Dref.Status.APPROVED)
         return queryset
+
+
+class DrefOperationRow(models.Model):
+    """
+    Flattened Dref3 row (see Dref3Serializer) of a Dref, Operational Update or Final Report.
+    Rows are rebuilt per appeal code using dref.utils.refresh_dref_operation_rows when any of the records are changed.
+    """
+
+    class Stage(models.IntegerChoices):
+        APPLICATION = 0, _("Application")
+        OPERATIONAL_UPDATE = 1, _("Operational Update")
+        FINAL_REPORT = 2, _("Final Report")
+
+    appeal_code = models.CharField(verbose_name=_("appeal code"), max_length=255, db_index=True)
+    stage = models.IntegerField(choices=Stage.choices, verbose_name=_("stage"))
+    object_id = models.IntegerField(verbose_name=_("object id"), db_index=True)
+    created_at = models.DateTimeField(verbose_name=_("created at"))
+    region = models.ForeignKey(Region, verbose_name=_("region"), null=True, blank=True, on_delete=models.SET_NULL)
+    country_iso3 = models.CharField(verbose_name=_("country iso3"), max_length=3, null=True, blank=True, db_index=True)
+    # Dref type of the Application (Operational Update and Final Report use the one of their Dref)
+    appeal_type = models.IntegerField(choices=Dref.DrefType.choices, verbose_name=_("appeal type"), null=True, blank=True)
+    status = models.IntegerField(choices=Dref.Status.choices, verbose_name=_("status"), db_index=True)
+    # Date fields used by the start/end date of operation filters
+    start_date = models.DateField(verbose_name=_("start date"), null=True, blank=True)
+    end_date = models.DateField(verbose_name=_("end date"), null=True, blank=True)
+    event_date = models.DateField(verbose_name=_("event date"), null=True, blank=True)
+    # Serialized rows with all the records of the appeal code (superusers) and with only the approved ones (others)
+    data = models.JSONField(verbose_name=_("data"), encoder=DjangoJSONEncoder)
+    approved_data = models.JSONField(verbose_name=_("approved data"), encoder=DjangoJSONEncoder, null=True, blank=True)
+    updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("dref operation row")
+        verbose_name_plural = _("dref operation rows")
+        ordering = ("appeal_code", "stage", "created_at", "object_id")
+        unique_together = ("stage", "object_id")
+        indexes = [
+            models.Index(fields=["appeal_code", "stage", "created_at", "object_id"], name="dref_operation_row_order_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.appeal_code} - {self.get_stage_display()} ({self.object_id})"
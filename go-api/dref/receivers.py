@@ -0,0 +1,95 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api.models import Country, DisasterType, District, Region
+from dref.models import Dref, DrefFinalReport, DrefOperationalUpdate, DrefOperationRow
+from dref.utils import DREF3_STAGE_MODELS, refresh_dref_operation_rows_on_commit
+
+DREF3_MODEL_STAGES = {model: stage for stage, model in DREF3_STAGE_MODELS}
+
+# Fields of the related models which are serialized in the DrefOperationRow (data and columns)
+DREF3_REFERENCED_FIELDS = {
+    Country: ("name_en", "iso3", "region_id"),
+    Region: ("label",),
+    DisasterType: ("name",),
+    District: ("name", "code"),
+}
+
+
+def get_dref_operation_row_codes(instance):
+    """Appeal codes of the current DrefOperationRow of the instance (the appeal code might have been changed)"""
+    return set(
+        DrefOperationRow.objects.filter(
+            stage=DREF3_MODEL_STAGES[type(instance)],
+            object_id=instance.pk,
+        ).values_list("appeal_code", flat=True)
+    )
+
+
+def get_referenced_appeal_codes(instance):
+    """Appeal codes of the Dref records which embed the instance"""
+    if isinstance(instance, Country):
+        query = Q(country=instance.pk) | Q(national_society=instance.pk)
+    elif isinstance(instance, Region):
+        query = Q(country__region=instance.pk) | Q(national_society__region=instance.pk)
+    elif isinstance(instance, DisasterType):
+        query = Q(disaster_type=instance.pk)
+    else:
+        query = Q(district=instance.pk)
+    appeal_codes = set()
+    for _, model in DREF3_STAGE_MODELS:
+        appeal_codes.update(model.objects.filter(query).values_list("appeal_code", flat=True).distinct())
+    return appeal_codes
+
+
+def get_referenced_values(instance):
+    return tuple(getattr(instance, field) for field in DREF3_REFERENCED_FIELDS[type(instance)])
+
+
+# NOTE: Rows are refreshed once the transaction is committed, all the changes of an appeal code are refreshed together
+@receiver(post_save, sender=Dref)
+@receiver(post_save, sender=DrefOperationalUpdate)
+@receiver(post_save, sender=DrefFinalReport)
+@receiver(post_delete, sender=Dref)
+@receiver(post_delete, sender=DrefOperationalUpdate)
+@receiver(post_delete, sender=DrefFinalReport)
+def update_dref_operation_rows(sender, instance, **kwargs):
+    refresh_dref_operation_rows_on_commit({instance.appeal_code} | get_dref_operation_row_codes(instance))
+
+
+@receiver(m2m_changed, sender=Dref.district.through)
+@receiver(m2m_changed, sender=Dref.planned_interventions.through)
+@receiver(m2m_changed, sender=DrefOperationalUpdate.district.through)
+@receiver(m2m_changed, sender=DrefOperationalUpdate.planned_interventions.through)
+@receiver(m2m_changed, sender=DrefFinalReport.district.through)
+@receiver(m2m_changed, sender=DrefFinalReport.planned_interventions.through)
+def update_dref_operation_rows_for_m2m(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # District/PlannedIntervention side, changes are applied through the Dref records
+        return
+    refresh_dref_operation_rows_on_commit([instance.appeal_code])
+
+
+@receiver(pre_save, sender=Country)
+@receiver(pre_save, sender=Region)
+@receiver(pre_save, sender=DisasterType)
+@receiver(pre_save, sender=District)
+def keep_previous_dref3_referenced_values(sender, instance, **kwargs):
+    instance._previous_dref3_referenced_values = (
+        instance.pk and sender.objects.filter(pk=instance.pk).values_list(*DREF3_REFERENCED_FIELDS[sender]).first()
+    )
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=Region)
+@receiver(post_save, sender=DisasterType)
+@receiver(post_save, sender=District)
+def update_dref_operation_rows_for_references(sender, instance, created, **kwargs):
+    if created:
+        return
+    if getattr(instance, "_previous_dref3_referenced_values", None) == get_referenced_values(instance):
+        return
+    refresh_dref_operation_rows_on_commit(get_referenced_appeal_codes(instance))
@@ -16,7 +16,7 @@ class DrefIndex(indexes.SearchIndex, indexes.Indexable):
         return Dref
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("national_society")
 
 
 class DrefOperationalUpdateIndex(indexes.SearchIndex, indexes.Indexable):
@@ -32,4 +32,4 @@ class DrefOperationalUpdateIndex(indexes.SearchIndex, indexes.Indexable):
         return DrefOperationalUpdate
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("national_society")
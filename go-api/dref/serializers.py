@@ -1822,11 +1822,13 @@ class BaseDref3Serializer(serializers.ModelSerializer):
             return obj.operation_end_date
 
     def get_operation_status(self, obj):
+        return self.get_operation_status_for_dates(self.get_start_date_of_operation(obj), self.get_end_date_of_operation(obj))
+
+    @staticmethod
+    def get_operation_status_for_dates(start, end):
         """Return 'active' if current date is between start and end date (inclusive), else 'closed'.
         Returns None if either boundary date is missing.
         """
-        start = self.get_start_date_of_operation(obj)
-        end = self.get_end_date_of_operation(obj)
         if not start or not end:
             return None
         try:
@@ -2122,6 +2124,12 @@ class BaseDref3Serializer(serializers.ModelSerializer):
         return None  # Placeholder for future implementation
 
     def get_link_to_emergency_page(self, obj):
+        # Preloaded {appeal code: event id} to avoid a query per record
+        appeal_event_ids = self.context.get("appeal_event_ids")
+        if appeal_event_ids is not None:
+            if obj.appeal_code not in appeal_event_ids:
+                return None
+            return f"https://go.ifrc.org/emergencies/{appeal_event_ids[obj.appeal_code]}/details"
         try:
             appeal = Appeal.objects.get(code=obj.appeal_code)
         except Appeal.DoesNotExist:
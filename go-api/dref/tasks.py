@@ -3,6 +3,7 @@ import logging
 from celery import shared_task
 from django.apps import apps
 from django.template.loader import render_to_string
+from django.utils import timezone
 
 from api.utils import get_model_name
 from lang.tasks import translate_model_fields
@@ -68,12 +69,15 @@ def process_dref_translation(model_name, instance_pk):
         _translate_related_objects(instance)
         instance.status = Dref.Status.FINALIZED
         instance.translation_module_original_language = "en"
-        instance.save(update_fields=["status", "translation_module_original_language"])
+        # NOTE: modified_at is not auto_now, it's also used to reuse the previous PDF exports
+        instance.modified_at = timezone.now()
+        instance.save(update_fields=["status", "translation_module_original_language", "modified_at"])
         logger.info(f"Successfully finalized: ({model_name}) ID: ({instance_pk})")
     except Exception:
         if instance is not None:
             instance.status = Dref.Status.FAILED
-            instance.save(update_fields=["status"])
+            instance.modified_at = timezone.now()
+            instance.save(update_fields=["status", "modified_at"])
         logger.warning(f"Translation failed for model: ({model_name}) ID: ({instance_pk})", exc_info=True)
         return False
 
@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import status
 
 from api.models import Country, Region, RegionName
@@ -9,7 +11,8 @@ from dref.factories.dref import (
     DrefFinalReportFactory,
     DrefOperationalUpdateFactory,
 )
-from dref.models import Dref
+from dref.models import Dref, DrefOperationRow
+from dref.utils import refresh_dref_operation_rows_on_commit
 from main.test_case import APITestCase
 
 User = get_user_model()
@@ -25,49 +28,50 @@ class Dref3FilterTests(APITestCase):
         self.country1 = Country.objects.create(name="Country1", iso3="C11", iso="C1", region=self.region1)
         self.country2 = Country.objects.create(name="Country2", iso3="C22", iso="C2", region=self.region2)
         today = datetime.utcnow().date()
-        self.dref_a = DrefFactory.create(
-            appeal_code="APPEAL_A",
-            national_society=self.country1,
-            type_of_dref=Dref.DrefType.RESPONSE,
-            date_of_approval=today - timedelta(days=5),
-            end_date=today + timedelta(days=10),
-            status=Dref.Status.DRAFT,
-        )
-        self.dref_b = DrefFactory.create(
-            appeal_code="APPEAL_B",
-            national_society=self.country2,
-            type_of_dref=Dref.DrefType.IMMINENT,
-            date_of_approval=today - timedelta(days=5),
-            end_date=today + timedelta(days=20),
-            status=Dref.Status.DRAFT,
-        )
-        self.op_a1 = DrefOperationalUpdateFactory.create(
-            appeal_code="APPEAL_A",
-            national_society=self.country1,
-            type_of_dref=Dref.DrefType.RESPONSE,
-            new_operational_start_date=today - timedelta(days=3),
-            new_operational_end_date=today + timedelta(days=7),
-            status=Dref.Status.DRAFT,
-            dref=self.dref_a,
-        )
-        self.op_b1 = DrefOperationalUpdateFactory.create(
-            appeal_code="APPEAL_B",
-            national_society=self.country2,
-            type_of_dref=Dref.DrefType.IMMINENT,
-            new_operational_start_date=today - timedelta(days=2),
-            new_operational_end_date=today + timedelta(days=9),
-            status=Dref.Status.DRAFT,
-            dref=self.dref_b,
-        )
-        self.final_a = DrefFinalReportFactory.create(
-            appeal_code="APPEAL_A",
-            national_society=self.country1,
-            type_of_dref=Dref.DrefType.RESPONSE,
-            operation_start_date=today - timedelta(days=15),
-            operation_end_date=today - timedelta(days=1),
-            status=Dref.Status.DRAFT,
-            dref=self.dref_a,
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dref_a = DrefFactory.create(
+                appeal_code="APPEAL_A",
+                national_society=self.country1,
+                type_of_dref=Dref.DrefType.RESPONSE,
+                date_of_approval=today - timedelta(days=5),
+                end_date=today + timedelta(days=10),
+                status=Dref.Status.DRAFT,
+            )
+            self.dref_b = DrefFactory.create(
+                appeal_code="APPEAL_B",
+                national_society=self.country2,
+                type_of_dref=Dref.DrefType.IMMINENT,
+                date_of_approval=today - timedelta(days=5),
+                end_date=today + timedelta(days=20),
+                status=Dref.Status.DRAFT,
+            )
+            self.op_a1 = DrefOperationalUpdateFactory.create(
+                appeal_code="APPEAL_A",
+                national_society=self.country1,
+                type_of_dref=Dref.DrefType.RESPONSE,
+                new_operational_start_date=today - timedelta(days=3),
+                new_operational_end_date=today + timedelta(days=7),
+                status=Dref.Status.DRAFT,
+                dref=self.dref_a,
+            )
+            self.op_b1 = DrefOperationalUpdateFactory.create(
+                appeal_code="APPEAL_B",
+                national_society=self.country2,
+                type_of_dref=Dref.DrefType.IMMINENT,
+                new_operational_start_date=today - timedelta(days=2),
+                new_operational_end_date=today + timedelta(days=9),
+                status=Dref.Status.DRAFT,
+                dref=self.dref_b,
+            )
+            self.final_a = DrefFinalReportFactory.create(
+                appeal_code="APPEAL_A",
+                national_society=self.country1,
+                type_of_dref=Dref.DrefType.RESPONSE,
+                operation_start_date=today - timedelta(days=15),
+                operation_end_date=today - timedelta(days=1),
+                status=Dref.Status.DRAFT,
+                dref=self.dref_a,
+            )
 
     def _get_codes(self, response):
         return {row["appeal_id"] for row in response.json()}
@@ -96,7 +100,8 @@ class Dref3FilterTests(APITestCase):
     def test_operation_status_filter(self):
         self.authenticate(self.superuser)
         self.dref_a.status = Dref.Status.APPROVED
-        self.dref_a.save(update_fields=["status"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dref_a.save(update_fields=["status"])
         resp = self.client.get(self.url, {"operation_status": Dref.Status.APPROVED})
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         codes = self._get_codes(resp)
@@ -154,6 +159,74 @@ class Dref3FilterTests(APITestCase):
             self.assertEqual(page2.status_code, status.HTTP_200_OK)
             assert len(page2.json()) == 1
 
+    def test_pagination_matches_full_list(self):
+        self.authenticate(self.superuser)
+        full = self.client.get(self.url).json()
+        for offset in range(len(full)):
+            page = self.client.get(self.url, {"limit": 2, "offset": offset})
+            self.assertEqual(page.status_code, status.HTTP_200_OK)
+            self.assertEqual(page.json(), full[offset : offset + 2])
+
+    def test_operation_rows_maintained_on_save(self):
+        rows = DrefOperationRow.objects.filter(appeal_code="APPEAL_A")
+        assert list(rows.values_list("stage", "object_id")) == [
+            (DrefOperationRow.Stage.APPLICATION, self.dref_a.id),
+            (DrefOperationRow.Stage.OPERATIONAL_UPDATE, self.op_a1.id),
+            (DrefOperationRow.Stage.FINAL_REPORT, self.final_a.id),
+        ]
+        assert not rows.filter(approved_data__isnull=False).exists()
+
+        self.dref_a.status = Dref.Status.APPROVED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dref_a.save(update_fields=["status"])
+        application_row = rows.get(stage=DrefOperationRow.Stage.APPLICATION)
+        assert application_row.status == Dref.Status.APPROVED
+        assert application_row.approved_data["is_latest_stage"] is True
+
+        # Changing the appeal code moves the row
+        self.op_a1.appeal_code = "APPEAL_C"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.op_a1.save()
+        assert not rows.filter(stage=DrefOperationRow.Stage.OPERATIONAL_UPDATE).exists()
+        assert DrefOperationRow.objects.filter(appeal_code="APPEAL_C", object_id=self.op_a1.id).exists()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.final_a.delete()
+        assert not rows.filter(stage=DrefOperationRow.Stage.FINAL_REPORT).exists()
+
+    def test_operation_rows_refreshed_on_reference_change(self):
+        self.dref_a.country = self.country1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dref_a.save(update_fields=["country"])
+        self.country1.name = "Country1 Renamed"
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.country1.save()
+        assert len(callbacks) == 1
+        application_row = DrefOperationRow.objects.get(appeal_code="APPEAL_A", stage=DrefOperationRow.Stage.APPLICATION)
+        assert application_row.data["country"] == "Country1 Renamed"
+
+        # Unrelated changes don't refresh the rows
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.country2.save()
+        assert callbacks == []
+
+    def test_operation_rows_refresh_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            # The codes of a rolled back transaction are dropped with its callback
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                refresh_dref_operation_rows_on_commit(["APPEAL_B"])
+                raise RuntimeError
+            refresh_dref_operation_rows_on_commit(["APPEAL_A"])
+            refresh_dref_operation_rows_on_commit(["APPEAL_C"])
+        assert len(callbacks) == 1
+        assert callbacks[0].appeal_codes == {"APPEAL_A", "APPEAL_C"}
+
+        # A failed refresh doesn't fail the committed request
+        with mock.patch("dref.utils.refresh_dref_operation_rows", side_effect=Exception("error")):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                refresh_dref_operation_rows_on_commit(["APPEAL_A"])
+        assert len(callbacks) == 1
+
     def test_export_csv(self):
         self.authenticate(self.superuser)
         resp = self.client.get(self.url, {"export": "csv", "stage": "application"})
@@ -193,9 +266,11 @@ class Dref3FilterTests(APITestCase):
         self.authenticate(self.superuser)
         # Mutate some statuses to have multiple labels represented
         self.dref_a.status = Dref.Status.APPROVED
-        self.dref_a.save(update_fields=["status"])  # Approved -> "Approved"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dref_a.save(update_fields=["status"])  # Approved -> "Approved"
         self.op_a1.status = Dref.Status.FINALIZED
-        self.op_a1.save(update_fields=["status"])  # Finalized -> "Finalized"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.op_a1.save(update_fields=["status"])  # Finalized -> "Finalized"
         # Leave final report as Draft -> "Draft"
         resp = self.client.get(self.url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
@@ -216,7 +291,8 @@ class Dref3FilterTests(APITestCase):
 
         # Approve application
         self.dref_a.status = Dref.Status.APPROVED
-        self.dref_a.save(update_fields=["status"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dref_a.save(update_fields=["status"])
         resp_after_app = self.client.get(f"/api/v2/dref3/{self.dref_a.appeal_code}/")
         self.assertEqual(resp_after_app.status_code, status.HTTP_200_OK)
         data_after_app = resp_after_app.json()
@@ -228,7 +304,8 @@ class Dref3FilterTests(APITestCase):
 
         # Approve operational update -> flag moves
         self.op_a1.status = Dref.Status.APPROVED
-        self.op_a1.save(update_fields=["status"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.op_a1.save(update_fields=["status"])
         resp_after_op = self.client.get(f"/api/v2/dref3/{self.dref_a.appeal_code}/")
         self.assertEqual(resp_after_op.status_code, status.HTTP_200_OK)
         data_after_op = resp_after_op.json()
@@ -239,7 +316,8 @@ class Dref3FilterTests(APITestCase):
 
         # Approve final report -> flag moves again
         self.final_a.status = Dref.Status.APPROVED
-        self.final_a.save(update_fields=["status"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.final_a.save(update_fields=["status"])
         resp_after_fr = self.client.get(f"/api/v2/dref3/{self.dref_a.appeal_code}/")
         self.assertEqual(resp_after_fr.status_code, status.HTTP_200_OK)
         data_after_fr = resp_after_fr.json()
@@ -1,8 +1,14 @@
+import logging
+import threading
+
 from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
-from django.db import models
+from django.db import models, transaction
+
+from api.models import Appeal
+from dref.models import Dref, DrefFinalReport, DrefOperationalUpdate, DrefOperationRow
 
-from dref.models import Dref, DrefFinalReport, DrefOperationalUpdate
+logger = logging.getLogger(__name__)
 
 
 def get_email_context(instance):
@@ -53,3 +59,185 @@ def get_dref_users():
             )
         )
     return dref_users_list
+
+
+DREF3_STAGE_MODELS = (
+    (DrefOperationRow.Stage.APPLICATION, Dref),
+    (DrefOperationRow.Stage.OPERATIONAL_UPDATE, DrefOperationalUpdate),
+    (DrefOperationRow.Stage.FINAL_REPORT, DrefFinalReport),
+)
+
+
+def get_dref3_objects_by_appeal_codes(appeal_codes, get_queryset=None):
+    """Return {appeal_code: [Dref..., DrefOperationalUpdate..., DrefFinalReport...]}
+    using one query per model (with the relations used by the Dref3 serializers) for all the appeal codes.
+    """
+    objects_by_code = {appeal_code: [] for appeal_code in appeal_codes}
+    for _, model in DREF3_STAGE_MODELS:
+        queryset = model.objects.filter(appeal_code__in=appeal_codes)
+        if get_queryset:
+            queryset = get_queryset(model, queryset)
+        queryset = (
+            queryset.select_related("country__region", "disaster_type", "national_society")
+            .prefetch_related("planned_interventions", "district")
+            .order_by("created_at", "id")
+        )
+        if model is not Dref:
+            queryset = queryset.select_related("dref")
+        for instance in queryset:
+            objects_by_code.setdefault(instance.appeal_code, []).append(instance)
+    return objects_by_code
+
+
+def get_appeal_event_ids(appeal_codes):
+    return dict(Appeal.objects.filter(code__in=appeal_codes).values_list("code", "event_id"))
+
+
+def serialize_dref3_objects(instances, public=True, appeal_event_ids=None):
+    """Serialize the (ordered) records of an appeal code as Dref3 rows"""
+    from dref.serializers import (
+        Dref3Serializer,
+        DrefFinalReport3Serializer,
+        DrefOperationalUpdate3Serializer,
+    )
+
+    serialized_data = []
+    ops_update_count = 0
+    allocation_count = 1  # Dref Application is always the first allocation
+    a = ["First", "Second", "Third", "Fourth", "Fifth", "Sixth", "Seventh", "Eighth", "Ninth", "Tenth"]
+
+    # is_latest_stage: the last APPROVED-status instance and next instance either absent or not APPROVED
+    latest_index = None
+    for i, inst in enumerate(instances):
+        if getattr(inst, "status", None) == Dref.Status.APPROVED:
+            next_inst = instances[i + 1] if i + 1 < len(instances) else None
+            if next_inst is None or getattr(next_inst, "status", None) != Dref.Status.APPROVED:
+                latest_index = i
+    # Build serialized rows with flag
+    for i, instance in enumerate(instances):
+        context = {
+            "public": public,
+            "is_latest_stage": i == latest_index,
+            "appeal_event_ids": appeal_event_ids,
+        }
+        if isinstance(instance, Dref):
+            serializer = Dref3Serializer(instance, context={**context, "stage": "Application", "allocation": a[0]})
+        elif isinstance(instance, DrefOperationalUpdate):
+            ops_update_count += 1
+            if instance.additional_allocation and len(a) > allocation_count:
+                allocation = a[allocation_count]
+                allocation_count += 1
+            else:
+                allocation = "No allocation"
+            serializer = DrefOperationalUpdate3Serializer(
+                instance,
+                context={**context, "stage": f"Operational Update {ops_update_count}", "allocation": allocation},
+            )
+        elif isinstance(instance, DrefFinalReport):
+            serializer = DrefFinalReport3Serializer(
+                instance,
+                context={**context, "stage": "Final Report", "allocation": "No allocation"},
+            )
+        else:
+            continue
+        serialized_data.append(serializer.data)
+    return serialized_data
+
+
+def refresh_dref_operation_rows(appeal_codes):
+    """Rebuild the DrefOperationRow rows of the given appeal codes"""
+    appeal_codes = {appeal_code for appeal_code in appeal_codes if appeal_code}
+    if not appeal_codes:
+        return
+    objects_by_code = get_dref3_objects_by_appeal_codes(appeal_codes)
+    appeal_event_ids = get_appeal_event_ids(appeal_codes)
+    stage_by_model = {model: stage for stage, model in DREF3_STAGE_MODELS}
+
+    rows = []
+    for appeal_code, instances in objects_by_code.items():
+        data = serialize_dref3_objects(instances, appeal_event_ids=appeal_event_ids)
+        # Non superusers only see the approved records (stage numbering and latest stage are based on them)
+        approved_instances = [instance for instance in instances if instance.status == Dref.Status.APPROVED]
+        approved_data = dict(
+            zip(
+                [id(instance) for instance in approved_instances],
+                serialize_dref3_objects(approved_instances, appeal_event_ids=appeal_event_ids),
+            )
+        )
+        for instance, instance_data in zip(instances, data):
+            if isinstance(instance, Dref):
+                appeal_type = instance.type_of_dref
+                start_date = instance.date_of_approval
+                end_date = instance.end_date
+            elif isinstance(instance, DrefOperationalUpdate):
+                appeal_type = instance.dref.type_of_dref
+                start_date = instance.new_operational_start_date
+                end_date = instance.new_operational_end_date
+            else:
+                appeal_type = instance.dref.type_of_dref
+                start_date = instance.operation_start_date
+                end_date = instance.operation_end_date
+            national_society = instance.national_society
+            rows.append(
+                DrefOperationRow(
+                    appeal_code=appeal_code,
+                    stage=stage_by_model[type(instance)],
+                    object_id=instance.pk,
+                    created_at=instance.created_at,
+                    region_id=national_society and national_society.region_id,
+                    country_iso3=national_society and national_society.iso3,
+                    appeal_type=appeal_type,
+                    status=instance.status,
+                    start_date=start_date,
+                    end_date=end_date,
+                    event_date=instance.event_date,
+                    data=instance_data,
+                    approved_data=approved_data.get(id(instance)),
+                )
+            )
+
+    with transaction.atomic():
+        DrefOperationRow.objects.filter(appeal_code__in=appeal_codes).delete()
+        DrefOperationRow.objects.bulk_create(rows)
+
+
+class _PendingDrefOperationRowsRefresh:
+    """On commit callback refreshing the appeal codes collected during the transaction"""
+
+    def __init__(self):
+        self.appeal_codes = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        try:
+            refresh_dref_operation_rows(self.appeal_codes)
+        except Exception:
+            # NOTE: The rows can be rebuilt using the rebuild_dref_operation_rows command
+            logger.error(f"Failed to refresh the DrefOperationRow of {sorted(self.appeal_codes)}", exc_info=True)
+
+
+_pending_refresh = threading.local()
+
+
+def refresh_dref_operation_rows_on_commit(appeal_codes):
+    """
+    Rebuild the DrefOperationRow rows of the given appeal codes once the transaction is committed.
+    The appeal codes changed within the same transaction are refreshed together by a single callback.
+    The callback (with its appeal codes) is discarded by Django if the transaction is rolled back.
+    """
+    appeal_codes = {appeal_code for appeal_code in appeal_codes if appeal_code}
+    if not appeal_codes:
+        return
+    pending = getattr(_pending_refresh, "callback", None)
+    if (
+        pending is not None
+        and not pending.done
+        and any(func is pending for _, func, _ in transaction.get_connection().run_on_commit)
+    ):
+        pending.appeal_codes.update(appeal_codes)
+        return
+    pending = _pending_refresh.callback = _PendingDrefOperationRowsRefresh()
+    pending.appeal_codes.update(appeal_codes)
+    # NOTE: The DREF changes are already committed, a failed refresh is logged instead of failing the request
+    transaction.on_commit(pending, robust=True)
@@ -3,6 +3,7 @@ import csv
 import django.utils.timezone as timezone
 from django.contrib.auth.models import Permission
 from django.db import models, transaction
+from django.db.models.functions import Collate, Upper
 from django.http import HttpResponse
 from django.templatetags.static import static
 from django.utils.translation import gettext
@@ -29,24 +30,34 @@ from dref.filter_set import (
     DrefOperationalUpdateFilter,
     DrefShareUserFilterSet,
 )
-from dref.models import Dref, DrefFile, DrefFinalReport, DrefOperationalUpdate
+from dref.models import (
+    Dref,
+    DrefFile,
+    DrefFinalReport,
+    DrefOperationalUpdate,
+    DrefOperationRow,
+)
 from dref.permissions import ApproveDrefPermission
 from dref.serializers import (
     AddDrefUserSerializer,
+    BaseDref3Serializer,
     CompletedDrefOperationsSerializer,
     Dref3Serializer,
     DrefFileInputSerializer,
     DrefFileSerializer,
-    DrefFinalReport3Serializer,
     DrefFinalReportSerializer,
     DrefGlobalFilesSerializer,
-    DrefOperationalUpdate3Serializer,
     DrefOperationalUpdateSerializer,
     DrefSerializer,
     DrefShareUserSerializer,
     MiniDrefSerializer,
 )
 from dref.tasks import process_dref_translation
+from dref.utils import (
+    get_appeal_event_ids,
+    get_dref3_objects_by_appeal_codes,
+    serialize_dref3_objects,
+)
 from main.permissions import DenyGuestUserPermission
 
 
@@ -99,7 +110,8 @@ class DrefViewSet(RevisionMixin, viewsets.ModelViewSet):
         if dref.status != Dref.Status.FINALIZED:
             raise serializers.ValidationError(gettext("Must be finalized before it can be approved"))
         dref.status = Dref.Status.APPROVED
-        dref.save(update_fields=["status"])
+        dref.modified_at = timezone.now()
+        dref.save(update_fields=["status", "modified_at"])
         serializer = DrefSerializer(dref, context={"request": request})
         return response.Response(serializer.data)
 
@@ -116,13 +128,15 @@ class DrefViewSet(RevisionMixin, viewsets.ModelViewSet):
             raise serializers.ValidationError(gettext("Cannot be finalized because it is already %s") % dref.get_status_display())
         if dref.translation_module_original_language == "en":
             dref.status = Dref.Status.FINALIZED
-            dref.save(update_fields=["status"])
+            dref.modified_at = timezone.now()
+            dref.save(update_fields=["status", "modified_at"])
             serializer = DrefSerializer(dref, context={"request": request})
             return response.Response(serializer.data)
 
         model_name = get_model_name(type(dref))
         dref.status = Dref.Status.FINALIZING
-        dref.save(update_fields=["status"])
+        dref.modified_at = timezone.now()
+        dref.save(update_fields=["status", "modified_at"])
         transaction.on_commit(lambda: process_dref_translation.delay(model_name, dref.pk))
         return response.Response(
             {"detail": gettext("The translation is currently being processed. Please wait a little while before trying again.")},
@@ -195,7 +209,8 @@ class DrefOperationalUpdateViewSet(RevisionMixin, viewsets.ModelViewSet):
             raise serializers.ValidationError(gettext("Must be finalized before it can be approved."))
 
         operational_update.status = Dref.Status.APPROVED
-        operational_update.save(update_fields=["status"])
+        operational_update.modified_at = timezone.now()
+        operational_update.save(update_fields=["status", "modified_at"])
         serializer = DrefOperationalUpdateSerializer(operational_update, context={"request": request})
         return response.Response(serializer.data)
 
@@ -214,13 +229,15 @@ class DrefOperationalUpdateViewSet(RevisionMixin, viewsets.ModelViewSet):
             )
         if operational_update.translation_module_original_language == "en":
             operational_update.status = Dref.Status.FINALIZED
-            operational_update.save(update_fields=["status"])
+            operational_update.modified_at = timezone.now()
+            operational_update.save(update_fields=["status", "modified_at"])
             serializer = DrefOperationalUpdateSerializer(operational_update, context={"request": request})
             return response.Response(serializer.data)
 
         model_name = get_model_name(type(operational_update))
         operational_update.status = Dref.Status.FINALIZING
-        operational_update.save(update_fields=["status"])
+        operational_update.modified_at = timezone.now()
+        operational_update.save(update_fields=["status", "modified_at"])
         transaction.on_commit(lambda: process_dref_translation.delay(model_name, operational_update.pk))
         return response.Response(
             {"detail": gettext("The translation is currently being processed. Please wait a little while before trying again.")},
@@ -260,10 +277,12 @@ class DrefFinalReportViewSet(RevisionMixin, viewsets.ModelViewSet):
             raise serializers.ValidationError(gettext("Must be finalized before it can be approved."))
 
         final_report.status = Dref.Status.APPROVED
-        final_report.save(update_fields=["status"])
+        final_report.modified_at = timezone.now()
+        final_report.save(update_fields=["status", "modified_at"])
         final_report.dref.is_active = False
         final_report.date_of_approval = timezone.now().date()
-        final_report.dref.save(update_fields=["is_active", "date_of_approval"])
+        final_report.dref.modified_at = timezone.now()
+        final_report.dref.save(update_fields=["is_active", "date_of_approval", "modified_at"])
         serializer = DrefFinalReportSerializer(final_report, context={"request": request})
         return response.Response(serializer.data)
 
@@ -282,13 +301,15 @@ class DrefFinalReportViewSet(RevisionMixin, viewsets.ModelViewSet):
             )
         if final_report.translation_module_original_language == "en":
             final_report.status = Dref.Status.FINALIZED
-            final_report.save(update_fields=["status"])
+            final_report.modified_at = timezone.now()
+            final_report.save(update_fields=["status", "modified_at"])
             serializer = DrefFinalReportSerializer(final_report, context={"request": request})
             return response.Response(serializer.data)
 
         model_name = get_model_name(type(final_report))
         final_report.status = Dref.Status.FINALIZING
-        final_report.save(update_fields=["status"])
+        final_report.modified_at = timezone.now()
+        final_report.save(update_fields=["status", "modified_at"])
         transaction.on_commit(lambda: process_dref_translation.delay(model_name, final_report.pk))
         return response.Response(
             {"detail": gettext("The translation is currently being processed. Please wait a little while before trying again.")},
@@ -462,67 +483,23 @@ class Dref3ViewSet(RevisionMixin, viewsets.ModelViewSet):  # type: ignore[misc]
         # Get appeal_codes – then self.retrieve
 
         stage_filter = self._parse_stage_filter(request.query_params.get("stage"))
-        codes_qs_dref = Dref.objects.exclude(appeal_code="").values_list("appeal_code", flat=True).distinct()
-        codes_qs_op = DrefOperationalUpdate.objects.exclude(appeal_code="").values_list("appeal_code", flat=True).distinct()
-        codes_qs_final = DrefFinalReport.objects.exclude(appeal_code="").values_list("appeal_code", flat=True).distinct()
-
-        # Filtering by appeal_code prefix
-        appeal_code_prefix = request.query_params.get("appeal_code_prefix")
-        if appeal_code_prefix:
-            codes_qs_dref = codes_qs_dref.filter(appeal_code__startswith=appeal_code_prefix)
-            codes_qs_op = codes_qs_op.filter(appeal_code__startswith=appeal_code_prefix)
-            codes_qs_final = codes_qs_final.filter(appeal_code__startswith=appeal_code_prefix)
-
-        # region filter
-        region_param = request.query_params.get("region")
-        if region_param:
-            try:
-                region_id = int(region_param)
-            except ValueError:
-                region_id = None
-            if region_id:
-                codes_qs_dref = codes_qs_dref.filter(national_society__region_id=region_id)
-                codes_qs_op = codes_qs_op.filter(national_society__region_id=region_id)
-                codes_qs_final = codes_qs_final.filter(national_society__region_id=region_id)
-
-        # country iso3
-        iso3_param = request.query_params.get("country_iso3")
-        if iso3_param:
-            iso3 = iso3_param.strip().upper()
-            codes_qs_dref = codes_qs_dref.filter(national_society__iso3__iexact=iso3)
-            codes_qs_op = codes_qs_op.filter(national_society__iso3__iexact=iso3)
-            codes_qs_final = codes_qs_final.filter(national_society__iso3__iexact=iso3)
-
-        # appeal_type => type_of_dref
-        appeal_type_param = request.query_params.get("appeal_type")
-        if appeal_type_param:
-            try:
-                appeal_type_int = int(appeal_type_param)
-                codes_qs_dref = codes_qs_dref.filter(type_of_dref=appeal_type_int)
-                codes_qs_op = codes_qs_op.filter(dref__type_of_dref=appeal_type_int)
-                codes_qs_final = codes_qs_final.filter(dref__type_of_dref=appeal_type_int)
-            except ValueError:
-                pass
-
-        # operation_status => status
-        op_status_int = self._status_to_int(request.query_params.get("operation_status"))
-        if op_status_int is not None:
-            codes_qs_dref = codes_qs_dref.filter(status=op_status_int)
-            codes_qs_op = codes_qs_op.filter(status=op_status_int)
-            codes_qs_final = codes_qs_final.filter(status=op_status_int)
-
-        # start/end date of operation
-        start_date_param = request.query_params.get("start_date_of_operation")
-        if start_date_param:
-            # Dref has no operation_start_date; approximate with date_of_approval for application stage records.
-            codes_qs_dref = codes_qs_dref.filter(date_of_approval__gte=start_date_param)
-            codes_qs_op = codes_qs_op.filter(new_operational_start_date__gte=start_date_param)
-            codes_qs_final = codes_qs_final.filter(operation_start_date__gte=start_date_param)
-        end_date_param = request.query_params.get("end_date_of_operation")
-        if end_date_param:
-            codes_qs_dref = codes_qs_dref.filter(end_date__lte=end_date_param)
-            codes_qs_op = codes_qs_op.filter(new_operational_end_date__lte=end_date_param)
-            codes_qs_final = codes_qs_final.filter(operation_end_date__lte=end_date_param)
+        is_superuser = getattr(self.request.user, "is_superuser", False)
+        stage_map = {
+            "application": DrefOperationRow.Stage.APPLICATION,
+            "operational_update": DrefOperationRow.Stage.OPERATIONAL_UPDATE,
+            "final_report": DrefOperationRow.Stage.FINAL_REPORT,
+        }
+
+        rows_qs = DrefOperationRow.objects.all()
+        if not is_superuser:
+            # Light users: only published records are visible
+            rows_qs = rows_qs.filter(status=Dref.Status.APPROVED)
+            # Exclude codes for non-superusers
+            excluded_codes = self.get_nonsuperusers_excluded_codes()
+            if excluded_codes:
+                rows_qs = rows_qs.alias(appeal_code_upper=Upper("appeal_code")).exclude(appeal_code_upper__in=excluded_codes)
+        if stage_filter:
+            rows_qs = rows_qs.filter(stage__in=[stage_map[stage] for stage in stage_filter])
 
         # appeal_id direct (DB primary key)
         appeal_id_param = request.query_params.get("appeal_id")
@@ -531,96 +508,68 @@ class Dref3ViewSet(RevisionMixin, viewsets.ModelViewSet):  # type: ignore[misc]
                 pk_val = int(appeal_id_param)
             except ValueError:
                 pk_val = None
-            codes = []
+            code = None
             if pk_val:
-                for model in (Dref, DrefOperationalUpdate, DrefFinalReport):
-                    obj = model.objects.filter(pk=pk_val).only("appeal_code").first()
-                    if obj and obj.appeal_code:
-                        codes = [obj.appeal_code]
-                        break
+                code = (
+                    DrefOperationRow.objects.filter(object_id=pk_val)
+                    .order_by("stage")
+                    .values_list("appeal_code", flat=True)
+                    .first()
+                )
+            rows_qs = rows_qs.filter(appeal_code=code)
         else:
-            codes_sets = []
-            if not stage_filter or "application" in stage_filter:
-                codes_sets.append(set(codes_qs_dref))
-            if not stage_filter or "operational_update" in stage_filter:
-                codes_sets.append(set(codes_qs_op))
-            if not stage_filter or "final_report" in stage_filter:
-                codes_sets.append(set(codes_qs_final))
-            combined = set()
-            for s in codes_sets:
-                combined.update([c for c in s if c])
-            codes = sorted(combined)
-
-        # Additional date range filters (applied to root Dref only where fields exist)
-        date_range_fields = [
-            "event_date",
-            "ns_respond_date",
-            "government_requested_assistance_date",
-            "ns_request_date",
-            "submission_to_geneva",
-            "date_of_approval",
-            "publishing_date",
-            "hazard_date_and_location",
-            "end_date",
-        ]
-        for field in date_range_fields:
-            from_param = request.query_params.get(f"{field}_from")
-            to_param = request.query_params.get(f"{field}_to")
-            if from_param:
-                codes_qs_dref = codes_qs_dref.filter(**{f"{field}__gte": from_param})
-            if to_param:
-                codes_qs_dref = codes_qs_dref.filter(**{f"{field}__lte": to_param})
-
-        # Exclude codes for non-superusers
-        if not getattr(self.request.user, "is_superuser", False):
-            excluded_codes = self.get_nonsuperusers_excluded_codes()
-            if excluded_codes:
-                codes = [c for c in codes if c and c.upper() not in excluded_codes]
+            # Filters select the appeal codes having a matching record, all the (visible) records of the codes are returned
+            code_filters = {}
+
+            # Filtering by appeal_code prefix
+            appeal_code_prefix = request.query_params.get("appeal_code_prefix")
+            if appeal_code_prefix:
+                code_filters["appeal_code__startswith"] = appeal_code_prefix
+
+            # region filter
+            region_param = request.query_params.get("region")
+            if region_param:
+                try:
+                    region_id = int(region_param)
+                except ValueError:
+                    region_id = None
+                if region_id:
+                    code_filters["region"] = region_id
+
+            # country iso3
+            iso3_param = request.query_params.get("country_iso3")
+            if iso3_param:
+                code_filters["country_iso3__iexact"] = iso3_param.strip()
+
+            # appeal_type => type_of_dref (of the Dref for Operational Updates and Final Reports)
+            appeal_type_param = request.query_params.get("appeal_type")
+            if appeal_type_param:
+                try:
+                    code_filters["appeal_type"] = int(appeal_type_param)
+                except ValueError:
+                    pass
+
+            # operation_status => status
+            op_status_int = self._status_to_int(request.query_params.get("operation_status"))
+            if op_status_int is not None:
+                code_filters["status"] = op_status_int
+
+            # start/end date of operation
+            # NOTE: Dref has no operation_start_date; approximated with date_of_approval for application stage records.
+            start_date_param = request.query_params.get("start_date_of_operation")
+            if start_date_param:
+                code_filters["start_date__gte"] = start_date_param
+            end_date_param = request.query_params.get("end_date_of_operation")
+            if end_date_param:
+                code_filters["end_date__lte"] = end_date_param
+
+            if code_filters:
+                rows_qs = rows_qs.filter(appeal_code__in=rows_qs.filter(**code_filters).values("appeal_code"))
+
+        # Same order as the records of an appeal code in retrieve, appeal codes sorted by code point
+        rows_qs = rows_qs.order_by(Collate("appeal_code", "C"), "stage", "created_at", "object_id")
+        row_fields = ("data" if is_superuser else "approved_data", "event_date", "end_date")
 
-        data = []
-        old_kwargs = getattr(self, "kwargs", {}).copy()
-        for code in codes:
-            self.kwargs = {self.lookup_field: code}
-            try:
-                resp = self.retrieve(request)
-            except NotFound:
-                # Skip codes that have no visible records for this user
-                continue
-            if resp.status_code == 200:
-                for item in resp.data if isinstance(resp.data, list) else [resp.data]:
-                    if stage_filter:
-                        stage_val = None
-                        if isinstance(item, dict):
-                            stage_val = item.get("stage") or item.get("Stage")
-                        if stage_val:
-                            normalized_stage = stage_val.lower()
-                            if normalized_stage.startswith("operational update"):
-                                normalized_stage = "operational_update"
-                            elif normalized_stage == "final report":
-                                normalized_stage = "final_report"
-                            elif normalized_stage == "application":
-                                normalized_stage = "application"
-                            if normalized_stage not in stage_filter:
-                                continue
-                        else:
-                            # If stage filter present and we cannot determine stage, skip
-                            continue
-                    data.append(item)
-        self.kwargs = old_kwargs  # Restore old kwargs
-
-        # Assign ephemeral numeric ids (1-based sequence) per request and silent_operation flag
-        silents = self.get_nonsuperusers_excluded_codes()
-        for idx, row in enumerate(data, start=1):
-            row["id"] = idx
-            row["public"] = row["appeal_id"] not in silents
-
-        # numeric id filter (?id=3 or ?id=3,7)
-        id_param = request.query_params.get("id")
-        if id_param:
-            wanted_ids = {i.strip() for i in str(id_param).split(",") if i.strip().isdigit()}
-            if wanted_ids:
-                wanted_ints = {int(i) for i in wanted_ids}
-                data = [row for row in data if row.get("id") in wanted_ints]
         # pagination
         try:
             limit = int(request.query_params.get("limit")) if request.query_params.get("limit") else None
@@ -630,11 +579,37 @@ class Dref3ViewSet(RevisionMixin, viewsets.ModelViewSet):  # type: ignore[misc]
             offset = int(request.query_params.get("offset")) if request.query_params.get("offset") else 0
         except ValueError:
             offset = 0
-        if offset or limit is not None:
-            end = offset + limit if limit is not None else None
-            data_paginated = data[offset:end]
+        end = offset + limit if limit is not None else None
+
+        # numeric id filter (?id=3 or ?id=3,7)
+        # NOTE: Ephemeral numeric ids (1-based sequence) are assigned per request
+        id_param = request.query_params.get("id")
+        wanted_ids = {int(i.strip()) for i in str(id_param or "").split(",") if i.strip().isdigit()}
+        if wanted_ids:
+            row_pks = [
+                (row_id, pk) for row_id, pk in enumerate(rows_qs.values_list("pk", flat=True), start=1) if row_id in wanted_ids
+            ][offset:end]
+            page_qs = DrefOperationRow.objects.filter(pk__in=[pk for _, pk in row_pks])
+            values_by_pk = {pk: values for pk, *values in page_qs.values_list("pk", *row_fields)}
+            rows = [(row_id, values_by_pk[pk]) for row_id, pk in row_pks if pk in values_by_pk]
         else:
-            data_paginated = data
+            rows = list(enumerate(rows_qs[offset:end].values_list(*row_fields), start=offset + 1))
+
+        # silent_operation flag
+        silents = self.get_nonsuperusers_excluded_codes()
+        appeal_event_ids = get_appeal_event_ids({row["appeal_id"] for _, (row, *_) in rows})
+        data_paginated = []
+        for row_id, (row, event_date, end_date) in rows:
+            row["id"] = row_id
+            row["public"] = row["appeal_id"] not in silents
+            # Values depending on the current date or on the appeal are resolved per request
+            row["operation_status"] = BaseDref3Serializer.get_operation_status_for_dates(event_date, end_date)
+            row["link_to_emergency_page"] = (
+                f"https://go.ifrc.org/emergencies/{appeal_event_ids[row['appeal_id']]}/details"
+                if row["appeal_id"] in appeal_event_ids
+                else None
+            )
+            data_paginated.append(row)
 
         export_param = request.query_params.get("export")
         if export_param and export_param.lower() == "csv":
@@ -662,75 +637,24 @@ class Dref3ViewSet(RevisionMixin, viewsets.ModelViewSet):  # type: ignore[misc]
     #    def get_renderers(self):
     #        return [renderer() for renderer in tuple(api_settings.DEFAULT_RENDERER_CLASSES)]
 
-    def get_objects_by_appeal_code(self, appeal_code):
-        results = []
+    def get_visible_queryset(self, model, queryset):
+        """Records visible to the current user.
+        NOTE: Excluded codes for non-superusers are handled by the callers.
+        """
         user = self.request.user
-
         if not getattr(user, "is_superuser", False):
+            # Light users: only published records are visible
+            return queryset.filter(status=Dref.Status.APPROVED)
+        # Strong users: allow more access
+        return filter_dref_queryset_by_user_access(user, queryset)
+
+    def get_objects_by_appeal_code(self, appeal_code):
+        if not getattr(self.request.user, "is_superuser", False):
             # If code is in the excluded list, return no results for anonymous users
             excluded_codes = self.get_nonsuperusers_excluded_codes()
             if appeal_code and appeal_code.upper() in excluded_codes:
                 return []
-            # Light users: only published records are visible
-            drefs = (
-                Dref.objects.filter(appeal_code=appeal_code, status=Dref.Status.APPROVED)
-                .prefetch_related("planned_interventions", "needs_identified", "national_society_actions", "users")
-                .order_by("created_at")
-                .distinct()
-            )
-            if drefs.exists():
-                results.extend(drefs)
-
-            operational_updates = (
-                DrefOperationalUpdate.objects.filter(appeal_code=appeal_code, status=Dref.Status.APPROVED)
-                .prefetch_related("planned_interventions", "needs_identified", "national_society_actions", "users")
-                .order_by("created_at")
-                .distinct()
-            )
-            if operational_updates.exists():
-                results.extend(operational_updates)
-
-            final_reports = (
-                DrefFinalReport.objects.filter(appeal_code=appeal_code, status=Dref.Status.APPROVED)
-                .prefetch_related("planned_interventions", "needs_identified", "national_society_actions", "users")
-                .order_by("created_at")
-                .distinct()
-            )
-            if final_reports.exists():
-                results.extend(final_reports)
-            return results
-
-        # Strong users: allow more access
-        drefs = (
-            Dref.objects.filter(appeal_code=appeal_code)
-            .prefetch_related("planned_interventions", "needs_identified", "national_society_actions", "users")
-            .order_by("created_at")
-            .distinct()
-        )
-        drefs = filter_dref_queryset_by_user_access(user, drefs)
-        if drefs.exists():
-            results.extend(drefs)
-
-        operational_updates = (
-            DrefOperationalUpdate.objects.filter(appeal_code=appeal_code)
-            .prefetch_related("planned_interventions", "needs_identified", "national_society_actions", "users")
-            .order_by("created_at")
-            .distinct()
-        )
-        operational_updates = filter_dref_queryset_by_user_access(user, operational_updates)
-        if operational_updates.exists():
-            results.extend(operational_updates)
-
-        final_reports = (
-            DrefFinalReport.objects.filter(appeal_code=appeal_code)
-            .prefetch_related("planned_interventions", "needs_identified", "national_society_actions", "users")
-            .order_by("created_at")
-            .distinct()
-        )
-        final_reports = filter_dref_queryset_by_user_access(user, final_reports)
-        if final_reports.exists():
-            results.extend(final_reports)
-        return results
+        return get_dref3_objects_by_appeal_codes([appeal_code], get_queryset=self.get_visible_queryset)[appeal_code]
 
     def retrieve(self, request, *args, **kwargs):
         code = self.kwargs.get(self.lookup_field)
@@ -739,63 +663,13 @@ class Dref3ViewSet(RevisionMixin, viewsets.ModelViewSet):  # type: ignore[misc]
         if not instances:
             raise NotFound(f"No Dref, Operational Update, or Final Report found with code '{code}'.")
 
-        serialized_data = []
-        ops_update_count = 0
-        allocation_count = 1  # Dref Application is always the first allocation
-        public = code not in self.get_nonsuperusers_excluded_codes()
-        a = ["First", "Second", "Third", "Fourth", "Fifth", "Sixth", "Seventh", "Eighth", "Ninth", "Tenth"]
-
-        # is_latest_stage: the last APPROVED-status instance and next instance either absent or not APPROVED
-        latest_index = None
-        for i, inst in enumerate(instances):
-            if getattr(inst, "status", None) == Dref.Status.APPROVED:
-                next_inst = instances[i + 1] if i + 1 < len(instances) else None
-                if next_inst is None or getattr(next_inst, "status", None) != Dref.Status.APPROVED:
-                    latest_index = i
-        # Build serialized rows with flag
-        for i, instance in enumerate(instances):
-            is_latest_stage = i == latest_index
-            if isinstance(instance, Dref):
-                serializer = Dref3Serializer(
-                    instance,
-                    context={
-                        "stage": "Application",
-                        "allocation": a[0],
-                        "public": public,
-                        "is_latest_stage": is_latest_stage,
-                    },
-                )
-            elif isinstance(instance, DrefOperationalUpdate):
-                ops_update_count += 1
-                if instance.additional_allocation and len(a) > allocation_count:
-                    allocation = a[allocation_count]
-                    allocation_count += 1
-                else:
-                    allocation = "No allocation"
-                serializer = DrefOperationalUpdate3Serializer(
-                    instance,
-                    context={
-                        "stage": f"Operational Update {ops_update_count}",
-                        "allocation": allocation,
-                        "public": public,
-                        "is_latest_stage": is_latest_stage,
-                    },
-                )
-            elif isinstance(instance, DrefFinalReport):
-                serializer = DrefFinalReport3Serializer(
-                    instance,
-                    context={
-                        "stage": "Final Report",
-                        "allocation": "No allocation",
-                        "public": public,
-                        "is_latest_stage": is_latest_stage,
-                    },
-                )
-            else:
-                continue
-            serialized_data.append(serializer.data)
-
-        return response.Response(serialized_data)
+        return response.Response(
+            serialize_dref3_objects(
+                instances,
+                public=code not in self.get_nonsuperusers_excluded_codes(),
+                appeal_event_ids=get_appeal_event_ids([code]),
+            )
+        )
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
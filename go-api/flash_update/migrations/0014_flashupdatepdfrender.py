@@ -0,0 +1,42 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import main.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flash_update", "0013_alter_flashgraphicmap_file_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlashUpdatePdfRender",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("context_hash", models.CharField(max_length=64, verbose_name="context hash")),
+                ("file", main.fields.SecureFileField(upload_to="flash_update/pdf/", verbose_name="file")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="created at")),
+                ("used_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="used at")),
+                (
+                    "flash_update",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pdf_renders",
+                        to="flash_update.flashupdate",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Flash update PDF render",
+                "verbose_name_plural": "Flash update PDF renders",
+                "indexes": [
+                    models.Index(fields=["flash_update", "context_hash"], name="flash_pdf_render_hash_idx"),
+                ],
+            },
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.conf import settings
 from django.contrib.auth.models import Group
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from tinymce.models import HTMLField
 
@@ -250,3 +251,28 @@ class FlashUpdateShare(models.Model):
 
     def __str__(self):
         return self.flash_update.title
+
+
+class FlashUpdatePdfRender(models.Model):
+    """
+    Generated PDFs of a flash update, keyed by the hash of the rendered context (see get_flash_update_pdf).
+    Only the last HISTORY_SIZE used renders are kept.
+    """
+
+    HISTORY_SIZE = 5
+
+    flash_update = models.ForeignKey(FlashUpdate, on_delete=models.CASCADE, related_name="pdf_renders")
+    context_hash = models.CharField(verbose_name=_("context hash"), max_length=64)
+    file = SecureFileField(verbose_name=_("file"), upload_to="flash_update/pdf/")
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+    used_at = models.DateTimeField(verbose_name=_("used at"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("Flash update PDF render")
+        verbose_name_plural = _("Flash update PDF renders")
+        indexes = [
+            models.Index(fields=["flash_update", "context_hash"], name="flash_pdf_render_hash_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.flash_update_id} - {self.context_hash}"
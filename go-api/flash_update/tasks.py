@@ -1,27 +1,22 @@
 from celery import shared_task
 from django.contrib.auth.models import User
-from django.core.files.base import ContentFile
 from django.template.loader import render_to_string
-from django.utils import timezone
 
+from main.celery import Queues
 from notifications.notification import send_notification
 
 from .models import Donors, FlashUpdate, FlashUpdateShare
-from .utils import get_email_context, render_to_pdf
+from .utils import get_email_context, get_flash_update_pdf
 
 
-@shared_task
+# NOTE: The PDF rendering is CPU heavy, it runs in its own queue (see Queues.PDF)
+@shared_task(queue=Queues.PDF)
 def share_flash_update(flash_update_share_id):
     instance = FlashUpdateShare.objects.get(id=flash_update_share_id)
     flash_update = instance.flash_update
     context_for_pdf = get_email_context(flash_update)
     if flash_update.extracted_at is None or flash_update.modified_at > flash_update.extracted_at:
-        pdf = render_to_pdf("email/flash_update/flash_pdf.html", context_for_pdf)
-
-        # save the generated pdf
-        flash_update.extracted_file.save(pdf["filename"], ContentFile(pdf["file"]))
-        flash_update.extracted_at = timezone.now()
-        flash_update.save(update_fields=("extracted_at",))
+        get_flash_update_pdf(flash_update, context_for_pdf)
 
     # create url for pdf in email
     email_context = {"document_url": flash_update.extracted_file.url, "situational_overview": flash_update.situational_overview}
@@ -59,18 +54,9 @@ def send_flash_update_email(flash_update_id):
     return email_context
 
 
-@shared_task
+@shared_task(queue=Queues.PDF)
 def export_to_pdf(id):
     flash_update = FlashUpdate.objects.get(id=id)
     context_for_pdf = get_email_context(flash_update)
     if flash_update.extracted_at is None or flash_update.modified_at > flash_update.extracted_at:
-        pdf = render_to_pdf("email/flash_update/flash_pdf.html", context_for_pdf)
-        # save the generated pdf
-        flash_update.extracted_file.save(pdf["filename"], ContentFile(pdf["file"]), save=False)
-        flash_update.extracted_at = timezone.now()
-        flash_update.save(
-            update_fields=(
-                "extracted_at",
-                "extracted_file",
-            )
-        )
+        get_flash_update_pdf(flash_update, context_for_pdf)
@@ -1,3 +1,4 @@
+import itertools
 import os
 from unittest import mock
 
@@ -12,8 +13,15 @@ from flash_update.factories import (
     FlashGraphicMapFactory,
     FlashUpdateFactory,
 )
-from flash_update.models import FlashEmailSubscriptions, FlashGraphicMap, FlashUpdate
+from flash_update.models import (
+    FlashEmailSubscriptions,
+    FlashGraphicMap,
+    FlashReferences,
+    FlashUpdate,
+    FlashUpdatePdfRender,
+)
 from flash_update.tasks import send_flash_update_email
+from flash_update.utils import get_email_context, get_flash_update_pdf
 from main.factories import GroupFactory
 from main.test_case import APITestCase
 
@@ -305,3 +313,45 @@ class FlashUpdateTest(APITestCase):
         content = response.json()
         self.assertEqual(content["status"], "ready")
         self.assertIsNotNone(content["url"])
+
+    @mock.patch("flash_update.utils.render_to_pdf")
+    def test_flash_update_pdf_render_history(self, render_to_pdf):
+        render_to_pdf.return_value = {"filename": "test.pdf", "file": b"pdf content"}
+        flash_update = FlashUpdateFactory.create(title="Flash update")
+
+        first_render = get_flash_update_pdf(flash_update, get_email_context(flash_update))
+        self.assertEqual(render_to_pdf.call_count, 1)
+        self.assertEqual(flash_update.extracted_file.name, first_render.file.name)
+
+        # Saved without changing the content: the previous PDF is reused
+        flash_update.save()
+        self.assertEqual(get_flash_update_pdf(flash_update, get_email_context(flash_update)), first_render)
+        self.assertEqual(render_to_pdf.call_count, 1)
+
+        for i in range(FlashUpdatePdfRender.HISTORY_SIZE + 1):
+            flash_update.title = f"Flash update {i}"
+            flash_update.save()
+            get_flash_update_pdf(flash_update, get_email_context(flash_update))
+        self.assertEqual(render_to_pdf.call_count, FlashUpdatePdfRender.HISTORY_SIZE + 2)
+        self.assertEqual(flash_update.pdf_renders.count(), FlashUpdatePdfRender.HISTORY_SIZE)
+        self.assertFalse(flash_update.pdf_renders.filter(id=first_render.id).exists())
+
+    @mock.patch("flash_update.utils.render_to_pdf")
+    def test_flash_update_pdf_render_presigned_file_urls(self, render_to_pdf):
+        render_to_pdf.return_value = {"filename": "test.pdf", "file": b"pdf content"}
+        map1, graphic1, document1 = FlashGraphicMapFactory.create_batch(3, created_by=self.user)
+        reference1 = FlashReferences.objects.create(date="2026-10-19", source_description="Source", document=document1)
+        flash_update = FlashUpdateFactory.create(map=[map1], graphics=[graphic1], references=[reference1])
+
+        # Like S3 querystring_auth, each URL is signed again with a new date
+        signed_at = itertools.count()
+        with mock.patch(
+            "django.core.files.storage.FileSystemStorage.url",
+            autospec=True,
+            side_effect=lambda storage, name: f"https://bucket.example.com/{name}?X-Amz-Date={next(signed_at)}",
+        ):
+            first_render = get_flash_update_pdf(flash_update, get_email_context(flash_update))
+            flash_update.save()
+            self.assertEqual(get_flash_update_pdf(flash_update, get_email_context(flash_update)), first_render)
+        self.assertEqual(render_to_pdf.call_count, 1)
+        self.assertEqual(flash_update.pdf_renders.count(), 1)
@@ -1,14 +1,24 @@
+import hashlib
+import json
 import logging
 from io import BytesIO
+from urllib.parse import urlsplit
 
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
 from django.template.loader import render_to_string
+from django.utils import timezone
 from xhtml2pdf import pisa
 
-from flash_update.models import FlashGraphicMap
+from flash_update.models import FlashGraphicMap, FlashUpdatePdfRender
 from main.frontend import get_flash_update_url
 
 logger = logging.getLogger(__name__)
 
+FLASH_PDF_TEMPLATE = "email/flash_update/flash_pdf.html"
+# NOTE: Bump when the PDF template changes, so the existing renders are not reused
+FLASH_PDF_TEMPLATE_VERSION = 1
+
 
 def render_to_pdf(template_src, context_dict={}):
     html = render_to_string(template_src, context_dict)
@@ -60,3 +70,63 @@ def get_email_context(instance):
         "resources": resources,
     }
     return email_context
+
+
+def get_file_path(url):
+    """File URL without the query string, presigned URLs (S3 querystring_auth) change with each call"""
+    return urlsplit(url)._replace(query="", fragment="").geturl() if url else url
+
+
+def get_context_hash(context):
+    context = {
+        **context,
+        "map_list": [{**item, "image": get_file_path(item["image"])} for item in context["map_list"]],
+        "graphic_list": [{**item, "image": get_file_path(item["image"])} for item in context["graphic_list"]],
+        "resources": [
+            {
+                **resource,
+                "flash_file": get_file_path(resource["flash_file"]),
+                "document_details": resource["document_details"]
+                and {**resource["document_details"], "file": get_file_path(resource["document_details"]["file"])},
+            }
+            for resource in context["resources"]
+        ],
+    }
+    data = json.dumps([FLASH_PDF_TEMPLATE, FLASH_PDF_TEMPLATE_VERSION, context], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def get_flash_update_pdf(flash_update, context):
+    """
+    Sets the PDF of the flash update (rendered from the get_email_context context) as its extracted_file.
+    The PDF is only rendered if none of the last renders has the same context, saving (e.g. cosmetic changes)
+    without changing the content does not render it again.
+    """
+    context_hash = get_context_hash(context)
+    pdf_render = FlashUpdatePdfRender.objects.filter(flash_update=flash_update, context_hash=context_hash).first()
+    if pdf_render is None:
+        pdf = render_to_pdf(FLASH_PDF_TEMPLATE, context)
+        if pdf is None:
+            return None
+        pdf_render = FlashUpdatePdfRender(flash_update=flash_update, context_hash=context_hash)
+        pdf_render.file.save(pdf["filename"], ContentFile(pdf["file"]))
+    else:
+        pdf_render.used_at = timezone.now()
+        pdf_render.save(update_fields=("used_at",))
+
+    # Keep a small history of renders
+    for old_render in FlashUpdatePdfRender.objects.filter(flash_update=flash_update).order_by("-used_at")[
+        FlashUpdatePdfRender.HISTORY_SIZE :
+    ]:
+        old_render.file.delete(save=False)
+        old_render.delete()
+
+    flash_update.extracted_file = pdf_render.file.name
+    flash_update.extracted_at = timezone.now()
+    flash_update.save(
+        update_fields=(
+            "extracted_at",
+            "extracted_file",
+        )
+    )
+    return pdf_render
@@ -6,7 +6,7 @@ from django.template.loader import render_to_string
 
 from local_units.bulk_upload import BaseBulkUploadLocalUnit, BulkUploadHealthData
 from local_units.models import LocalUnit, LocalUnitBulkUpload, LocalUnitChangeRequest
-from notifications.notification import send_notification
+from notifications.notification import EmailDispatcher, send_notification
 
 from .utils import (
     get_email_context,
@@ -42,15 +42,17 @@ def send_local_unit_email(local_unit_id: int, new: bool = True):
         email_subject = "Action Required: Local Unit Pending Validation"
         email_type = "Update Local Unit"
 
-    for user in users:
-        # NOTE: Adding the validator email to the context
-        if not user.email:
-            logger.warning(f"Email address not found for validator: {user.get_full_name()}.")
-            return None
-        email_context["validator_email"] = user.email
-        email_context["full_name"] = user.get_full_name()
-        email_body = render_to_string("email/local_units/local_unit.html", email_context)
-        send_notification(email_subject, user.email, email_body, email_type)
+    # NOTE: The validators are notified concurrently
+    with EmailDispatcher():
+        for user in users:
+            # NOTE: Adding the validator email to the context
+            if not user.email:
+                logger.warning(f"Email address not found for validator: {user.get_full_name()}.")
+                return None
+            email_context["validator_email"] = user.email
+            email_context["full_name"] = user.get_full_name()
+            email_body = render_to_string("email/local_units/local_unit.html", email_context)
+            send_notification(email_subject, user.email, email_body, email_type)
 
 
 @shared_task
@@ -34,11 +34,14 @@ class Queues:
     DEFAULT = "default"
     HEAVY = "heavy"
     CRONJOB = "cronjob"
+    # CPU heavy PDF rendering, consumed by a worker with a low concurrency in production (see helm celeryPdf)
+    PDF = "pdf"
 
     DEV_QUEUES = (
         DEFAULT,
         HEAVY,
         CRONJOB,
+        PDF,
     )
 
 
@@ -68,6 +68,12 @@ env = environ.Env(
     EMAIL_USER=(str, None),
     EMAIL_PASS=(str, None),
     DEBUG_EMAIL=(bool, False),  # This was 0/1 before
+    EMAIL_SEND_TIMEOUT=(int, 30),  # Seconds, for the sender API and the SMTP server
+    EMAIL_SEND_MAX_RETRIES=(int, 3),  # Retries of the connection errors and 429/5xx responses
+    EMAIL_SEND_RATE_LIMIT=(float, 10),  # Max emails/second of a process, 0 to disable
+    EMAIL_DISPATCH_THREAD_COUNT=(int, 4),
+    EMAIL_DISPATCH_QUEUE_SIZE=(int, 100),
+    EMAIL_SMTP_POOL_SIZE=(int, 2),
     # TEST_EMAILS=(list, ['im@ifrc.org']), # maybe later
     # Translation
     # Translator Available:
@@ -87,6 +93,8 @@ env = environ.Env(
     CACHE_REDIS_URL=str,
     CACHE_TEST_REDIS_URL=(str, None),
     CACHE_MIDDLEWARE_SECONDS=(int, None),
+    CACHE_MIDDLEWARE_TAGGED_SECONDS=(int, None),
+    API_CACHE_MIDDLEWARE_ENABLED=(bool, False),
     # MOLNIX
     MOLNIX_API_BASE=(str, "https://api.ifrc-staging.rpm.molnix.com/api/"),
     MOLNIX_USERNAME=(str, None),
@@ -100,12 +108,18 @@ env = environ.Env(
     HPC_CREDENTIAL=(str, None),
     APPLICATION_INSIGHTS_INSTRUMENTATION_KEY=(str, None),
     DEBUG_PLAYWRIGHT=(bool, False),
+    PLAYWRIGHT_EXPORT_CONCURRENCY=(int, 2),  # Max PDF exports at the same time in a Celery worker process (not across processes)
+    PLAYWRIGHT_CONTEXT_POOL_SIZE=(int, 4),  # Browser contexts kept for the next exports
+    PLAYWRIGHT_BROWSER_MAX_USES=(int, 100),  # Exports before reconnecting to the browser
     # Pytest (Only required when running tests)
     PYTEST_XDIST_WORKER=(str, None),
     # Elastic-Cache
     ELASTIC_SEARCH_HOST=(str, None),
     ELASTIC_SEARCH_INDEX=(str, "new_index"),
     ELASTIC_SEARCH_TEST_INDEX=(str, "new_test_index"),  # This will be used and cleared by test
+    ELASTIC_SEARCH_BULK_CHUNK_SIZE=(int, 500),
+    ELASTIC_SEARCH_BULK_THREAD_COUNT=(int, 2),
+    ELASTIC_SEARCH_BULK_MAX_RETRIES=(int, 3),  # Retries of the chunks rejected with 429 (Too Many Requests)
     # FTP
     GO_FTPHOST=(str, None),
     GO_FTPUSER=(str, None),
@@ -205,6 +219,9 @@ ALLOWED_HOSTS = [
 SECRET_KEY = env("DJANGO_SECRET_KEY")
 DEBUG = env("DJANGO_DEBUG")
 DEBUG_PLAYWRIGHT = env("DEBUG_PLAYWRIGHT")
+PLAYWRIGHT_EXPORT_CONCURRENCY = env("PLAYWRIGHT_EXPORT_CONCURRENCY")
+PLAYWRIGHT_CONTEXT_POOL_SIZE = env("PLAYWRIGHT_CONTEXT_POOL_SIZE")
+PLAYWRIGHT_BROWSER_MAX_USES = env("PLAYWRIGHT_BROWSER_MAX_USES")
 GO_ENVIRONMENT = env("GO_ENVIRONMENT")
 
 # See if we are inside a test environment
@@ -309,6 +326,8 @@ if DEBUG:
 # Not ready yet to use
 # GRAPHENE = {"SCHEMA": "api.schema.schema"}
 
+# API responses cached per visibility class and invalidated by tags (middlewares/cache.py)
+API_CACHE_MIDDLEWARE_ENABLED = env("API_CACHE_MIDDLEWARE_ENABLED")
 MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -317,9 +336,9 @@ MIDDLEWARE = [
     "django.middleware.locale.LocaleMiddleware",
     # 'middlewares.middlewares.LocaleMiddleware',
     "django.contrib.auth.middleware.AuthenticationMiddleware",
-    # 'middlewares.cache.UpdateCacheForUserMiddleware',
+    *(["middlewares.cache.UpdateCacheForUserMiddleware"] if API_CACHE_MIDDLEWARE_ENABLED else []),
     "django.middleware.common.CommonMiddleware",
-    # 'middlewares.cache.FetchFromCacheForUserMiddleware',
+    *(["middlewares.cache.FetchFromCacheForUserMiddleware"] if API_CACHE_MIDDLEWARE_ENABLED else []),
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -579,6 +598,12 @@ EMAIL_PORT = env("EMAIL_PORT")
 EMAIL_USER = env("EMAIL_USER")
 EMAIL_PASS = env("EMAIL_PASS")
 DEBUG_EMAIL = env("DEBUG_EMAIL")
+EMAIL_SEND_TIMEOUT = env("EMAIL_SEND_TIMEOUT")
+EMAIL_SEND_MAX_RETRIES = env("EMAIL_SEND_MAX_RETRIES")
+EMAIL_SEND_RATE_LIMIT = env("EMAIL_SEND_RATE_LIMIT")
+EMAIL_DISPATCH_THREAD_COUNT = env("EMAIL_DISPATCH_THREAD_COUNT")
+EMAIL_DISPATCH_QUEUE_SIZE = env("EMAIL_DISPATCH_QUEUE_SIZE")
+EMAIL_SMTP_POOL_SIZE = env("EMAIL_SMTP_POOL_SIZE")
 # TEST_EMAILS = env('TEST_EMAILS') # maybe later
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # default 2621440, 2.5MB -> 100MB
@@ -734,6 +759,9 @@ TEST_DIR = os.path.join(BASE_DIR, "main/test_files")
 ELASTIC_SEARCH_HOST = env("ELASTIC_SEARCH_HOST")
 ELASTIC_SEARCH_INDEX = env("ELASTIC_SEARCH_INDEX")
 ELASTIC_SEARCH_TEST_INDEX = env("ELASTIC_SEARCH_TEST_INDEX")
+ELASTIC_SEARCH_BULK_CHUNK_SIZE = env("ELASTIC_SEARCH_BULK_CHUNK_SIZE")
+ELASTIC_SEARCH_BULK_THREAD_COUNT = env("ELASTIC_SEARCH_BULK_THREAD_COUNT")
+ELASTIC_SEARCH_BULK_MAX_RETRIES = env("ELASTIC_SEARCH_BULK_MAX_RETRIES")
 
 # FTP
 GO_FTPHOST = env("GO_FTPHOST")
@@ -817,6 +845,8 @@ REDIS_DEFAULT_LOCK_EXPIRE = 60 * 10  # Lock expires in 10min (in seconds)
 
 if env("CACHE_MIDDLEWARE_SECONDS"):
     CACHE_MIDDLEWARE_SECONDS = env("CACHE_MIDDLEWARE_SECONDS")  # Planned: 600 for staging, 60 from prod
+# Tagged API responses are invalidated using model signals (middlewares/cache.py), so they can be cached longer
+CACHE_MIDDLEWARE_TAGGED_SECONDS = env("CACHE_MIDDLEWARE_TAGGED_SECONDS")
 DISABLE_API_CACHE = env("DISABLE_API_CACHE")
 
 SPECTACULAR_SETTINGS = {
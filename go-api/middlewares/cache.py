@@ -1,8 +1,78 @@
+import copy
+import hashlib
+import re
+import uuid
+
 from django.conf import settings
+from django.core.cache import cache
 from django.middleware.cache import FetchFromCacheMiddleware, UpdateCacheMiddleware
+from django.utils import timezone
+from django.utils.cache import patch_response_headers
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.views import APIView
 
+from api.utils import is_user_ifrc
+from api.visibility_class import get_user_countries
+
+# Endpoints where the response only depends on the visibility class of the user (not on the user itself)
+# NOTE: Only add endpoints here which don't expose user specific data
+VISIBILITY_CLASS_CACHE_PATHS = (
+    "/api/v2/event/",
+    "/api/v2/appeal/",
+    "/api/v2/country/",
+    "/api/v2/field_report/",
+)
+
+
+# Dependency tags of the cached responses, the response is invalidated when any of the tag is bumped.
+# Tags are formatted using the url kwargs, `<model>:*` is bumped on any change of the model.
+# `lookups:*` is bumped on any change of the countries, regions, districts and disaster types, nested everywhere.
+# `day:{today}` changes every day, for the responses with figures relative to the current date.
+# NOTE: Nested data should also be added here, e.g. Event list includes appeals and field reports,
+# and the nested models need a getter in CACHE_TAGS_GETTERS (api/receivers.py)
+CACHE_TAGS_BY_PATH = (
+    (re.compile(r"^/api/v2/event/$"), ("event:*", "appeal:*", "fieldreport:*", "lookups:*", "day:{today}")),
+    (re.compile(r"^/api/v2/event/(?P<pk>\d+)/$"), ("event:{pk}", "lookups:*", "day:{today}")),
+    (re.compile(r"^/api/v2/appeal/$"), ("appeal:*", "event:*", "lookups:*")),
+    (re.compile(r"^/api/v2/country/$"), ("country:*", "lookups:*")),
+    (re.compile(r"^/api/v2/country/(?P<pk>\d+)/$"), ("country:{pk}", "lookups:*")),
+    (re.compile(r"^/api/v2/country/(?P<pk>\d+)/figure/$"), ("country:{pk}", "day:{today}")),
+    (re.compile(r"^/api/v2/field_report/$"), ("fieldreport:*", "lookups:*")),
+    (re.compile(r"^/api/v2/field_report/(?P<pk>\d+)/$"), ("fieldreport:{pk}", "lookups:*")),
+)
+CACHE_TAG_VERSION_KEY = "api-cache-tag-version:{}"
+
+
+def get_cache_tags(path):
+    for path_re, tags in CACHE_TAGS_BY_PATH:
+        if match := path_re.match(path):
+            today = timezone.now().date().isoformat()
+            return [tag.format(today=today, **match.groupdict()) for tag in tags]
+    return []
+
+
+def get_cache_tags_version(tags):
+    """Returns a single version for the current versions of all the given tags"""
+    versions = cache.get_many([CACHE_TAG_VERSION_KEY.format(tag) for tag in tags])
+    tags_version = "|".join(f"{tag}={versions.get(CACHE_TAG_VERSION_KEY.format(tag), 0)}" for tag in tags)
+    return hashlib.sha1(tags_version.encode("utf-8")).hexdigest()[:12]
+
+
+def invalidate_cache_tags(tags):
+    """
+    Bump the version of the given tags, cached responses using any of these tags are not used anymore
+    and are left to expire.
+    """
+    version = uuid.uuid4().hex
+    cache.set_many({CACHE_TAG_VERSION_KEY.format(tag): version for tag in tags}, timeout=None)
+
+
+class VisibilityClass:
+    ANONYMOUS = "anonymous"
+    GUEST = "guest"
+    IFRC = "ifrc"
+    NS = "ns"
+
 
 def check_if_user_is_anonymous(request):
     try:
@@ -12,6 +82,25 @@ def check_if_user_is_anonymous(request):
         return True
 
 
+def get_user_visibility_class(user):
+    """
+    Returns the visibility class of the user, users within the same class see the same data.
+    For NS users the class includes a hash of the user's countries.
+    Returns None if the visibility class can't be resolved.
+    """
+    profile = getattr(user, "profile", None)
+    if profile is None:
+        return None
+    if profile.limit_access_to_guest:
+        return VisibilityClass.GUEST
+    if is_user_ifrc(user):
+        return VisibilityClass.IFRC
+    # NOTE: Some get_for use only UserCountry while others also use Profile.country, so both are part of the key
+    user_country_ids, profile_country_id = get_user_countries(user)
+    countries_key = f"{','.join(map(str, user_country_ids))}|{profile_country_id or ''}"
+    return f"{VisibilityClass.NS}_{hashlib.sha1(countries_key.encode('utf-8')).hexdigest()}"
+
+
 def get_cache_key_prefix(request):
     if settings.DISABLE_API_CACHE:
         return None
@@ -20,19 +109,48 @@ def get_cache_key_prefix(request):
     drf_request = APIView().initialize_request(request)
 
     if check_if_user_is_anonymous(drf_request):
-        return f"{cache_prefix}_anonymous"
+        visibility_class = VisibilityClass.ANONYMOUS
+    elif request.path.startswith(VISIBILITY_CLASS_CACHE_PATHS):
+        visibility_class = get_user_visibility_class(drf_request.user)
+    else:
+        visibility_class = None
+
+    if not visibility_class:
+        return None
+    if tags := get_cache_tags(request.path):
+        return f"{cache_prefix}_{visibility_class}_{get_cache_tags_version(tags)}"
+    return f"{cache_prefix}_{visibility_class}"
+
+
+def copy_for_request(middleware, **attrs):
+    """
+    The middleware instance is shared by the threads of the process,
+    so the per request key prefix and timeout are set on a copy of it.
+    """
+    middleware = copy.copy(middleware)
+    for name, value in attrs.items():
+        setattr(middleware, name, value)
+    return middleware
 
 
 class UpdateCacheForUserMiddleware(UpdateCacheMiddleware):
     def process_response(self, request, response):
-        if key_prefix := get_cache_key_prefix(request):
-            self.key_prefix = key_prefix
-            return super().process_response(request, response)
+        # NOTE: Use the prefix resolved before the view, so data changed meanwhile is not stored with the new tags version
+        key_prefix = getattr(request, "_cache_key_prefix", None) or get_cache_key_prefix(request)
+        if key_prefix:
+            page_timeout = None
+            if settings.CACHE_MIDDLEWARE_TAGGED_SECONDS and get_cache_tags(request.path):
+                # Keep the client side cache short, tagged responses are only invalidated on server side
+                patch_response_headers(response, self.cache_timeout)
+                page_timeout = settings.CACHE_MIDDLEWARE_TAGGED_SECONDS
+            middleware = copy_for_request(self, key_prefix=key_prefix, page_timeout=page_timeout)
+            return super(UpdateCacheForUserMiddleware, middleware).process_response(request, response)
         return response
 
 
 class FetchFromCacheForUserMiddleware(FetchFromCacheMiddleware):
     def process_request(self, request):
         if key_prefix := get_cache_key_prefix(request):
-            self.key_prefix = key_prefix
-            return super().process_request(request)
+            request._cache_key_prefix = key_prefix
+            middleware = copy_for_request(self, key_prefix=key_prefix)
+            return super(FetchFromCacheForUserMiddleware, middleware).process_request(request)
@@ -1,6 +1,9 @@
 import base64
+import queue
 import smtplib
 import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
@@ -14,46 +17,139 @@ from notifications.models import NotificationGUID
 
 EMAIL_TO = "no-reply@ifrc.org"
 IS_PROD = settings.GO_ENVIRONMENT == "production"
+# Sender API responses worth another try
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
+_local = threading.local()
 
-class SendMail(threading.Thread):
-    def __init__(self, recipients, msg, **kwargs):
-        self.recipients = recipients
-        self.msg = msg
-        super(SendMail, self).__init__(**kwargs)
 
-    def run(self):
-        try:
-            server = smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT)
-            server.ehlo()
-            if settings.EMAIL_USE_TLS:
-                server.starttls()
-            server.ehlo()
-            succ = server.login(settings.EMAIL_USER, settings.EMAIL_PASS)
-            if "successful" not in str(succ[1]):
-                cron_rec = {
-                    "name": "notification",
-                    "message": "Error contacting " + settings.EMAIL_HOST + " smtp server for notifications",
-                    "status": CronJobStatus.ERRONEOUS,
-                }
-                CronJob.sync_cron(cron_rec)
-            if len(self.recipients) > 0:
-                server.sendmail(settings.EMAIL_USER, self.recipients, self.msg.as_string())
-            server.quit()
-            logger.info("E-mails were sent successfully.")
-        except Exception as exc:
-            logger.error("Could not send emails with Python smtlib", exc_info=True)
-            ex = ""
-            try:
-                ex = str(exc.args)
-            except Exception as exctwo:
-                logger.warning(exctwo.args)
+def get_http_session():
+    """Keep-alive session of the current thread for the sender API"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def get_retry_delay(attempt):
+    """Exponential backoff: 1, 2, 4... seconds"""
+    return min(2**attempt, 60)
+
+
+class RateLimiter:
+    """Spaces out the calls of all the threads to at most `rate` per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class SMTPConnectionPool:
+    """Logged in SMTP connections, reused by the emails instead of a new connection per email"""
+
+    def __init__(self, size):
+        self.connections = queue.LifoQueue(maxsize=size)
+
+    @staticmethod
+    def connect():
+        server = smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT, timeout=settings.EMAIL_SEND_TIMEOUT)
+        server.ehlo()
+        if settings.EMAIL_USE_TLS:
+            server.starttls()
+        server.ehlo()
+        succ = server.login(settings.EMAIL_USER, settings.EMAIL_PASS)
+        if "successful" not in str(succ[1]):
             cron_rec = {
                 "name": "notification",
-                "message": "Error sending out email with Python smtplib: {}".format(ex),
+                "message": "Error contacting " + settings.EMAIL_HOST + " smtp server for notifications",
                 "status": CronJobStatus.ERRONEOUS,
             }
             CronJob.sync_cron(cron_rec)
+        return server
+
+    @staticmethod
+    def close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def get(self):
+        while True:
+            try:
+                server = self.connections.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            # The server might have dropped the idle connection meanwhile
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close(server)
+
+    def put(self, server):
+        try:
+            self.connections.put_nowait(server)
+        except queue.Full:
+            self.close(server)
+
+    def sendmail(self, recipients, msg):
+        server = self.get()
+        try:
+            server.sendmail(settings.EMAIL_USER, recipients, msg.as_string())
+        except Exception:
+            self.close(server)
+            raise
+        self.put(server)
+
+
+SEND_RATE_LIMITER = RateLimiter(settings.EMAIL_SEND_RATE_LIMIT)
+SMTP_POOL = SMTPConnectionPool(settings.EMAIL_SMTP_POOL_SIZE)
+# The SMTP emails are sent in the background, from as many threads as pooled connections
+SMTP_EXECUTOR = ThreadPoolExecutor(max_workers=settings.EMAIL_SMTP_POOL_SIZE, thread_name_prefix="smtp")
+
+
+def send_smtp_email(recipients, msg):
+    if len(recipients) == 0:
+        return
+    max_retries = settings.EMAIL_SEND_MAX_RETRIES
+    try:
+        for attempt in range(max_retries + 1):
+            SEND_RATE_LIMITER.wait()
+            try:
+                SMTP_POOL.sendmail(recipients, msg)
+                break
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError):
+                if attempt == max_retries:
+                    raise
+                logger.warning("Could not send emails with Python smtlib, retrying", exc_info=True)
+                time.sleep(get_retry_delay(attempt))
+        logger.info("E-mails were sent successfully.")
+    except Exception as exc:
+        logger.error("Could not send emails with Python smtlib", exc_info=True)
+        ex = ""
+        try:
+            ex = str(exc.args)
+        except Exception as exctwo:
+            logger.warning(exctwo.args)
+        cron_rec = {
+            "name": "notification",
+            "message": "Error sending out email with Python smtplib: {}".format(ex),
+            "status": CronJobStatus.ERRONEOUS,
+        }
+        CronJob.sync_cron(cron_rec)
 
 
 def construct_msg(subject, html):
@@ -72,8 +168,151 @@ def construct_msg(subject, html):
     return msg
 
 
+def get_api_payload(subject, to_addresses, html):
+    recipients_as_string = ",".join(to_addresses)
+    # Encode with base64 into bytes, then converting it back to strings for the JSON
+    payload = {
+        "FromAsBase64": str(base64.b64encode(settings.EMAIL_USER.encode("utf-8")), "utf-8"),
+        "ToAsBase64": str(base64.b64encode(EMAIL_TO.encode("utf-8")), "utf-8"),
+        "CcAsBase64": "",
+        "BccAsBase64": str(base64.b64encode(recipients_as_string.encode("utf-8")), "utf-8"),
+        "SubjectAsBase64": str(base64.b64encode(subject.encode("utf-8")), "utf-8"),
+        "BodyAsBase64": str(base64.b64encode(html.encode("utf-8")), "utf-8"),
+        "IsBodyHtml": True,
+        "TemplateName": "",
+        "TemplateLanguage": "",
+    }
+    if len(to_addresses) == 1:
+        payload["ToAsBase64"] = payload["BccAsBase64"]  # if 1 addressee, no BCC anonimization needed.
+        payload["BccAsBase64"] = ""
+    return payload
+
+
+def post_email_api(payload):
+    """POST to the sender API, retrying the connection errors and 429/5xx responses with an exponential backoff"""
+    max_retries = settings.EMAIL_SEND_MAX_RETRIES
+    for attempt in range(max_retries + 1):
+        SEND_RATE_LIMITER.wait()
+        try:
+            res = get_http_session().post(settings.EMAIL_API_ENDPOINT, json=payload, timeout=settings.EMAIL_SEND_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            logger.warning("Could not reach the e-mail sender API, retrying", exc_info=True)
+        else:
+            if res.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                return res
+            logger.warning(f"The e-mail sender API responded with status code ({res.status_code}), retrying")
+        time.sleep(get_retry_delay(attempt))
+
+
+def send_api_email(subject, to_addresses, html, mailtype=""):
+    """
+    Sends the email with the sender API, or with Python smtplib (in the background) if the API fails.
+    Returns the response text and the unsaved NotificationGUID of the sent email (None if the API failed)
+    """
+    recipients_as_string = ",".join(to_addresses)
+    try:
+        # The response contains the GUID (res.text)
+        res = post_email_api(get_api_payload(subject, to_addresses, html))
+    except requests.RequestException:
+        logger.error("Email send failed using API", exc_info=True)
+        SMTP_EXECUTOR.submit(send_smtp_email, to_addresses, construct_msg(subject, html))
+        return None, None
+    res_text = res.text.replace('"', "")
+
+    if res.status_code == 200:
+        logger.info("Subject: {subject}, Recipients: {recs}".format(subject=subject, recs=recipients_as_string))
+
+        logger.info("GUID: {}".format(res_text))
+        logger.info("E-mails were sent successfully.")
+        # Saving GUID into a table so that the API can be queried with it to get info about
+        # if the actual sending has failed or not.
+        return res.text, NotificationGUID(
+            api_guid=res_text, email_type=mailtype, to_list=f"To: {EMAIL_TO}; Bcc: {recipients_as_string}"
+        )
+
+    logger.error(
+        f"Email send failed using API, status code: ({res.status_code})",
+        extra={
+            "content": res.content,
+        },
+    )
+    # Try sending with Python smtplib, if reaching the API fails
+    logger.warning(f"Authorization/authentication failed ({res.status_code}) to the e-mail sender API.")
+    SMTP_EXECUTOR.submit(send_smtp_email, to_addresses, construct_msg(subject, html))
+    return res.text, None
+
+
+class EmailDispatcher:
+    """
+    While active (with EmailDispatcher(): ...), send_notification of the current thread queues the emails
+    instead of sending them one after the other. They are sent from thread_count threads and send_notification
+    only blocks when queue_size emails are already waiting. The NotificationGUIDs are saved with bulk_create,
+    batch_size at a time. Every queued email is sent when the block exits.
+    """
+
+    def __init__(self, thread_count=None, queue_size=None, batch_size=100):
+        self.thread_count = thread_count or settings.EMAIL_DISPATCH_THREAD_COUNT
+        self.queue_size = queue_size or settings.EMAIL_DISPATCH_QUEUE_SIZE
+        self.batch_size = batch_size
+        self.executor = None
+        self.pending = set()
+        self.guids = []
+        self.previous = None
+
+    @staticmethod
+    def get_current():
+        return getattr(_local, "dispatcher", None)
+
+    def __enter__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.thread_count, thread_name_prefix="email-dispatch")
+        self.previous = self.get_current()
+        _local.dispatcher = self
+        return self
+
+    def __exit__(self, *args):
+        _local.dispatcher = self.previous
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+    def submit(self, subject, to_addresses, html, mailtype=""):
+        if len(self.pending) >= self.thread_count + self.queue_size:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+        self.pending.add(self.executor.submit(send_api_email, subject, to_addresses, html, mailtype))
+
+    def _collect(self, futures):
+        for future in futures:
+            try:
+                _, guid = future.result()
+            except Exception:
+                logger.error("Could not send email", exc_info=True)
+                continue
+            if guid is not None:
+                self.guids.append(guid)
+        if len(self.guids) >= self.batch_size:
+            self.save_guids()
+
+    def save_guids(self):
+        if self.guids:
+            NotificationGUID.objects.bulk_create(self.guids)
+            self.guids = []
+
+    def flush(self):
+        """Waits for the queued emails"""
+        self._collect(wait(self.pending).done)
+        self.pending = set()
+        self.save_guids()
+
+
 def send_notification(subject, recipients, html, mailtype="", files=None):
-    """Generic email sending method, handly only HTML emails currently"""
+    """
+    Generic email sending method, handly only HTML emails currently.
+    Queued to the active EmailDispatcher of the thread if any (returning None), sent right away otherwise.
+    """
     if not settings.EMAIL_USER or not settings.EMAIL_API_ENDPOINT:
         logger.warning("Cannot send notifications.\n" "No username and/or API endpoint set as environment variables.")
         if settings.DEBUG:
@@ -89,7 +328,7 @@ def send_notification(subject, recipients, html, mailtype="", files=None):
     if settings.FORCE_USE_SMTP:
         logger.info("Forcing SMPT usage for sending emails.")
         msg = construct_msg(subject, html)
-        SendMail(recipients, msg).start()
+        SMTP_EXECUTOR.submit(send_smtp_email, recipients, msg)
         return
 
     if "?" not in settings.EMAIL_API_ENDPOINT:  # a.k.a dirty disabling email sending
@@ -127,46 +366,12 @@ def send_notification(subject, recipients, html, mailtype="", files=None):
             logger.info("Recipients string is empty")
         return  # If there are no recipients it's unnecessary to send out the email
 
-    # Encode with base64 into bytes, then converting it back to strings for the JSON
-    payload = {
-        "FromAsBase64": str(base64.b64encode(settings.EMAIL_USER.encode("utf-8")), "utf-8"),
-        "ToAsBase64": str(base64.b64encode(EMAIL_TO.encode("utf-8")), "utf-8"),
-        "CcAsBase64": "",
-        "BccAsBase64": str(base64.b64encode(recipients_as_string.encode("utf-8")), "utf-8"),
-        "SubjectAsBase64": str(base64.b64encode(subject.encode("utf-8")), "utf-8"),
-        "BodyAsBase64": str(base64.b64encode(html.encode("utf-8")), "utf-8"),
-        "IsBodyHtml": True,
-        "TemplateName": "",
-        "TemplateLanguage": "",
-    }
-    if len(to_addresses) == 1:
-        payload["ToAsBase64"] = payload["BccAsBase64"]  # if 1 addressee, no BCC anonimization needed.
-        payload["BccAsBase64"] = ""
-
-    # The response contains the GUID (res.text)
-    res = requests.post(settings.EMAIL_API_ENDPOINT, json=payload)
-    res_text = res.text.replace('"', "")
-
-    if res.status_code == 200:
-        logger.info("Subject: {subject}, Recipients: {recs}".format(subject=subject, recs=recipients_as_string))
-
-        logger.info("GUID: {}".format(res_text))
-        # Saving GUID into a table so that the API can be queried with it to get info about
-        # if the actual sending has failed or not.
-        NotificationGUID.objects.create(
-            api_guid=res_text, email_type=mailtype, to_list=f"To: {EMAIL_TO}; Bcc: {recipients_as_string}"
-        )
+    dispatcher = EmailDispatcher.get_current()
+    if dispatcher is not None:
+        dispatcher.submit(subject, to_addresses, html, mailtype)
+        return
 
-        logger.info("E-mails were sent successfully.")
-    else:
-        logger.error(
-            f"Email send failed using API, status code: ({res.status_code})",
-            extra={
-                "content": res.content,
-            },
-        )
-        # Try sending with Python smtplib, if reaching the API fails
-        logger.warning(f"Authorization/authentication failed ({res.status_code}) to the e-mail sender API.")
-        msg = construct_msg(subject, html)
-        SendMail(to_addresses, msg).start()
-    return res.text
+    res_text, guid = send_api_email(subject, to_addresses, html, mailtype)
+    if guid is not None:
+        guid.save()
+    return res_text
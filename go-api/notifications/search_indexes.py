@@ -26,4 +26,4 @@ class SurgeIndex(indexes.SearchIndex, indexes.Indexable):
         return [molnix.name for molnix in obj.molnix_tags.all()]
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related("event", "country").prefetch_related("molnix_tags")
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from notifications.models import Subscription
+
+
+class SubscriptionIndex:
+    """
+    Inverted index of the subscriptions of the active users, built from a single Subscription scan.
+    Used to resolve the notification recipients with set operations on user ids.
+    """
+
+    def __init__(self):
+        # (rtype, stype) -> user ids
+        self.users_by_type = defaultdict(set)
+        # rtype -> user ids
+        self.users_by_rtype = defaultdict(set)
+        # lookup_id (e.g. c123, r4, d7) -> user ids
+        self.users_by_lookup_id = defaultdict(set)
+        self.emails = {}
+
+        subscriptions_qs = Subscription.objects.filter(user__is_active=True).values_list(
+            "user_id", "user__email", "rtype", "stype", "lookup_id"
+        )
+        for user_id, email, rtype, stype, lookup_id in subscriptions_qs.iterator(chunk_size=5000):
+            self.emails[user_id] = email
+            self.users_by_type[(rtype, stype)].add(user_id)
+            self.users_by_rtype[rtype].add(user_id)
+            if lookup_id:
+                self.users_by_lookup_id[lookup_id].add(user_id)
+
+    def get_users(self, rtype, stype):
+        return self.users_by_type.get((rtype, stype), set())
+
+    def get_users_by_rtypes(self, rtypes):
+        return set().union(*(self.users_by_rtype.get(rtype, set()) for rtype in rtypes))
+
+    def get_users_by_lookup_ids(self, lookup_ids):
+        return set().union(*(self.users_by_lookup_id.get(lookup_id, set()) for lookup_id in lookup_ids))
+
+    def get_emails(self, user_ids):
+        return list({self.emails[user_id] for user_id in user_ids})
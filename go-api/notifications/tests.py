@@ -1,17 +1,37 @@
+import base64
+import json
+import threading
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
 from django.conf import settings
+from django.test import override_settings
 from django.utils import timezone
 from modeltranslation.utils import build_localized_fieldname
 
 from api.factories.country import CountryFactory
+from api.factories.event import AppealFactory, EventFactory
+from api.factories.field_report import FieldReportFactory
 from api.factories.region import RegionFactory
+from api.models import AppealType, VisibilityChoices
 from deployments.factories.molnix_tag import MolnixTagFactory
 from lang.serializers import TranslatedModelSerializerMixin
 from main.test_case import APITestCase
 from notifications.factories import SurgeAlertFactory
 from notifications.management.commands.ingest_alerts import categories, timeformat
-from notifications.models import SurgeAlert, SurgeAlertStatus, SurgeAlertType
+from notifications.models import (
+    NotificationGUID,
+    SurgeAlert,
+    SurgeAlertStatus,
+    SurgeAlertType,
+)
+from notifications.notification import (
+    EmailDispatcher,
+    SMTPConnectionPool,
+    send_notification,
+)
+from notifications.weekly_digest import WeeklyDigest
 
 
 class NotificationTestCase(APITestCase):
@@ -215,3 +235,136 @@ class SurgeAlertFilteringTest(APITestCase):
         response = _fetch(dict({"molnix_status": _to_csv(SurgeAlertStatus.STOOD_DOWN, SurgeAlertStatus.OPEN)}))
         self.assertEqual(response["count"], 2)
         self.assertEqual(response["results"][0]["molnix_status"], SurgeAlertStatus.STOOD_DOWN)
+
+
+class EmailAPIStandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in of the e-mail sender API, responding with the queued status codes (then 200) and a GUID"""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.payloads.append(payload)
+            status_code = self.server.status_codes.pop(0) if self.server.status_codes else 200
+            body = f'"guid-{len(self.server.payloads)}"'.encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch("notifications.notification.get_retry_delay", return_value=0)
+class EmailDispatchTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), EmailAPIStandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.payloads = []
+        self.server.status_codes = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.email_settings = override_settings(
+            EMAIL_USER="go@example.com",
+            EMAIL_API_ENDPOINT=f"http://127.0.0.1:{self.server.server_port}/send?key=test",
+            FORCE_USE_SMTP=False,
+            DEBUG_EMAIL=False,
+        )
+        self.email_settings.enable()
+
+    def tearDown(self):
+        self.email_settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def get_recipients(self):
+        return {base64.b64decode(payload["ToAsBase64"]).decode() for payload in self.server.payloads}
+
+    def test_send_notification(self, *_):
+        # Retried after the 503
+        self.server.status_codes = [503]
+        send_notification("Subject", "user@example.com", "<p>Hello</p>", "Test")
+        self.assertEqual(len(self.server.payloads), 2)
+        self.assertEqual(self.get_recipients(), {"user@example.com"})
+        guid = NotificationGUID.objects.get()
+        self.assertEqual(guid.api_guid, "guid-2")
+        self.assertEqual(guid.email_type, "Test")
+
+    def test_email_dispatcher(self, *_):
+        self.server.status_codes = [429]
+        with EmailDispatcher(thread_count=2, queue_size=1, batch_size=2):
+            for i in range(5):
+                self.assertIsNone(send_notification(f"Subject {i}", [f"user{i}@example.com"], "<p>Hello</p>", "Test"))
+        self.assertEqual(len(self.server.payloads), 6)
+        self.assertEqual(self.get_recipients(), {f"user{i}@example.com" for i in range(5)})
+        self.assertEqual(NotificationGUID.objects.count(), 5)
+        self.assertEqual(
+            set(NotificationGUID.objects.values_list("to_list", flat=True)),
+            {f"To: no-reply@ifrc.org; Bcc: user{i}@example.com" for i in range(5)},
+        )
+
+    @mock.patch("notifications.notification.smtplib.SMTP")
+    def test_smtp_connection_pool(self, smtp_mock, *_):
+        server = smtp_mock.return_value
+        server.login.return_value = (235, b"2.7.0 Authentication successful")
+        server.noop.return_value = (250, b"OK")
+        msg = mock.Mock(**{"as_string.return_value": "message"})
+
+        pool = SMTPConnectionPool(size=1)
+        pool.sendmail(["user1@example.com"], msg)
+        pool.sendmail(["user2@example.com"], msg)
+        # The connection is reused
+        self.assertEqual(smtp_mock.call_count, 1)
+        self.assertEqual(server.sendmail.call_count, 2)
+
+        # Reconnects when the server dropped the idle connection
+        server.noop.side_effect = ConnectionResetError
+        pool.sendmail(["user3@example.com"], msg)
+        self.assertEqual(smtp_mock.call_count, 2)
+
+
+class WeeklyDigestTest(APITestCase):
+    def test_weekly_digest(self):
+        today = timezone.now()
+        country = CountryFactory.create(name="Country 1")
+        event = EventFactory.create(is_featured=True, updated_at=today)
+        for atype, amount_requested, amount_funded in (
+            (AppealType.DREF, 100, 50),
+            (AppealType.APPEAL, 1000, 250),
+            (AppealType.APPEAL, 1000, 750),
+        ):
+            AppealFactory.create(
+                event=event,
+                country=country,
+                atype=atype,
+                amount_requested=amount_requested,
+                amount_funded=amount_funded,
+                end_date=today + timedelta(days=30),
+            )
+        public_report = FieldReportFactory.create(event=event, summary="Public report", visibility=VisibilityChoices.PUBLIC)
+        public_report.countries.set([country])
+        ifrc_report = FieldReportFactory.create(event=event, summary="IFRC report", visibility=VisibilityChoices.IFRC)
+
+        digest = WeeklyDigest(today)
+        # Same number of queries whatever the number of records
+        with self.assertNumQueries(9):
+            context = digest.get_context()
+        self.assertEqual(context["active_dref"], 1)
+        self.assertEqual(context["active_ea"], 2)
+        self.assertEqual(context["funding_coverage"], 50)
+        self.assertEqual(len(context["highlighted_ops"]), 1)
+        self.assertEqual(context["highlighted_ops"][0]["hl_funding"], 2100)
+        self.assertEqual(len(context["latest_ops"]), 3)
+        self.assertEqual(
+            {(fr["id"], fr["country"]) for fr in context["latest_field_reports"]},
+            {(public_report.id, "Country 1"), (ifrc_report.id, None)},
+        )
+
+        ifrc_html = digest.render("weekly digest", is_ifrc=True)
+        non_ifrc_html = digest.render("weekly digest", is_ifrc=False)
+        self.assertIn("Public report", ifrc_html)
+        self.assertIn("IFRC report", ifrc_html)
+        self.assertIn("Public report", non_ifrc_html)
+        self.assertNotIn("IFRC report", non_ifrc_html)
@@ -0,0 +1,200 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.template.loader import render_to_string
+
+from api.models import Appeal, AppealType, Event, FieldReport, VisibilityChoices
+from deployments.models import ERU, Personnel, PersonnelDeployment
+from notifications.hello import get_hello
+
+WEEKLY_DIGEST_TEMPLATE = "design/weekly_digest.html"
+
+
+class WeeklyDigest:
+    """
+    Snapshot of the weekly digest of the week before `today`.
+    The context is built once, with a fixed number of queries, and stored in the cache,
+    then the email is rendered once per variant: IFRC, and non-IFRC without the IFRC only field reports.
+    """
+
+    CACHE_KEY = "weekly-digest:{}"
+    CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+    def __init__(self, today):
+        self.today = today
+        self.since = today - timedelta(days=7)
+        self.cache_key = self.CACHE_KEY.format(today.strftime("%Y-%m-%d"))
+
+    def get_figures(self):
+        ongoing_appeals = Appeal.objects.filter(end_date__gt=self.today)
+        emergency_appeals = Q(atype__in=[AppealType.APPEAL, AppealType.INTL])
+        figures = ongoing_appeals.aggregate(
+            active_dref=Count("id", filter=Q(atype=AppealType.DREF)),
+            active_ea=Count("id", filter=Q(atype=AppealType.APPEAL)),
+            ea_amount_requested=Sum("amount_requested", filter=emergency_appeals),
+            ea_amount_funded=Sum("amount_funded", filter=emergency_appeals),
+            amount_requested=Sum("amount_requested"),
+            num_beneficiaries=Sum("num_beneficiaries"),
+        )
+        amount_req = figures["ea_amount_requested"] or 0
+        amount_fund = figures["ea_amount_funded"] or 0
+        return {
+            "active_dref": figures["active_dref"],
+            "active_ea": figures["active_ea"],
+            "funding_coverage": float(round(amount_fund / amount_req, 3) * 100) if amount_req != 0 else 0,
+            "budget": round((figures["amount_requested"] or 0) / 1000000, 2),
+            "population": round((figures["num_beneficiaries"] or 0) / 1000000, 2),
+        }
+
+    def get_highlights(self):
+        events = list(Event.objects.filter(is_featured=True, updated_at__gte=self.since).order_by("-updated_at"))
+        event_ids = [ev.id for ev in events]
+        appeal_figures = {
+            row["event_id"]: row
+            for row in Appeal.objects.filter(event_id__in=event_ids)
+            .order_by()
+            .values("event_id")
+            .annotate(
+                amount_requested=Sum("amount_requested"),
+                amount_funded=Sum("amount_funded"),
+                num_beneficiaries=Sum("num_beneficiaries"),
+            )
+        }
+        eru_units = dict(
+            ERU.objects.filter(event_id__in=event_ids)
+            .order_by()
+            .values("event_id")
+            .annotate(Sum("units"))
+            .values_list("event_id", "units__sum")
+        )
+        deployment_counts = dict(
+            PersonnelDeployment.objects.filter(event_deployed_to_id__in=event_ids)
+            .order_by()
+            .values("event_deployed_to_id")
+            .annotate(Count("id"))
+            .values_list("event_deployed_to_id", "id__count")
+        )
+
+        highlights = []
+        for ev in events:
+            figures = appeal_figures.get(ev.id, {})
+            amount_requested = figures.get("amount_requested") or "--"
+            amount_funded = figures.get("amount_funded") or "--"
+            coverage = "--"
+            if amount_funded != "--" and amount_requested != "--":
+                coverage = round(amount_funded / amount_requested, 1) if amount_requested != 0 else 0
+            highlights.append(
+                {
+                    "hl_id": ev.id,
+                    "hl_name": ev.name,
+                    "hl_last_update": ev.updated_at,
+                    "hl_people": figures.get("num_beneficiaries") or "--",
+                    "hl_funding": amount_requested,
+                    "hl_deployed_eru": eru_units.get(ev.id) or "--",
+                    "hl_deployed_sp": deployment_counts.get(ev.id, 0),
+                    "hl_coverage": coverage,
+                }
+            )
+        return highlights
+
+    def get_latest_ops(self):
+        ops = Appeal.objects.filter(created_at__gte=self.since).select_related("country").order_by("-created_at")
+        return [
+            {
+                "op_event_id": op.event_id,
+                "op_country": op.country.name if op.country else "",
+                "op_name": op.name,
+                "op_created_at": op.created_at,
+                "op_funding": float(op.amount_requested),
+            }
+            for op in ops
+        ]
+
+    def get_latest_deployments(self):
+        personnel_qs = (
+            Personnel.objects.filter(start_date__gte=self.since)
+            .select_related("deployment__event_deployed_to", "country_from")
+            .order_by("start_date")
+        )
+        deployments = []
+        for pers in personnel_qs:
+            event = pers.deployment.event_deployed_to
+            deployments.append(
+                {
+                    "operation": event.name if event else "",
+                    "event_url": (
+                        "{}/emergencies/{}".format(settings.FRONTEND_URL, event.id) if event else settings.FRONTEND_URL
+                    ),
+                    "society_from": pers.country_from.society_name if pers.country_from else "",
+                    "name": pers.name,
+                    "role": pers.role,
+                    "start_date": pers.start_date,
+                    "end_date": pers.end_date,
+                }
+            )
+        return deployments
+
+    def get_latest_field_reports(self):
+        field_reports = (
+            FieldReport.objects.filter(created_at__gte=self.since).prefetch_related("countries").order_by("-created_at")
+        )
+        latest_field_reports = []
+        for fr in field_reports:
+            countries = fr.countries.all()
+            latest_field_reports.append(
+                {
+                    "id": fr.id,
+                    "country": countries[0].name if countries else None,
+                    "summary": fr.summary,
+                    "created_at": fr.created_at,
+                    "visibility": fr.visibility,
+                }
+            )
+        return latest_field_reports
+
+    def build_context(self):
+        return {
+            "resource_uri": settings.FRONTEND_URL,
+            **self.get_figures(),
+            "highlighted_ops": self.get_highlights(),
+            "latest_ops": self.get_latest_ops(),
+            "latest_deployments": self.get_latest_deployments(),
+            "latest_field_reports": self.get_latest_field_reports(),
+        }
+
+    def get_context(self):
+        context = cache.get(self.cache_key)
+        if context is None:
+            context = self.build_context()
+            cache.set(self.cache_key, context, self.CACHE_TIMEOUT)
+        return context
+
+    def render(self, subject, is_ifrc):
+        variant_cache_key = f"{self.cache_key}:{'ifrc' if is_ifrc else 'non-ifrc'}"
+        html = cache.get(variant_cache_key)
+        if html is not None:
+            return html
+
+        record = self.get_context()
+        if not is_ifrc:
+            record = {
+                **record,
+                "latest_field_reports": [
+                    fr for fr in record["latest_field_reports"] if fr["visibility"] != VisibilityChoices.IFRC
+                ],
+            }
+        html = render_to_string(
+            WEEKLY_DIGEST_TEMPLATE,
+            {
+                "hello": get_hello(),
+                "count": 0,
+                "records": [record],
+                "is_staff": True,
+                "subject": subject,
+                "hide_preferences": False,
+            },
+        )
+        cache.set(variant_cache_key, html, self.CACHE_TIMEOUT)
+        return html
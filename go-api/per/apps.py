@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class PerConfig(AppConfig):
     name = "per"
     verbose_name = _("per")
+
+    def ready(self):
+        import per.receivers  # noqa: F401
@@ -3,13 +3,16 @@ import json
 import typing
 
 import django_filters
+from django.core.cache import cache
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Count, Prefetch
 
+from middlewares.cache import get_cache_tags_version, invalidate_cache_tags
 from per.models import (
     OpsLearningCacheResponse,
     OpsLearningComponentCacheResponse,
     OpsLearningSectorCacheResponse,
+    PerPublicDataSnapshot,
 )
 
 
@@ -73,3 +76,45 @@ class OpslearningSummaryCacheHelper:
             defaults={"status": OpsLearningCacheResponse.Status.PENDING},
         )
         return ops_learning_summary, filter_data
+
+
+class PerPublicDataCacheHelper:
+    """
+    Cache for the consolidated public PER endpoints.
+    The cached data is invalidated (using the `per:*` cache tag) when any of the PER assessment data is changed.
+    """
+
+    CACHE_TAGS = ["per:*"]
+    CACHE_KEY = "per-public-data:{name}:{version}"
+    # NOTE: Data is invalidated on change, the timeout is only to clean up
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    @classmethod
+    def get_or_set(cls, name, default):
+        key = cls.CACHE_KEY.format(name=name, version=get_cache_tags_version(cls.CACHE_TAGS))
+        return cache.get_or_set(key, default, timeout=cls.CACHE_TIMEOUT)
+
+    @classmethod
+    def invalidate(cls):
+        invalidate_cache_tags(cls.CACHE_TAGS)
+
+
+class PerPublicDataSnapshotHelper:
+    @staticmethod
+    def save(snapshot_type: PerPublicDataSnapshot.Type, data: dict) -> PerPublicDataSnapshot:
+        snapshot, _ = PerPublicDataSnapshot.objects.update_or_create(
+            type=snapshot_type,
+            defaults={
+                "data": data,
+                "etag": OpslearningSummaryCacheHelper.generate_hash(data),
+            },
+        )
+        return snapshot
+
+    @classmethod
+    def get_or_build(cls, snapshot_type: PerPublicDataSnapshot.Type, build) -> PerPublicDataSnapshot:
+        """Return the snapshot, the first one is built in the request (next ones are built by the celery task)"""
+        snapshot = PerPublicDataSnapshot.objects.filter(type=snapshot_type).first()
+        if snapshot is None:
+            snapshot = cls.save(snapshot_type, build())
+        return snapshot
@@ -6,6 +6,7 @@ from django.db import transaction
 from django.db.models import Count, F, Prefetch, Q
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 from django.utils.translation import get_language as django_get_language
 from django_filters import rest_framework as filters
 from django_filters.widgets import CSVWidget
@@ -24,7 +25,11 @@ from api.models import Country, Region
 from deployments.models import SectorTag
 from main.permissions import DenyGuestUserMutationPermission, DenyGuestUserPermission
 from main.utils import SpreadSheetContentNegotiation
-from per.cache import OpslearningSummaryCacheHelper
+from per.cache import (
+    OpslearningSummaryCacheHelper,
+    PerPublicDataCacheHelper,
+    PerPublicDataSnapshotHelper,
+)
 from per.filter_set import (
     PerDocumentFilter,
     PerOverviewFilter,
@@ -66,6 +71,7 @@ from .models import (
     PerComponentRating,
     PerDocumentUpload,
     PerFile,
+    PerPublicDataSnapshot,
     PerWorkPlan,
 )
 from .serializers import (
@@ -146,6 +152,14 @@ def _phase_display_from_int(phase: int | None, existing_display: str | None = No
     return disp
 
 
+def _snapshot_response(request, snapshot: PerPublicDataSnapshot) -> Response:
+    """Response for the snapshot data, with ETag (304 if the client already has the same data)"""
+    etag = f'"{snapshot.etag}"'
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=drf_status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(snapshot.data, headers={"ETag": etag})
+
+
 class PERDocsFilter(filters.FilterSet):
     id = filters.NumberFilter(field_name="id", lookup_expr="exact")
 
@@ -668,11 +682,57 @@ class PerMapDataView(views.APIView):
     """
 
     def get(self, request):
-        latest_overviews = (
+        return Response({"results": PerPublicDataCacheHelper.get_or_set("map-data", self.get_items)})
+
+    @staticmethod
+    def get_latest_relations(overview_ids):
+        """
+        Return the first assessment (with area and component responses) and the first prioritization
+        (with prioritized components) of each overview, using a constant number of queries.
+        """
+        # NOTE: Same records as `.filter(overview_id=...).first()`, first record by pk of each overview
+        assessments = PerAssessment.objects.filter(
+            pk__in=PerAssessment.objects.filter(overview_id__in=overview_ids)
+            .order_by("overview_id", "pk")
+            .distinct("overview_id")
+            .values("pk")
+        ).prefetch_related(
+            Prefetch(
+                "area_responses",
+                queryset=AreaResponse.objects.prefetch_related(
+                    Prefetch(
+                        "component_response",
+                        queryset=FormComponentResponse.objects.select_related("component", "component__area", "rating"),
+                    )
+                ),
+            )
+        )
+        prioritizations = FormPrioritization.objects.filter(
+            pk__in=FormPrioritization.objects.filter(overview_id__in=overview_ids)
+            .order_by("overview_id", "pk")
+            .distinct("overview_id")
+            .values("pk")
+        ).prefetch_related(
+            Prefetch(
+                "prioritized_action_responses",
+                queryset=FormPrioritizationComponent.objects.exclude(component_id=14).select_related(
+                    "component", "component__area"
+                ),
+            )
+        )
+        return (
+            {assessment.overview_id: assessment for assessment in assessments},
+            {prioritization.overview_id: prioritization for prioritization in prioritizations},
+        )
+
+    @classmethod
+    def get_items(cls):
+        latest_overviews = list(
             Overview.objects.order_by("country_id", "-assessment_number", "-date_of_assessment")
             .distinct("country_id")
             .select_related("country", "type_of_assessment", "country__region")
         )
+        assessment_by_overview, prioritization_by_overview = cls.get_latest_relations([ov.id for ov in latest_overviews])
         items = []
         for ov in latest_overviews:
             # Compute normalized phase display from int value or existing string
@@ -684,21 +744,7 @@ class PerMapDataView(views.APIView):
             climate_considerations = False
             urban_considerations = False
             migration_considerations = False
-            latest_assessment = (
-                PerAssessment.objects.filter(overview_id=getattr(ov, "id", None))
-                .prefetch_related(
-                    Prefetch(
-                        "area_responses",
-                        queryset=AreaResponse.objects.prefetch_related(
-                            Prefetch(
-                                "component_response",
-                                queryset=FormComponentResponse.objects.select_related("component", "component__area", "rating"),
-                            )
-                        ),
-                    )
-                )
-                .first()
-            )
+            latest_assessment = assessment_by_overview.get(ov.id)
             if latest_assessment:
                 for ar in latest_assessment.area_responses.all():
                     for cr in ar.component_response.all():
@@ -735,11 +781,9 @@ class PerMapDataView(views.APIView):
 
             # Prioritized components (workplan/prioritization)
             prioritized_components = []
-            fp = FormPrioritization.objects.filter(overview_id=getattr(ov, "id", None)).first()
+            fp = prioritization_by_overview.get(ov.id)
             if fp:
-                for pac in fp.prioritized_action_responses.exclude(component_id=14).select_related(
-                    "component", "component__area"
-                ):
+                for pac in fp.prioritized_action_responses.all():
                     pc_comp = pac.component
                     pc_area = pc_comp.area if pc_comp else None
                     area_num_val2 = getattr(pc_area, "area_num", None)
@@ -798,7 +842,7 @@ class PerMapDataView(views.APIView):
                     "components": components,
                 }
             )
-        return Response({"results": items})
+        return items
 
 
 class PerAssessmentsProcessedView(views.APIView):
@@ -808,13 +852,18 @@ class PerAssessmentsProcessedView(views.APIView):
     """
 
     def get(self, request):
+        snapshot = PerPublicDataSnapshotHelper.get_or_build(PerPublicDataSnapshot.Type.ASSESSMENTS_PROCESSED, self.get_data)
+        return _snapshot_response(request, snapshot)
+
+    @staticmethod
+    def get_data():
         assessments = PerAssessment.objects.select_related("overview", "overview__country").prefetch_related(
             Prefetch(
                 "area_responses",
                 queryset=AreaResponse.objects.prefetch_related(
                     Prefetch(
                         "component_response",
-                        queryset=FormComponentResponse.objects.prefetch_related("question_responses").select_related(
+                        queryset=FormComponentResponse.objects.select_related(
                             "component",
                             "component__area",
                             "rating",
@@ -906,7 +955,7 @@ class PerAssessmentsProcessedView(views.APIView):
                 }
             )
 
-        return Response({"results": results})
+        return {"results": results}
 
 
 class PerDashboardDataView(views.APIView):
@@ -916,6 +965,11 @@ class PerDashboardDataView(views.APIView):
     """
 
     def get(self, request):
+        snapshot = PerPublicDataSnapshotHelper.get_or_build(PerPublicDataSnapshot.Type.DASHBOARD_DATA, self.get_data)
+        return _snapshot_response(request, snapshot)
+
+    @staticmethod
+    def get_data():
         # Build aggregation by component across all assessments
         component_map = {}
         country_assessments: dict[str, list] = {}
@@ -1012,7 +1066,7 @@ class PerDashboardDataView(views.APIView):
         items = list(component_map.values())
         # Optional: sort by area then component_num for stable output
         items.sort(key=lambda x: ((x["area_id"] or 0), (x["component_num"] or 0)))
-        return Response({"assessments": items, "countryAssessments": country_assessments})
+        return {"assessments": items, "countryAssessments": country_assessments}
 
 
 class PerFileViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.26 on 2026-10-19 06:30
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("per", "0125_formcomponent_migration_considerations_guidance_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PerPublicDataSnapshot",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("dashboard-data", "Dashboard data"), ("assessments-processed", "Assessments processed")],
+                        max_length=50,
+                        unique=True,
+                        verbose_name="type",
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name="data"),
+                ),
+                ("etag", models.CharField(max_length=32, verbose_name="etag")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="updated at")),
+            ],
+        ),
+    ]
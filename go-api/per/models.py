@@ -1,5 +1,6 @@
 import reversion
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from tinymce.models import HTMLField
@@ -882,3 +883,19 @@ class OpsLearningComponentCacheResponse(models.Model):
 
     def __str__(self) -> str:
         return f"Summary - component - {self.component.title}"
+
+
+class PerPublicDataSnapshot(models.Model):
+    """Precomputed response of the consolidated public PER endpoints, rebuilt by a celery task on PER data changes"""
+
+    class Type(models.TextChoices):
+        DASHBOARD_DATA = "dashboard-data", _("Dashboard data")
+        ASSESSMENTS_PROCESSED = "assessments-processed", _("Assessments processed")
+
+    type = models.CharField(verbose_name=_("type"), max_length=50, choices=Type.choices, unique=True)
+    data = models.JSONField(verbose_name=_("data"), encoder=DjangoJSONEncoder, default=dict)
+    etag = models.CharField(verbose_name=_("etag"), max_length=32)
+    updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.get_type_display()} - {self.updated_at}"
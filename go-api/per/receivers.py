@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from per.cache import PerPublicDataCacheHelper
+from per.models import (
+    AreaResponse,
+    FormComponentResponse,
+    FormPrioritization,
+    FormPrioritizationComponent,
+    Overview,
+    PerAssessment,
+)
+from per.task import schedule_per_public_data_snapshots
+
+
+@receiver(post_save, sender=Overview)
+@receiver(post_save, sender=PerAssessment)
+@receiver(post_save, sender=AreaResponse)
+@receiver(post_save, sender=FormComponentResponse)
+@receiver(post_save, sender=FormPrioritization)
+@receiver(post_save, sender=FormPrioritizationComponent)
+@receiver(post_delete, sender=Overview)
+@receiver(post_delete, sender=PerAssessment)
+@receiver(post_delete, sender=AreaResponse)
+@receiver(post_delete, sender=FormComponentResponse)
+@receiver(post_delete, sender=FormPrioritization)
+@receiver(post_delete, sender=FormPrioritizationComponent)
+@receiver(m2m_changed, sender=PerAssessment.area_responses.through)
+@receiver(m2m_changed, sender=AreaResponse.component_response.through)
+@receiver(m2m_changed, sender=FormPrioritization.prioritized_action_responses.through)
+def invalidate_per_public_data_cache(sender, **kwargs):
+    transaction.on_commit(PerPublicDataCacheHelper.invalidate)
+    transaction.on_commit(schedule_per_public_data_snapshots)
@@ -1,9 +1,11 @@
 from celery import shared_task
+from django.core.cache import cache
 from django.test import override_settings
 
 from api.logger import logger
 from main.lock import RedisLockKey, redis_lock
-from per.models import OpsLearningCacheResponse
+from per.cache import PerPublicDataSnapshotHelper
+from per.models import OpsLearningCacheResponse, PerPublicDataSnapshot
 from per.ops_learning_summary import OpsLearningSummaryTask
 
 
@@ -102,3 +104,35 @@ def generate_summary(
                 filter_data=filter_data,
                 overwrite_prompt_cache=overwrite_prompt_cache,
             )
+
+
+PER_PUBLIC_DATA_SNAPSHOT_SCHEDULED_KEY = "per-public-data-snapshot-scheduled"
+# Changes are usually saved in bursts (nested assessment forms), wait a bit to build the snapshots once
+PER_PUBLIC_DATA_SNAPSHOT_COUNTDOWN = 30
+
+
+def schedule_per_public_data_snapshots():
+    if cache.add(PER_PUBLIC_DATA_SNAPSHOT_SCHEDULED_KEY, 1, PER_PUBLIC_DATA_SNAPSHOT_COUNTDOWN * 10):
+        build_per_public_data_snapshots.apply_async(countdown=PER_PUBLIC_DATA_SNAPSHOT_COUNTDOWN)
+
+
+@shared_task
+def build_per_public_data_snapshots():
+    from per.drf_views import PerAssessmentsProcessedView, PerDashboardDataView
+
+    with redis_lock(key=RedisLockKey.PER_PUBLIC_DATA_SNAPSHOT, id="all") as acquired:
+        if not acquired:
+            logger.warning("PER public data snapshot generation is already in progress, retrying later")
+            build_per_public_data_snapshots.apply_async(countdown=PER_PUBLIC_DATA_SNAPSHOT_COUNTDOWN)
+            return False
+        # Changes done from now on need a new snapshot
+        cache.delete(PER_PUBLIC_DATA_SNAPSHOT_SCHEDULED_KEY)
+        PerPublicDataSnapshotHelper.save(
+            PerPublicDataSnapshot.Type.ASSESSMENTS_PROCESSED,
+            PerAssessmentsProcessedView.get_data(),
+        )
+        PerPublicDataSnapshotHelper.save(
+            PerPublicDataSnapshot.Type.DASHBOARD_DATA,
+            PerDashboardDataView.get_data(),
+        )
+    return True
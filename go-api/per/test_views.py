@@ -2,6 +2,9 @@ import json
 from unittest import mock
 
 from django.core import management
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
 
 from api.factories.country import CountryFactory
 from api.factories.region import RegionFactory
@@ -19,7 +22,16 @@ from per.factories import (
     SectorTagFactory,
 )
 
-from .models import WorkPlanStatus
+from .drf_views import PerDashboardDataView, PerMapDataView
+from .models import (
+    AreaResponse,
+    FormComponentResponse,
+    FormPrioritizationComponent,
+    PerAssessment,
+    PerPublicDataSnapshot,
+    WorkPlanStatus,
+)
+from .task import build_per_public_data_snapshots
 
 
 class PerTestCase(APITestCase):
@@ -199,6 +211,67 @@ class PerTestCase(APITestCase):
         self.assert_403(response)
 
 
+class PerPublicDataTestCase(APITestCase):
+    def _create_country_per_data(self):
+        overview = OverviewFactory.create(country=CountryFactory.create())
+        component = FormComponentFactory.create()
+        component_response = FormComponentResponse.objects.create(component=component, epi_considerations="Yes")
+        area_response = AreaResponse.objects.create(area=component.area)
+        area_response.component_response.add(component_response)
+        assessment = PerAssessment.objects.create(overview=overview)
+        assessment.area_responses.add(area_response)
+        prioritization = FormPrioritizationFactory.create(overview=overview)
+        prioritization.prioritized_action_responses.add(
+            FormPrioritizationComponent.objects.create(component=component, is_prioritized=True)
+        )
+        return overview
+
+    def _get_items_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            items = PerMapDataView.get_items()
+        return items, len(queries)
+
+    def test_map_data_query_count(self):
+        self._create_country_per_data()
+        items, query_count = self._get_items_query_count()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(len(items[0]["components"]), 1)
+        self.assertEqual(len(items[0]["prioritized_components"]), 1)
+        self.assertTrue(items[0]["epi_considerations"])
+
+        for _ in range(4):
+            self._create_country_per_data()
+        items, more_query_count = self._get_items_query_count()
+        self.assertEqual(len(items), 5)
+        # Queries don't grow with the number of countries
+        self.assertEqual(query_count, more_query_count)
+
+    def test_dashboard_data_snapshot(self):
+        self._create_country_per_data()
+        view = PerDashboardDataView.as_view()
+        request_factory = APIRequestFactory()
+
+        response = view(request_factory.get("/"))
+        self.assert_200(response)
+        etag = response["ETag"]
+        self.assertEqual(len(response.data["assessments"]), 1)
+        self.assertTrue(PerPublicDataSnapshot.objects.filter(type=PerPublicDataSnapshot.Type.DASHBOARD_DATA).exists())
+
+        response = view(request_factory.get("/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+        # Snapshot is only updated by the task
+        self._create_country_per_data()
+        response = view(request_factory.get("/"))
+        self.assertEqual(response["ETag"], etag)
+        build_per_public_data_snapshots()
+        response = view(request_factory.get("/", HTTP_IF_NONE_MATCH=etag))
+        self.assert_200(response)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["assessments"]), 2)
+        self.assertEqual(len(response.data["countryAssessments"]), 2)
+
+
 class OpsLearningSummaryTestCase(APITestCase):
 
     def check_response_id(self, url, data):
@@ -1,8 +1,28 @@
-from elasticsearch.helpers import bulk
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from elasticsearch.helpers import bulk, streaming_bulk
 
 from api.esconnection import ES_CLIENT
 from api.indexes import ES_PAGE_NAME
 from api.logger import logger
+from api.models import Appeal, Event, FieldReport, SearchIndexOutbox
+from api.typeahead import invalidate_typeahead_index
+
+# Related fields used by the indexing() of the models
+INDEXING_SELECT_RELATED = {
+    Appeal: ("event", "country"),
+}
+INDEXING_PREFETCH_RELATED = {
+    Event: ("countries",),
+    FieldReport: ("countries",),
+}
 
 
 def log_errors(errors):
@@ -24,6 +44,7 @@ def delete_es_index(instance):
                 )
                 logger.info(f"Deleted {deleted} records")
                 log_errors(errors)
+                invalidate_typeahead_index()
             except Exception:
                 logger.error("Could not reach Elasticsearch server or index was already missing.")
         else:
@@ -45,6 +66,69 @@ def construct_es_data(instance, is_create=False):
     return metadata
 
 
+def iter_indexing_records(queryset, chunk_size=None):
+    """Iterates the records without loading all of them, with the related fields used by indexing()"""
+    queryset = queryset.select_related(*INDEXING_SELECT_RELATED.get(queryset.model, ())).prefetch_related(
+        *INDEXING_PREFETCH_RELATED.get(queryset.model, ())
+    )
+    return queryset.iterator(chunk_size=chunk_size or settings.ELASTIC_SEARCH_BULK_CHUNK_SIZE)
+
+
+def _bulk_chunk(chunk_number, chunk, max_retries):
+    start = time.monotonic()
+    success, errors = 0, []
+    for ok, item in streaming_bulk(
+        client=ES_CLIENT,
+        actions=chunk,
+        chunk_size=len(chunk),
+        max_retries=max_retries,
+        initial_backoff=2,
+        max_backoff=60,
+        raise_on_error=False,
+    ):
+        if ok:
+            success += 1
+        else:
+            errors.append(item)
+    logger.info(f"Bulk chunk {chunk_number}: {success} succeeded, {len(errors)} failed in {time.monotonic() - start:.2f} seconds")
+    return success, errors
+
+
+def chunked_bulk(actions, chunk_size=None, thread_count=None, max_retries=None):
+    """
+    Sends the actions (any iterable, consumed lazily) to Elasticsearch in chunks, from up to thread_count threads.
+    The next chunk is only built when a thread is free, so the actions are never all in memory.
+    Chunks rejected with 429 (Too Many Requests) are retried with an exponential backoff.
+    Returns (number of succeeded actions, errors) like elasticsearch.helpers.bulk
+    """
+    chunk_size = chunk_size or settings.ELASTIC_SEARCH_BULK_CHUNK_SIZE
+    thread_count = thread_count or settings.ELASTIC_SEARCH_BULK_THREAD_COUNT
+    if max_retries is None:
+        max_retries = settings.ELASTIC_SEARCH_BULK_MAX_RETRIES
+
+    success, errors = 0, []
+
+    def _collect(futures):
+        nonlocal success
+        for future in futures:
+            chunk_success, chunk_errors = future.result()
+            success += chunk_success
+            errors.extend(chunk_errors)
+
+    actions = iter(actions)
+    with ThreadPoolExecutor(max_workers=thread_count, thread_name_prefix="es-bulk") as executor:
+        pending = set()
+        chunk_number = 0
+        while chunk := list(islice(actions, chunk_size)):
+            chunk_number += 1
+            if len(pending) >= thread_count:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+            pending.add(executor.submit(_bulk_chunk, chunk_number, chunk, max_retries))
+        _collect(wait(pending).done)
+    return success, errors
+
+
 def create_es_index(instance):
     """Creates an Elasticsearch index from the record instance"""
 
@@ -53,6 +137,7 @@ def create_es_index(instance):
         created, errors = bulk(client=ES_CLIENT, actions=[construct_es_data(instance, True)])
         logger.info(f"Created {created} records")
         log_errors(errors)
+        invalidate_typeahead_index()
 
 
 def update_es_index(instance):
@@ -63,3 +148,84 @@ def update_es_index(instance):
         updated, errors = bulk(client=ES_CLIENT, actions=[construct_es_data(instance)])
         logger.info(f"Updated {updated} records")
         log_errors(errors)
+        invalidate_typeahead_index()
+
+
+def _iter_outbox_actions(changed_ids_by_model):
+    """The changed records are synced with their current state, the ones not found (or child emergencies) are deleted"""
+    models_by_name = SearchIndexOutbox.get_models()
+    for model_name, object_ids in changed_ids_by_model.items():
+        model = models_by_name[model_name]
+        indexed_ids = set()
+        for record in iter_indexing_records(model.objects.filter(id__in=object_ids)):
+            if model is Event and record.parent_event_id:
+                continue
+            indexed_ids.add(record.id)
+            yield {
+                "_op_type": "index",
+                "_index": ES_PAGE_NAME,
+                "_type": "page",
+                "_id": record.es_id(),
+                **record.indexing(),
+            }
+        for object_id in object_ids - indexed_ids:
+            yield {"_op_type": "delete", "_index": ES_PAGE_NAME, "_type": "page", "_id": model(pk=object_id).es_id()}
+
+
+def _get_failed_es_ids(errors):
+    """_id of the failed bulk items, errors are {op_type: item} like elasticsearch.helpers.bulk"""
+    return {item.get("_id") for error in errors for item in error.values()}
+
+
+def index_search_index_outbox(batch_size=None):
+    """
+    Indexes the pending SearchIndexOutbox changes in batches, and marks them as processed.
+    The changes which failed are kept pending until their next attempt (see SearchIndexOutbox.get_retry_delay).
+    Returns the number of processed changes.
+    """
+    batch_size = batch_size or settings.ELASTIC_SEARCH_BULK_CHUNK_SIZE
+    models_by_name = SearchIndexOutbox.get_models()
+    started_at = timezone.now()
+    processed_count = 0
+    while changes := list(
+        SearchIndexOutbox.objects.filter(processed_at__isnull=True)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=started_at))
+        .order_by("id")
+        .only("id", "model", "object_id", "created_at", "attempts")[:batch_size]
+    ):
+        lag = timezone.now() - changes[0].created_at
+        changed_ids_by_model = defaultdict(set)
+        for change in changes:
+            changed_ids_by_model[change.model].add(change.object_id)
+
+        success, errors = chunked_bulk(_iter_outbox_actions(changed_ids_by_model))
+        # Already deleted (e.g. by delete_es_index or never indexed)
+        errors = [error for error in errors if error.get("delete", {}).get("status") != 404]
+        log_errors(errors)
+
+        failed_es_ids = _get_failed_es_ids(errors)
+        now = timezone.now()
+        failed_ids_by_attempts = defaultdict(list)
+        processed_ids = []
+        for change in changes:
+            if models_by_name[change.model](pk=change.object_id).es_id() in failed_es_ids:
+                failed_ids_by_attempts[change.attempts + 1].append(change.id)
+            else:
+                processed_ids.append(change.id)
+        SearchIndexOutbox.objects.filter(id__in=processed_ids).update(processed_at=now)
+        for attempts, failed_ids in failed_ids_by_attempts.items():
+            SearchIndexOutbox.objects.filter(id__in=failed_ids).update(
+                attempts=attempts,
+                next_attempt_at=now + SearchIndexOutbox.get_retry_delay(attempts),
+            )
+        processed_count += len(processed_ids)
+        logger.info(
+            f"Search index outbox: {len(processed_ids)} changes processed, {len(changes) - len(processed_ids)} left to retry"
+            f" ({success} succeeded, {len(errors)} failed), lag of the oldest change: {lag.total_seconds():.0f} seconds"
+        )
+
+    if processed_count:
+        invalidate_typeahead_index()
+    # Keep the processed changes for a while for debugging
+    SearchIndexOutbox.objects.filter(processed_at__lt=timezone.now() - timedelta(days=7)).delete()
+    return processed_count
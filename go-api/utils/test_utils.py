@@ -18,6 +18,7 @@ from main.mock import erp_request_side_effect_mock
 from main.utils import DjangoReversionDataFixHelper
 from per.factories import OverviewFactory as PerOverviewFactory
 from per.models import Overview as PerOverview
+from utils.elasticsearch import chunked_bulk
 
 
 class ERPTest(TestCase):
@@ -128,3 +129,36 @@ class DjangoReversionDataFixHelperTest(TestCase):
         DjangoReversionDataFixHelper.datetime_fields_to_date(ContentType, Version, PerOverview, [self.field_name])
         self.assert_values({"2022-01-01": 94, None: 1})
         self.confirm_version_data_serialization()
+
+
+class ChunkedBulkTest(TestCase):
+    @staticmethod
+    def streaming_bulk_mock(client, actions, **kwargs):
+        for action in actions:
+            if action["_id"] % 10 == 0:
+                yield False, {"index": {"_id": action["_id"], "status": 400}}
+            else:
+                yield True, {"index": {"_id": action["_id"], "status": 201}}
+
+    @patch("utils.elasticsearch.streaming_bulk")
+    def test_chunked_bulk(self, streaming_bulk_mock):
+        streaming_bulk_mock.side_effect = self.streaming_bulk_mock
+        consumed = []
+
+        def _actions():
+            for _id in range(1, 26):
+                consumed.append(_id)
+                yield {"_id": _id}
+
+        success, errors = chunked_bulk(_actions(), chunk_size=10, thread_count=2, max_retries=3)
+        self.assertEqual(success, 23)
+        self.assertEqual(sorted(error["index"]["_id"] for error in errors), [10, 20])
+        self.assertEqual(len(consumed), 25)
+        # One streaming_bulk per chunk, with the retry configuration
+        self.assertEqual(
+            sorted(len(call.kwargs["actions"]) for call in streaming_bulk_mock.call_args_list),
+            [5, 10, 10],
+        )
+        for call in streaming_bulk_mock.call_args_list:
+            self.assertEqual(call.kwargs["max_retries"], 3)
+            self.assertFalse(call.kwargs["raise_on_error"])